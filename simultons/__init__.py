@@ -3,16 +3,32 @@ Playing with FastAPI, pydantic while simulating stuff
 '''
 
 from .arestc import async_rest_client
-from .button import Button, ButtonWithLed, ButtonWithLedPanel
+from .button import Button, ButtonWithLed, ButtonWithLedPanel, LedChange, \
+    PanelButton
 from .restc import rest_client, wait_until_reachable
-from .globals import simulation_zspec, simulation_ztopic
+from .fastjson import FastJSONResponse
+from .stream import CoalescingQueue, StreamClient, StreamHub
+from .globals import simulation_zspec, simulation_ztopic, tick_ztopic, \
+    ack_zspec, snapshot_zspec, next_after_header
 from .schemas import NewClockParams, ClockResponse, \
-    NewElevatorParams, ElevatorResponse, Message, \
-    SimulationState, SimulationRequest, SimulationResponse, \
-    SimultonState, NewSimultonParams, SimultonRequest, SimultonResponse
+    NewElevatorParams, Direction, ElevatorResponse, ElevatorDelta, \
+    StreamSubscription, HallCallParams, \
+    DispatchResponse, BatchItemResponse, BatchResponse, Message, \
+    Pacing, SimulationState, SimulationRequest, SimulationResponse, \
+    SimultonsFanOutResponse, SimulationUpdateResponse, ProcessExitResponse, \
+    SimulationStepParams, SimulationTick, SimulationTickAck, \
+    SimulationStepResponse, \
+    SimultonState, NewSimultonParams, CheckpointParams, CheckpointResponse, \
+    SimulationSnapshotParams, SimultonSnapshot, SimulationManifest, \
+    SimulationSnapshotResponse, SimulationRestoreParams, \
+    SimultonRequest, SubscriberCounters, \
+    SimultonResponse, \
+    BatchSimultonParams, NewSimultonsBatchParams, SimultonLaunchResponse, \
+    SimultonsBatchResponse
 # order is important to avoid circular dependency!
-from .fast_launcher import FastLauncher
-from .simulton import Simulton, shut_the_process
+from .fast_launcher import FastLauncher, shutdown_launchers
+from .engine import Engine, Event
+from .simulton import InstanceRegistry, Simulton, shut_the_process
 from .elevator import Elevator
 from .clock import Clock
 from .simulation import Simulation, SimultonProxy, theSimulation
@@ -23,16 +39,32 @@ __all__ = [
     # globals.py
     'simulation_ztopic',
     'simulation_zspec',
+    'tick_ztopic',
+    'ack_zspec',
+    'snapshot_zspec',
+    'next_after_header',
+    # fastjson.py
+    'FastJSONResponse',
+    # stream.py
+    'CoalescingQueue',
+    'StreamClient',
+    'StreamHub',
     # arestc.py
     'async_rest_client',
     # button.py
     'Button',
     'ButtonWithLed',
     'ButtonWithLedPanel',
+    'LedChange',
+    'PanelButton',
     # clock.py
     'Clock',
     # fast_launcher.py
     'FastLauncher',
+    'shutdown_launchers',
+    # engine.py
+    'Engine',
+    'Event',
     # elevator_simulton.py
     'app',
     # elevator.py
@@ -41,21 +73,49 @@ __all__ = [
     'rest_client',
     'wait_until_reachable',
     # simulton.py
+    'InstanceRegistry',
     'Simulton',
     'shut_the_process',
     # schemas.py
     'NewClockParams',
     'ClockResponse',
+    'Pacing',
     'SimulationState',
     'SimulationRequest',
     'SimulationResponse',
+    'SimultonsFanOutResponse',
+    'SimulationUpdateResponse',
+    'ProcessExitResponse',
+    'SimulationStepParams',
+    'SimulationTick',
+    'SimulationTickAck',
+    'SimulationStepResponse',
     'NewElevatorParams',
     'SimultonState',
     'NewSimultonParams',
+    'CheckpointParams',
+    'CheckpointResponse',
+    'SimulationSnapshotParams',
+    'SimultonSnapshot',
+    'SimulationManifest',
+    'SimulationSnapshotResponse',
+    'SimulationRestoreParams',
     'SimultonRequest',
+    'SubscriberCounters',
     'SimultonResponse',
+    'BatchSimultonParams',
+    'NewSimultonsBatchParams',
+    'SimultonLaunchResponse',
+    'SimultonsBatchResponse',
     'NewElevatorParams',
+    'Direction',
     'ElevatorResponse',
+    'ElevatorDelta',
+    'StreamSubscription',
+    'HallCallParams',
+    'DispatchResponse',
+    'BatchItemResponse',
+    'BatchResponse',
     'Message',
     # simulation.py
     'Simulation',
@@ -2,10 +2,12 @@
 Async REST client and other utilities
 '''
 from urllib.parse import urljoin
+import json
 import time
-from typing import Any, Optional, Tuple
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 import httpx
 from json.decoder import JSONDecodeError
+from .globals import next_after_header
 
 
 class async_rest_client:
@@ -14,15 +16,16 @@ class async_rest_client:
     '''
 
     def __init__(self, host: str, port: int, verbose: bool,
-                 dumpHeaders: bool) -> None:
+                 dumpHeaders: bool, timeout: Optional[float] = 5.0) -> None:
         '''
         In: iface - server interface, or host name
             port - server port
+            timeout - secs to wait for a response, None to wait forever
         '''
         self.base_url = f'http://{host}:{port}'
         self.verbose = verbose
         self.dumpHeaders = dumpHeaders
-        self.ses = httpx.AsyncClient(base_url=self.base_url)
+        self.ses = httpx.AsyncClient(base_url=self.base_url, timeout=timeout)
         return
 
     async def close(self) -> None:
@@ -131,6 +134,90 @@ class async_rest_client:
             jresp = resp
         return (resp.status_code, jresp)
 
+    async def batch_post(self, uri: str, data: List[Any]) -> Tuple[int, Any]:
+        '''
+        Issue HTTP POST of the list to a base_url + uri, print the size only
+        returns (http_status, response_json)
+        '''
+        self.print_req('POST', uri, f'[{len(data)} items]')
+        resp = await self.ses.post(uri, json=data)
+        if self.verbose:
+            print('HTTP POST =>', resp.status_code)
+        try:
+            jresp = resp.json()
+        except JSONDecodeError:
+            jresp = resp
+        return (resp.status_code, jresp)
+
+    async def create_many(self, uri: str, data: List[Any]) -> Tuple[int, Any]:
+        '''
+        Create many instances in one request, e.g.
+        create_many('/api/v1/clocks/', [{'name': 'foo'}, {'name': 'bar'}])
+        returns (http_status, BatchResponse json)
+        '''
+        return await self.batch_post(f"{uri.rstrip('/')}:batch", data)
+
+    async def delete_many(self, uri: str, ids: List[str]) -> Tuple[int, Any]:
+        '''
+        Delete many instances in one request, e.g.
+        delete_many('/api/v1/clocks/', ['Clock-0.0', 'Clock-1.0'])
+        returns (http_status, BatchResponse json)
+        '''
+        return await self.batch_post(f"{uri.rstrip('/')}:batchDelete", ids)
+
+    async def iter_stream(self, uri: str) -> AsyncIterator[Any]:
+        '''
+        Issue HTTP GET to a base_url + uri for an NDJSON stream
+        yields the objects as they arrive
+        Throws httpx.HTTPStatusError unless 200
+        '''
+        self.print_req('GET', uri, None)
+        async with self.ses.stream('GET', uri) as resp:
+            if self.verbose:
+                print('HTTP GET =>', resp.status_code, 'streaming')
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if line:
+                    yield json.loads(line)
+        return
+
+    async def iter_events(self, uri: str) -> AsyncIterator[Any]:
+        '''
+        Issue HTTP GET to a base_url + uri for a Server-Sent Events stream
+        yields the JSON data of the events as they arrive
+        Throws httpx.HTTPStatusError unless 200
+        '''
+        self.print_req('GET', uri, None)
+        async with self.ses.stream('GET', uri) as resp:
+            if self.verbose:
+                print('HTTP GET =>', resp.status_code, 'streaming')
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if line.startswith('data:'):
+                    yield json.loads(line[5:])
+        return
+
+    async def iter_pages(self, uri: str, limit: int) -> AsyncIterator[Any]:
+        '''
+        Issue HTTP GETs to a base_url + uri for the pages of up to limit
+        objects, following the X-Next-After cursor
+        yields the objects
+        Throws httpx.HTTPStatusError unless 200
+        '''
+        params: Dict[str, Any] = {'limit': limit}
+        while True:
+            self.print_req('GET', uri, params)
+            resp = await self.ses.get(uri, params=params)
+            self.print_resp('GET', resp)
+            resp.raise_for_status()
+            for obj in resp.json().values():
+                yield obj
+            after = resp.headers.get(next_after_header)
+            if after is None:
+                break
+            params['after'] = after
+        return
+
 
 def wait_until_reachable(url: str, timeout: int) -> Optional[httpx.Response]:
     '''
@@ -1,13 +1,15 @@
 '''
 All the button-related stuff
 '''
-from typing import Callable, List
+import contextlib
+from typing import Callable, Iterator, List, NamedTuple, Optional, Sequence
 
 
 class Button:
     '''
     Simple push button with a label, can be en/dis-abled, clicked.
     '''
+    __slots__ = ('_callback', '_label', '_enabled')
 
     def __init__(self, label: str, callback: Callable) -> None:
         '''
@@ -88,6 +90,7 @@ class ButtonWithLed(Button):
     A push button with a feedback (state) LED.
     The LED does ON when the button is pushed, stays ON until reset.
     '''
+    __slots__ = ('_led_on',)
 
     def __init__(self, label: str, callback: Callable) -> None:
         '''
@@ -140,31 +143,273 @@ class ButtonWithLed(Button):
             f" at {hex(id(self))}>"
 
 
+class PanelButton:
+    '''
+    View of a single button of a ButtonWithLedPanel, behaves like
+    ButtonWithLed.  Created on demand, the state is kept by the panel.
+    '''
+    __slots__ = ('_panel', '_index')
+
+    def __init__(self, panel: 'ButtonWithLedPanel', index: int) -> None:
+        '''
+        Initializer
+        '''
+        self._panel = panel
+        self._index = index
+        return
+
+    @property
+    def index(self) -> int:
+        return self._index
+
+    @property
+    def label(self) -> str:
+        return self._panel.labels[self._index]
+
+    @property
+    def enabled(self) -> bool:
+        '''
+        Enabled property
+        '''
+        return self._panel.is_enabled(self._index)
+
+    @enabled.setter
+    def enabled(self, val: bool) -> None:
+        self._panel.enable_button(self._index, val)
+        return
+
+    def enable(self) -> None:
+        self.enabled = True
+        return
+
+    def disable(self) -> None:
+        self.enabled = False
+        return
+
+    def click(self) -> bool:
+        '''
+        Click the button alone, the panel callback is not called.
+        Returns whether click had its effect, i.e. button was enabled.
+        '''
+        if not self.enabled:
+            return False
+        self._panel.press(self._index)
+        return True
+
+    def reset(self) -> None:
+        '''
+        Turns LED off, enables the button
+        '''
+        self._panel.reset_button(self._index)
+        return
+
+    def is_on(self) -> bool:
+        '''
+        Retrieve led status
+        '''
+        return self._panel.is_on(self._index)
+
+    @property
+    def annotated_label(self) -> str:
+        '''
+        Return the label representing led on/of, enabled/disabled status
+        '''
+        return self._panel.annotated_label(self._index)
+
+    def __repr__(self) -> str:
+        '''
+        Object print representation
+        '''
+        return f"<{type(self).__qualname__} '{self.annotated_label}'" \
+            f" at {hex(id(self))}>"
+
+
+class PanelButtons:
+    '''
+    Sequence of the button views of a panel
+    '''
+    __slots__ = ('_panel',)
+
+    def __init__(self, panel: 'ButtonWithLedPanel') -> None:
+        self._panel = panel
+        return
+
+    def __len__(self) -> int:
+        return len(self._panel.labels)
+
+    def __getitem__(self, index: int) -> PanelButton:
+        num = len(self)
+        if not -num <= index < num:
+            raise IndexError('button index out of range')
+        return PanelButton(self._panel, index % num)
+
+    def __iter__(self) -> Iterator[PanelButton]:
+        for index in range(len(self)):
+            yield PanelButton(self._panel, index)
+        return
+
+
+class LedChange(NamedTuple):
+    '''
+    A panel LED went on or off
+    '''
+    index: int
+    on: bool
+    # per panel, increments with every change
+    seq: int
+
+
+def iter_bits(mask: int) -> Iterator[int]:
+    '''
+    Indexes of the bits set, lowest first
+    '''
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+    return
+
+
 class ButtonWithLedPanel:
     '''
-    A panel with N push buttons with feedback LEDs
+    A panel with N push buttons with feedback LEDs.
+    The LEDs and the enabled buttons are kept as two bitmasks, bit N for
+    button N, the button objects are only created when asked for.
+    The callback is called on clicks with the list of the LEDs which are on,
+    or, with deltas, with the list of the LedChange's since the last call.
     '''
+    __slots__ = ('_labels', '_callback', '_deltas', '_leds', '_enabled',
+                 '_seq', '_batch')
 
-    def __init__(self, labels: List[str], callback: Callable) -> None:
-        self._buttons: List[ButtonWithLed] = []
+    def __init__(self, labels: Sequence[str], callback: Callable,
+                 deltas: bool = False) -> None:
+        '''
+        labels - not copied, may be shared by many panels
+        deltas - call back with the changes rather than all the LEDs on
+        '''
+        self._labels = labels
         self._callback = callback
-        self._buttons = [ButtonWithLed(label, self.button_callback)
-                         for label in labels]
+        self._deltas = deltas
+        self._leds = 0
+        self._enabled = (1 << len(labels)) - 1
+        self._seq = 0
+        # LEDs when the batch started, if in one
+        self._batch: Optional[int] = None
         return
 
-    def button_callback(self, button: Button) -> None:
+    @property
+    def labels(self) -> Sequence[str]:
+        return self._labels
+
+    @property
+    def buttons(self) -> PanelButtons:
+        '''
+        The button views
+        '''
+        return PanelButtons(self)
+
+    def button_callback(self, button: int) -> None:
         '''
         Callback for when any button in the panel is clicked.
         '''
         return
 
+    def is_on(self, button: int) -> bool:
+        return bool(self._leds >> button & 1)
+
+    def is_enabled(self, button: int) -> bool:
+        return bool(self._enabled >> button & 1)
+
+    def enable_button(self, button: int, val: bool = True) -> None:
+        '''
+        When not enabled, clicks have no effect
+        '''
+        if val:
+            self._enabled |= 1 << button
+        else:
+            self._enabled &= ~(1 << button)
+        return
+
+    @property
+    def seq(self) -> int:
+        '''The last LedChange sequence number'''
+        return self._seq
+
+    def press(self, button: int) -> bool:
+        '''
+        The button is pushed: the LED goes ON, the button is disabled until
+        reset.  Returns whether the LED went on.
+        '''
+        bit = 1 << button
+        if self._enabled & bit and not self._leds & bit:
+            self._leds |= bit
+            self._enabled &= ~bit
+            self.button_callback(button)
+            return True
+        return False
+
     def click(self, button: int) -> None:
         '''
         Definitive button action to be called by users.
         Activate button press and release, on release, I guess.
+        Raises IndexError if there is no such button.
+        '''
+        if not 0 <= button < len(self._labels):
+            raise IndexError('button index out of range')
+        changed = self.press(button)
+        if self._batch is not None:
+            # called back once the batch is over
+            return
+        if not self._deltas:
+            self.on_click()
+        elif changed:
+            self._seq += 1
+            self.on_changes([LedChange(button, True, self._seq)])
+        return
+
+    @contextlib.contextmanager
+    def batch(self) -> Iterator['ButtonWithLedPanel']:
+        '''
+        Clicks within the batch are called back once, when it is over.
+        With deltas the changes are coalesced: a LED which went on and off
+        within the batch is not reported.
+        '''
+        if self._batch is not None:
+            # nested
+            yield self
+            return
+        self._batch = self._leds
+        try:
+            yield self
+        finally:
+            before = self._batch
+            self._batch = None
+            self.flush(before)
+        return
+
+    def flush(self, before: int) -> None:
+        '''
+        Call back with the changes since the LEDs were before
+        '''
+        changed = before ^ self._leds
+        if not changed:
+            return
+        if not self._deltas:
+            self.on_click()
+            return
+        changes: List[LedChange] = []
+        for i in iter_bits(changed):
+            self._seq += 1
+            changes.append(LedChange(i, bool(self._leds >> i & 1), self._seq))
+        self.on_changes(changes)
+        return
+
+    def on_changes(self, changes: List[LedChange]) -> None:
         '''
-        self._buttons[button].click()
-        self.on_click()
+        LED changes event handler
+        '''
+        if self._callback is not None:
+            self._callback(self, changes)
         return
 
     def on_click(self) -> None:  # [useless-return]
@@ -177,26 +422,94 @@ class ButtonWithLedPanel:
 
     def reset(self) -> None:
         '''
-        reset all the buttons in the panel
+        reset all the buttons in the panel, with deltas the LEDs which go
+        off are called back
         '''
-        for b in self._buttons:
-            b.reset()
+        before = self._leds
+        self._leds = 0
+        self._enabled = (1 << len(self._labels)) - 1
+        self.leds_off(before)
+        return
+
+    def reset_button(self, button: int) -> None:
+        '''
+        reset a single button in the panel, with deltas the LED going off
+        is called back
+        '''
+        bit = 1 << button
+        before = self._leds
+        self._leds &= ~bit
+        self._enabled |= bit
+        self.leds_off(before & bit)
+        return
+
+    def leds_off(self, mask: int) -> None:
+        '''
+        Call back the LEDs of the mask which just went off, if with deltas
+        and not within a batch, which reports them once over
+        '''
+        if not mask or not self._deltas or self._batch is not None:
+            return
+        changes: List[LedChange] = []
+        for i in iter_bits(mask):
+            self._seq += 1
+            changes.append(LedChange(i, False, self._seq))
+        self.on_changes(changes)
         return
 
+    @property
+    def leds_mask(self) -> int:
+        '''
+        returns the LEDs which are on as a bitmask
+        '''
+        return self._leds
+
+    @leds_mask.setter
+    def leds_mask(self, mask: int) -> None:
+        '''
+        restores the LEDs, no callback: the lit buttons are disabled until
+        reset, the ones no longer lit are enabled again
+        '''
+        self._enabled = (self._enabled | self._leds) & ~mask
+        self._leds = mask
+        return
+
+    @property
+    def leds_count(self) -> int:
+        '''
+        returns the number of the LEDs which are on
+        '''
+        return self._leds.bit_count()
+
+    def iter_leds_on(self) -> Iterator[int]:
+        '''
+        iterates over the button indexes which are on
+        '''
+        return iter_bits(self._leds)
+
     @property
     def leds_on(self) -> List[int]:
         '''
         returns the list of button indexes which are on
         '''
-        return [
-            i for i, button in enumerate(self._buttons) if button.is_on()
-        ]
+        return list(iter_bits(self._leds))
+
+    def annotated_label(self, button: int) -> str:
+        '''
+        Return the label representing led on/of, enabled/disabled status
+        '''
+        label = self._labels[button]
+        if not self._enabled >> button & 1:
+            label = f'_{label}_'
+        if self._leds >> button & 1:
+            label = '*' + label + '*'
+        return label
 
     @property
     def annotated_labels(self) -> List[str]:
         '''
         '''
-        return [button.annotated_label for button in self._buttons]
+        return [self.annotated_label(i) for i in range(len(self._labels))]
 
     def __repr__(self) -> str:
         '''
@@ -0,0 +1,148 @@
+'''
+Checkpoint file of a simulton state: a JSON header followed by the raw
+NumPy arrays, each aligned.  On restore the file is memory-mapped, the
+arrays are zero-copy views of the mapping, the pages are read when first
+touched.
+
+Layout: magic, uint64 header length, the header, padding, the arrays.
+The header holds the metadata and the table of the arrays: name, dtype,
+shape and offset of each.  Strings are kept as a single UTF-8 blob and an
+array of the offsets into it, see pack_strings().
+'''
+import json
+import mmap
+import os
+import struct
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+import numpy as np
+
+magic = b'SSSCKPT1'
+# magic, header length
+preamble = struct.Struct('<8sQ')
+alignment = 64
+
+
+def aligned(offset: int) -> int:
+    return (offset + alignment - 1) // alignment * alignment
+
+
+def pack_strings(strings: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    The strings as a UTF-8 blob and the offsets of their ends in it
+    '''
+    encoded = [s.encode() for s in strings]
+    blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    ends = np.cumsum([len(b) for b in encoded], dtype=np.int64)
+    return (blob, ends)
+
+
+def unpack_string(blob: np.ndarray, ends: np.ndarray, index: int) -> str:
+    '''
+    The string at the index of the blob packed by pack_strings()
+    '''
+    start = int(ends[index - 1]) if index > 0 else 0
+    return bytes(blob[start:int(ends[index])]).decode()
+
+
+def write_checkpoint(path: str, meta: Dict[str, Any],
+                     arrays: Dict[str, np.ndarray]) -> int:
+    '''
+    Write the metadata and the arrays into the file at path, atomically,
+    returns the file size
+    '''
+    table: List[Dict[str, Any]] = []
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        arrays[name] = array
+        table.append({
+            'name': name, 'dtype': array.dtype.str,
+            'shape': list(array.shape), 'offset': offset})
+        offset = aligned(offset + array.nbytes)
+    header = json.dumps({'meta': meta, 'arrays': table}).encode()
+    start = aligned(preamble.size + len(header))
+    tmp = f'{path}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(preamble.pack(magic, len(header)))
+        f.write(header)
+        for entry, array in zip(table, arrays.values()):
+            f.seek(start + entry['offset'])
+            f.write(array.data)
+        size = start + offset
+        f.truncate(size)
+    os.replace(tmp, path)
+    return size
+
+
+class Checkpoint:
+    '''
+    Checkpoint file mapped into memory, the arrays are read-only views
+    '''
+
+    def __init__(self, path: str) -> None:
+        '''
+        Raises OSError if there is no file, ValueError if it is not
+        a checkpoint
+        '''
+        self._path = path
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < preamble.size:
+                raise ValueError(f'{path} is not a checkpoint')
+            self._mm = mmap.mmap(f.fileno(), size, prot=mmap.PROT_READ)
+        (tag, length) = preamble.unpack_from(self._mm, 0)
+        if tag != magic:
+            self._mm.close()
+            raise ValueError(f'{path} is not a checkpoint')
+        header = json.loads(
+            self._mm[preamble.size:preamble.size + length])
+        self._meta: Dict[str, Any] = header['meta']
+        self._start = aligned(preamble.size + length)
+        self._table = {entry['name']: entry for entry in header['arrays']}
+        return
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def meta(self) -> Dict[str, Any]:
+        return self._meta
+
+    @property
+    def size(self) -> int:
+        return len(self._mm)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._table
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._table)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        '''
+        The array, no data is read until used.
+        Raises KeyError if there is no such array.
+        '''
+        entry = self._table[name]
+        dtype = np.dtype(entry['dtype'])
+        shape = tuple(entry['shape'])
+        count = int(np.prod(shape, dtype=np.int64))
+        array = np.frombuffer(
+            self._mm, dtype=dtype, count=count,
+            offset=self._start + entry['offset'])
+        return array.reshape(shape)
+
+    def close(self) -> None:
+        '''
+        The arrays must not be used afterwards
+        '''
+        self._mm.close()
+        return
+
+    def __enter__(self) -> 'Checkpoint':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+        return
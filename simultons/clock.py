@@ -1,74 +1,353 @@
 '''
 Clock simulation & simulton
 '''
-import time
-from typing import Dict, Optional
-from fastapi.responses import JSONResponse
-from . import SimultonState, Simulton, SimultonRequest, SimultonResponse, \
-    NewClockParams, ClockResponse, Message
+import asyncio
+from typing import Any, AsyncIterator, Callable, Dict, List, Mapping, \
+    Optional, Tuple
+from fastapi import Body, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+import numpy as np
+from pydantic import PositiveFloat, PositiveInt
+from . import Simulton, SimultonRequest, SimultonResponse, \
+    NewClockParams, ClockResponse, BatchResponse, \
+    Message, Engine, FastJSONResponse, CheckpointParams, CheckpointResponse
+from .checkpoint import Checkpoint, pack_strings, unpack_string
+from .fastjson import dumps
+
+
+class ClockBank:
+    '''
+    Struct of arrays holding all the clocks of a simulton.
+    Clock i reads offset[i] + acc[i] + rate[i] * (now - last[i]), where now
+    is the virtual time of the simulton engine, last[i] is the virtual time
+    the clock was created or had its rate changed at, acc[i] is the clock
+    time accumulated until then.  Pausing and resuming the engine pauses
+    and resumes all the clocks at once.
+    '''
+    initial_capacity = 64
+
+    def __init__(self, engine: Engine) -> None:
+        self._engine = engine
+        capacity = self.initial_capacity
+        self._acc = np.zeros(capacity)
+        self._last = np.zeros(capacity)
+        self._rate = np.ones(capacity)
+        self._offset = np.zeros(capacity)
+        self._used = np.zeros(capacity, dtype=bool)
+        # bumped every time the slot is taken by a new clock
+        self._generation = np.zeros(capacity, dtype=np.uint32)
+        # slots below _size which were freed
+        self._free: List[int] = []
+        self._size = 0
+        return
+
+    def __len__(self) -> int:
+        '''Number of the clocks'''
+        return self._size - len(self._free)
+
+    @property
+    def capacity(self) -> int:
+        return len(self._used)
+
+    def grow(self) -> None:
+        '''
+        Double the capacity of the arrays
+        '''
+        capacity = 2 * self.capacity
+        for name in ('_acc', '_last', '_rate', '_offset', '_used',
+                     '_generation'):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+        return
+
+    def add(self, rate: float = 1.0, offset: float = 0.0) -> int:
+        '''
+        Add a clock starting at offset now, returns its index
+        '''
+        if self._free:
+            index = self._free.pop()
+        else:
+            if self._size == self.capacity:
+                self.grow()
+            index = self._size
+            self._size += 1
+        self._acc[index] = 0
+        self._last[index] = self._engine.now
+        self._rate[index] = rate
+        self._offset[index] = offset
+        self._used[index] = True
+        self._generation[index] += 1
+        return index
+
+    def dump(self) -> Dict[str, np.ndarray]:
+        '''
+        The times, rates, offsets of the slots so far, the free ones, as
+        arrays to checkpoint
+        '''
+        size = self._size
+        return {
+            'times': self.times(), 'rates': self._rate[:size],
+            'offsets': self._offset[:size], 'used': self._used[:size],
+            'free': np.array(self._free, dtype=np.int64)
+        }
+
+    def load(self, arrays: Mapping[str, np.ndarray]) -> None:
+        '''
+        Replace the clocks with the ones dumped, they go on from the times
+        dumped from now
+        '''
+        size = len(arrays['used'])
+        capacity = max(self.initial_capacity, size)
+        for name in ('_acc', '_last', '_rate', '_offset', '_used',
+                     '_generation'):
+            setattr(self, name, np.zeros(
+                capacity, dtype=getattr(self, name).dtype))
+        self._rate[:size] = arrays['rates']
+        self._offset[:size] = arrays['offsets']
+        self._acc[:size] = arrays['times'] - arrays['offsets']
+        self._last[:size] = self._engine.now
+        self._used[:size] = arrays['used']
+        self._free = arrays['free'].tolist()
+        self._size = size
+        return
+
+    def remove(self, index: int) -> None:
+        '''
+        The slot is reused by the clocks to come
+        '''
+        assert self._used[index]
+        self._used[index] = False
+        self._free.append(index)
+        return
+
+    def time(self, index: int) -> float:
+        '''
+        Simulated time of a single clock
+        '''
+        return float(
+            self._offset[index] + self._acc[index] +
+            self._rate[index] * (self._engine.now - self._last[index]))
+
+    def times(self, now: Optional[float] = None) -> np.ndarray:
+        '''
+        Simulated times of all the slots, the unused ones included, at the
+        virtual time now
+        '''
+        if now is None:
+            now = self._engine.now
+        size = self._size
+        return self._offset[:size] + self._acc[:size] + \
+            self._rate[:size] * (now - self._last[:size])
+
+    @property
+    def rates(self) -> np.ndarray:
+        '''Rates of all the slots'''
+        return self._rate[:self._size]
+
+    @property
+    def offsets(self) -> np.ndarray:
+        '''Offsets of all the slots'''
+        return self._offset[:self._size]
+
+    @property
+    def generations(self) -> np.ndarray:
+        '''How many clocks took every slot so far'''
+        return self._generation[:self._size]
+
+    def generation(self, index: int) -> int:
+        return int(self._generation[index])
+
+    def rate(self, index: int) -> float:
+        return float(self._rate[index])
+
+    def offset(self, index: int) -> float:
+        return float(self._offset[index])
+
+    def set_rate(self, index: int, rate: float) -> None:
+        '''
+        From now on the clock goes at the rate
+        '''
+        now = self._engine.now
+        self._acc[index] += self._rate[index] * (now - self._last[index])
+        self._last[index] = now
+        self._rate[index] = rate
+        return
 
 
 class Clock:
     '''
-    Clock counting simulated time
+    Clock counting simulated time - a view of a ClockBank slot
     '''
 
-    def __init__(self, sim: Simulton, name: str) -> None:
+    def __init__(self, sim: 'ClockSimulton', name: str,
+                 rate: float = 1.0, offset: float = 0.0) -> None:
         '''
         Initializer
         '''
         assert sim is not None
         self._sim = sim
         self._id = sim.get_new_instance_id()
-        sim.add_instance(self, self._id)
         self._name = name
-        # accumulated simulation time until the last pause
-        self._time: float = 0
-        # os clock
-        self._last_start: float = 0
+        self._index = sim.bank.add(rate, offset)
+        sim.add_instance(self, self._id)
         return
 
-    def on_paused(self) -> bool:
+    @classmethod
+    def view(cls, sim: 'ClockSimulton', id: str, name: str,
+             index: int) -> 'Clock':
         '''
-        Simulation pause event handler
+        The clock already in the ClockBank slot, e.g. restored from
+        a checkpoint
         '''
-        print('Clock.on_paused')
-        assert self._sim.is_paused()
-        rate = self._sim._rate
-        assert rate != 0
-        if self._last_start != 0:
-            # accumulate _time
-            self._time += (time.time() - self._last_start) * rate
-            self._last_start = 0
-        return True
+        cl = cls.__new__(cls)
+        cl._sim = sim
+        cl._id = id
+        cl._name = name
+        cl._index = index
+        return cl
 
-    def on_running(self, rate: float) -> bool:
-        '''
-        Simulation run event handler
-        '''
-        print('Clock.on_running')
-        assert self._sim.is_running()
-        assert rate > 0
-        if self._last_start == 0:
-            self._last_start = time.time()
-        return True
+    @property
+    def index(self) -> int:
+        '''Slot in the ClockBank'''
+        return self._index
+
+    @property
+    def id(self) -> str:
+        return self._id
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def rate(self) -> float:
+        '''Simulated secs of this clock per simulton simulated sec'''
+        return self._sim.bank.rate(self._index)
+
+    @rate.setter
+    def rate(self, rate: float) -> float:
+        self._sim.bank.set_rate(self._index, rate)
+        return rate
 
     @property
     def time(self) -> float:
         '''
-        Get the simulation time.
-        This can be complex - depends on the simulation state
+        Get the simulation time
         '''
-        if self._sim.state != SimultonState.RUNNING:
-            return self._time
-        rate = self._sim._rate
-        assert rate > 0
-        assert self._last_start > 0
-        return self._time + ((time.time() - self._last_start) * rate)
+        return self._sim.bank.time(self._index)
+
+    def to_dict(self) -> Dict[str, Any]:
+        '''
+        Same as to_response().model_dump(), only faster
+        '''
+        bank = self._sim.bank
+        return {
+            'id': self._id, 'name': self._name,
+            'time': bank.time(self._index), 'rate': bank.rate(self._index),
+            'offset': bank.offset(self._index)
+        }
 
     def to_response(self) -> ClockResponse:
         return ClockResponse(
-            id=self._id, name=self._name, time=self.time)
+            id=self._id, name=self._name, time=self.time, rate=self.rate,
+            offset=self._sim.bank.offset(self._index))
+
+
+class ClockFeed:
+    '''
+    Server-Sent Events of the clocks times at a frequency, shared by all
+    the subscribers: the times are read and serialized once per tick, every
+    subscriber is sent the same payload.  A slow subscriber skips to the
+    latest tick.
+    '''
+
+    def __init__(self, sim: 'ClockSimulton', hz: float,
+                 ids: Optional[Tuple[str, ...]] = None) -> None:
+        '''
+        ids - of the clocks to feed, all of them if None
+        '''
+        self._sim = sim
+        self._period = 1.0 / hz
+        self._ids = ids
+        self._seq = 0
+        self._payload = b''
+        self._tick = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.subscribers = 0
+        return
+
+    @property
+    def seq(self) -> int:
+        '''Number of the ticks so far'''
+        return self._seq
+
+    def times(self) -> Dict[str, float]:
+        '''
+        The clocks times read at the same simulated time, now
+        '''
+        times = self._sim.bank.times().tolist()
+        instances = self._sim.instances
+        if self._ids is None:
+            return {id: times[cl.index] for id, cl in instances.items()}
+        result: Dict[str, float] = {}
+        for id in self._ids:
+            cl = instances.get(id)
+            if cl is not None:
+                result[id] = times[cl.index]
+        return result
+
+    def tick(self) -> None:
+        '''
+        Serialize the times, wake up the subscribers
+        '''
+        self._seq += 1
+        self._payload = b'id: %d\ndata: %s\n\n' % (
+            self._seq, dumps(self.times()))
+        (tick, self._tick) = (self._tick, asyncio.Event())
+        tick.set()
+        return
+
+    async def run(self) -> None:
+        '''
+        Tick while there are subscribers
+        '''
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while self.subscribers > 0:
+            self.tick()
+            # do not make up for the ticks missed
+            deadline = max(deadline + self._period, loop.time())
+            await asyncio.sleep(deadline - loop.time())
+        return
+
+    async def events(
+            self, count: Optional[int] = None) -> AsyncIterator[bytes]:
+        '''
+        The payloads of the next count ticks, forever if None
+        '''
+        self.subscribers += 1
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        try:
+            sent = 0
+            while count is None or sent < count:
+                tick = self._tick
+                await tick.wait()
+                yield self._payload
+                sent += 1
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0:
+                self._sim.drop_feed(self)
+        return
+
+    def cancel(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        return
 
 
 class ClockSimulton(Simulton):
@@ -78,34 +357,134 @@ class ClockSimulton(Simulton):
     title = 'Clock'
     description = 'Clock API'
     version = '0.0.1'
+    checkpointable = True
+
+    # max ticks per sec of a feed
+    max_feed_hz = 100.0
 
     def __init__(self) -> None:
         '''
         Initializer
         '''
         super().__init__()
+        self._bank = ClockBank(self._engine)
+        # by the frequency and the ids
+        self._feeds: Dict[Tuple[float, Optional[Tuple[str, ...]]],
+                          ClockFeed] = {}
         return
 
-    def on_running(self) -> None:
+    @property
+    def bank(self) -> ClockBank:
+        '''All the clocks times'''
+        return self._bank
+
+    def del_instance_by_id(self, id: str) -> None:
+        '''Raises KeyError if id is not a key'''
+        clock = self._instances.pop(id)
+        self._bank.remove(clock.index)
+        return
+
+    def on_shutdown(self) -> None:
+        for feed in self._feeds.values():
+            feed.cancel()
+        self._feeds.clear()
+        super().on_shutdown()
+        return
+
+    def dump_instances(self) -> Dict[str, np.ndarray]:
         '''
-        State just transitioned to RUNNING
+        The bank, the slots and the names of the clocks by the registry
+        slot
         '''
-        print('ClockSimulton.on_running')
-        # notify all the clocks about the change
-        for id, clock in self.instances.items():
-            clock.on_running(self._rate)
-        return
+        arrays = {
+            f'bank.{name}': array for name, array in self._bank.dump().items()
+        }
+        capacity = self._instances.capacity
+        indexes = np.full(capacity, -1, dtype=np.int64)
+        names = [''] * capacity
+        for slot, cl in self._instances.slots():
+            indexes[slot] = cl.index
+            names[slot] = cl.name
+        (blob, ends) = pack_strings(names)
+        arrays['instances.indexes'] = indexes
+        arrays['instances.names'] = blob
+        arrays['instances.name_ends'] = ends
+        return arrays
 
-    def on_paused(self) -> None:
+    def load_instances(self, ckpt: Checkpoint) -> Callable[[int, str], Clock]:
         '''
-        State just transitioned to PAUSED
+        Restore the bank, the clocks are the views of its slots
+        '''
+        prefix = 'bank.'
+        self._bank.load({
+            name[len(prefix):]: ckpt[name]
+            for name in ckpt if name.startswith(prefix)
+        })
+        indexes = ckpt['instances.indexes']
+        blob = ckpt['instances.names']
+        ends = ckpt['instances.name_ends']
+
+        def load(slot: int, id: str) -> Clock:
+            return Clock.view(
+                self, id, unpack_string(blob, ends, slot), int(indexes[slot]))
+
+        return load
+
+    def feed(self, hz: float, ids: Optional[List[str]] = None) -> ClockFeed:
         '''
-        print('ClockSimulton.on_paused')
-        # notify all the clocks about the change
-        for id, clock in self.instances.items():
-            clock.on_paused()
+        The feed of the clocks with the ids, of all of them if none, at the
+        frequency: the subscribers of the same ones share it
+        Raises ValueError if the frequency is too high
+        '''
+        if hz > self.max_feed_hz:
+            raise ValueError(f'{hz} is above {self.max_feed_hz} hz')
+        key = (hz, tuple(sorted(set(ids))) if ids else None)
+        feed = self._feeds.get(key)
+        if feed is None:
+            feed = ClockFeed(self, hz, key[1])
+            self._feeds[key] = feed
+        return feed
+
+    def drop_feed(self, feed: ClockFeed) -> None:
+        '''
+        The feed has no subscribers left
+        '''
+        for key, other in self._feeds.items():
+            if other is feed:
+                del self._feeds[key]
+                break
         return
 
+    def to_dict_now(self) -> Callable[[str, Clock], Dict[str, Any]]:
+        '''
+        Serializer of the clocks read at the same simulated time, now
+        '''
+        bank = self._bank
+        times = bank.times()
+        rates = bank.rates.copy()
+        offsets = bank.offsets.copy()
+        generations = bank.generations.copy()
+
+        def to_dict(id: str, cl: Clock) -> Dict[str, Any]:
+            index = cl.index
+            if index >= len(times) or \
+                    bank.generation(index) != generations[index]:
+                # created after now, maybe in the slot of a deleted one
+                return cl.to_dict()
+            return {
+                'id': id, 'name': cl.name, 'time': float(times[index]),
+                'rate': float(rates[index]), 'offset': float(offsets[index])
+            }
+        return to_dict
+
+    def all_to_response(self) -> Dict[str, Dict[str, Any]]:
+        '''
+        All the clocks read at the same simulated time, ready to be
+        serialized
+        '''
+        to_dict = self.to_dict_now()
+        return {id: to_dict(id, cl) for id, cl in self._instances.items()}
+
 
 theClockSimulton: Optional[ClockSimulton] = None
 app = ClockSimulton.create_app()
@@ -135,7 +514,8 @@ async def get_simulton():
     print('get clock simulton')
     global theClockSimulton
     assert theClockSimulton is not None
-    return theClockSimulton.to_response()
+    return FastJSONResponse(
+        content=theClockSimulton.to_response().model_dump())
 
 
 @app.put('/api/v1/simulton')
@@ -147,17 +527,34 @@ async def put_simulton(req: SimultonRequest):
     return theClockSimulton.on_put_simulton(req)
 
 
+@app.post('/api/v1/simulton/checkpoint', response_model=CheckpointResponse,
+          responses={400: {"model": Message}})
+async def checkpoint_simulton(params: CheckpointParams):
+    '''
+    Write all the clocks into the checkpoint file
+    '''
+    assert theClockSimulton is not None
+    return theClockSimulton.on_checkpoint(params)
+
+
 @app.get('/api/v1/clocks/', response_model=Dict[str, ClockResponse])
-async def get_instances():
+async def get_instances(limit: Optional[PositiveInt] = None,
+                        after: Optional[str] = None, stream: bool = False):
     '''
-    Get all the instances
+    Get all the instances, or a page of up to limit ones after the id
+    given, or stream them as NDJSON
     '''
     if theClockSimulton is None:
         return {}
-    return {
-        id: cl.to_response().model_dump()
-        for id, cl in theClockSimulton.instances.items()
-    }
+    if limit is None and after is None and not stream:
+        # already in the shape of the response model, skip the validation
+        return FastJSONResponse(content=theClockSimulton.all_to_response())
+    try:
+        return theClockSimulton.list_response(
+            theClockSimulton.to_dict_now(), limit, after, stream)
+    except KeyError as err:
+        content = Message(f'Bummer: {err}').model_dump()
+        return JSONResponse(status_code=400, content=content)
 
 
 @app.post(
@@ -169,8 +566,50 @@ async def create_instance(params: NewClockParams):
     Handle new instance creation
     '''
     assert theClockSimulton is not None
-    cl = Clock(theClockSimulton, params.name)
-    return cl.to_response().model_dump()
+    cl = Clock(theClockSimulton, params.name, params.rate, params.offset)
+    return FastJSONResponse(status_code=201, content=cl.to_dict())
+
+
+@app.post('/api/v1/clocks:batch', response_model=BatchResponse)
+async def create_instances(params: List[Any] = Body()):
+    '''
+    Handle creation of many instances at once.  Every item is a
+    NewClockParams, validated on its own: an invalid one gets 422 in its
+    item, the others are created.
+    '''
+    assert theClockSimulton is not None
+    sim = theClockSimulton
+    return sim.create_many(
+        params, NewClockParams,
+        lambda p: Clock(sim, p.name, p.rate, p.offset).id)
+
+
+@app.post('/api/v1/clocks:batchDelete', response_model=BatchResponse)
+async def delete_clocks(ids: List[str] = Body()):
+    '''
+    Delete many clocks at once
+    '''
+    assert theClockSimulton is not None
+    return theClockSimulton.delete_many(ids)
+
+
+@app.get('/api/v1/clocks:feed', responses={400: {"model": Message}})
+async def feed_clocks(hz: PositiveFloat = 1.0,
+                      ids: List[str] = Query(default=[]),
+                      count: Optional[PositiveInt] = None):
+    '''
+    Server-Sent Events of the times of the clocks with the ids, of all of
+    them if none, hz times a sec: count events, or until disconnected
+    '''
+    assert theClockSimulton is not None
+    try:
+        feed = theClockSimulton.feed(hz, ids)
+    except ValueError as err:
+        content = Message(f'Bummer: {err}').model_dump()
+        return JSONResponse(status_code=400, content=content)
+    return StreamingResponse(
+        feed.events(count), media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache'})
 
 
 @app.get('/api/v1/clocks/{id}', response_model=ClockResponse)
@@ -181,7 +620,7 @@ async def get_clock(id: str):
     assert theClockSimulton is not None
     try:
         cl: Clock = theClockSimulton.get_instance_by_id(id)
-        return cl.to_response().model_dump()
+        return FastJSONResponse(content=cl.to_dict())
     except KeyError:
         pass
     content = Message("Item not found").model_dump()
@@ -0,0 +1,113 @@
+'''
+Group dispatch: assign the hall calls to the elevators of a bank.
+
+Every elevator is given an estimated time to serve the call, computed for
+all the elevators at once with NumPy straight from the ElevatorBank arrays,
+the cheapest one gets the call:
+
+* idle elevator, or the call is ahead on the way and the rider goes the same
+  way - the distance to the floor;
+* otherwise - to the farthest stop and back to the floor;
+
+plus the time of the stops already scheduled, plus the load penalty.
+'''
+import math
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+from . import Direction
+from .elevator import Elevator, ElevatorBank, direction_sign, \
+    words_highest, words_lowest
+
+
+class GroupController:
+    '''
+    Hall calls dispatcher for a bank of elevators
+    '''
+    # secs to go one floor
+    floor_time = 2.0
+    # secs to serve a stop
+    stop_time = 10.0
+    # secs added per load code, full elevators take no calls
+    load_penalty = np.array([0.0, 5.0, math.inf])
+
+    def __init__(self, bank: ElevatorBank,
+                 rows: Optional[Sequence[int]] = None) -> None:
+        '''
+        bank - where the elevators are
+        rows - of the elevators of the group, all the bank ones if None
+        '''
+        self._bank = bank
+        self._rows = None if rows is None else np.array(rows, dtype=np.int64)
+        return
+
+    @classmethod
+    def of(cls, cars: List[Elevator]) -> 'GroupController':
+        '''
+        The group of the elevators, all of them in the same bank.
+        Raises ValueError if they are not.
+        '''
+        if not cars:
+            return cls(ElevatorBank(), [])
+        bank = cars[0].bank
+        if any(car.bank is not bank for car in cars):
+            raise ValueError('Elevators of different banks')
+        return cls(bank, [car.row for car in cars])
+
+    @property
+    def rows(self) -> np.ndarray:
+        '''The bank rows of the group'''
+        if self._rows is None:
+            return np.flatnonzero(self._bank._used)
+        return self._rows
+
+    def costs(self, floor: int, direction: Direction,
+              rows: Optional[np.ndarray] = None) -> np.ndarray:
+        '''
+        Estimated time for every elevator of the rows, of the group by
+        default, to serve the call, in secs, inf if it can not
+        '''
+        bank = self._bank
+        if rows is None:
+            rows = self.rows
+        pos = bank._floor[rows].astype(np.int64)
+        moving = bank._direction[rows].astype(np.int64)
+        stops = bank._up[rows] | bank._down[rows]
+        # the farthest stop in the direction of the movement
+        far = np.where(
+            moving > 0, words_highest(stops),
+            np.where(moving < 0, words_lowest(stops), pos))
+        scheduled = np.bitwise_count(stops).sum(axis=1, dtype=np.int64)
+        load = bank._load[rows]
+        load_code = np.where(
+            load > Elevator._max_load, 2,
+            np.where(load > Elevator._min_load, 1, 0))
+        d = direction_sign[direction]
+        dist = floor - pos
+        on_the_way = (moving == d) & (dist * d >= 0)
+        direct = np.abs(dist)
+        detour = np.abs(far - pos) + np.abs(far - floor)
+        floors = np.where((moving == 0) | on_the_way, direct, detour)
+        costs = floors * self.floor_time + scheduled * self.stop_time + \
+            self.load_penalty[load_code]
+        costs[floor >= bank._floors[rows]] = math.inf
+        return costs
+
+    def assign(self, floor: int, direction: Direction) -> Tuple[int, float]:
+        '''
+        Assign the hall call to the cheapest elevator, schedule the stop.
+        Returns the bank row of the elevator and the cost.
+        Raises ValueError if none of the elevators can serve the call.
+        '''
+        if direction == Direction.NONE:
+            raise ValueError('Hall call has to go UP or DOWN')
+        rows = self.rows
+        if not len(rows):
+            raise ValueError('No elevators')
+        costs = self.costs(floor, direction, rows)
+        index = int(np.argmin(costs))
+        cost = float(costs[index])
+        if cost == math.inf:
+            raise ValueError(f'No elevator can serve floor {floor}')
+        row = int(rows[index])
+        self._bank.add_stop(row, floor, direction == Direction.DOWN)
+        return (row, cost)
@@ -1,15 +1,27 @@
 '''NewClockParams
 All the elevator-related stuff
 '''
+import asyncio
 from enum import auto
-from typing import Dict, List, Optional, Union
+import functools
+import time
+from typing import Any, Callable, Dict, Iterable, List, Mapping, \
+    Optional, Set, Tuple, Union
+from fastapi import Body, Query, WebSocket, WebSocketDisconnect
 from fastapi.responses import JSONResponse
 from fastapi_utils.enums import StrEnum
+import numpy as np
+from pydantic import PositiveInt
 
-from . import ButtonWithLedPanel, \
+from . import ButtonWithLedPanel, Direction, LedChange, \
     Simulton, SimultonRequest, SimultonResponse, \
-    ElevatorResponse, NewElevatorParams, Message
+    ElevatorResponse, NewElevatorParams, HallCallParams, DispatchResponse, \
+    BatchResponse, Message, FastJSONResponse, \
+    StreamClient, StreamHub, StreamSubscription, \
+    CheckpointParams, CheckpointResponse, InstanceRegistry, Event
 
+from .checkpoint import Checkpoint, pack_strings, unpack_string
+from .fastjson import dumps
 from .simulton import get_random_id
 
 
@@ -66,10 +78,459 @@ class ElevatorState(StrEnum):
         return repr(self.value)
 
 
+def lowest_floor(mask: int) -> int:
+    '''
+    The lowest floor in the non-empty floors bitmask
+    '''
+    return (mask & -mask).bit_length() - 1
+
+
+def highest_floor(mask: int) -> int:
+    '''
+    The highest floor in the non-empty floors bitmask
+    '''
+    return mask.bit_length() - 1
+
+
+@functools.lru_cache(maxsize=None)
+def panel_labels(floors: int) -> Tuple[str, ...]:
+    '''
+    Control panel labels shared by all the elevators with that many floors:
+    floor buttons first, their indexes are the floors, then the doors ones
+    '''
+    labels = [str(i) for i in range(1, floors+1)]
+    labels.append(Elevator._label_open_doors)
+    labels.append(Elevator._label_close_doors)
+    return tuple(labels)
+
+
+# states and directions are kept in the arrays as small ints
+estates = list(ElevatorState)
+estate_code = {st: code for code, st in enumerate(estates)}
+IDLE = estate_code[ElevatorState.IDLE]
+DOORS_OPENING = estate_code[ElevatorState.DOORS_OPENING]
+DOORS_CLOSING = estate_code[ElevatorState.DOORS_CLOSING]
+GOING = estate_code[ElevatorState.GOING]
+DOORS_OPENED = estate_code[ElevatorState.DOORS_OPENED]
+# the doors are not closed
+doors_open_states = frozenset((
+    ElevatorState.DOORS_OPENING, ElevatorState.DOORS_OPENED,
+    ElevatorState.DOORS_CLOSING))
+# indexed by the direction sign
+directions = [Direction.NONE, Direction.UP, Direction.DOWN]
+direction_sign = {Direction.NONE: 0, Direction.UP: 1, Direction.DOWN: -1}
+
+
+def words_lowest(words: np.ndarray) -> np.ndarray:
+    '''
+    The lowest bit set in every row of the multiword uint64 bitmasks,
+    -1 for the empty ones
+    '''
+    nonzero = words != 0
+    w = np.argmax(nonzero, axis=1)
+    word = words[np.arange(len(words)), w]
+    # isolate the lowest bit, count the zeros below it
+    low = word & (~word + np.uint64(1))
+    bit = np.bitwise_count(low - np.uint64(1)).astype(np.int64)
+    return np.where(nonzero.any(axis=1), w * 64 + bit, -1)
+
+
+def words_highest(words: np.ndarray) -> np.ndarray:
+    '''
+    The highest bit set in every row of the multiword uint64 bitmasks,
+    -1 for the empty ones
+    '''
+    nonzero = words != 0
+    w = words.shape[1] - 1 - np.argmax(nonzero[:, ::-1], axis=1)
+    word = words[np.arange(len(words)), w]
+    # smear the highest bit down, count the bits
+    for shift in (1, 2, 4, 8, 16, 32):
+        word = word | (word >> np.uint64(shift))
+    bit = np.bitwise_count(word).astype(np.int64) - 1
+    return np.where(nonzero.any(axis=1), w * 64 + bit, -1)
+
+
+class ElevatorBank:
+    '''
+    Struct of arrays holding many elevators: floors, current floor, load,
+    state, direction, door timer and the stops bitmasks, the latter as rows
+    of uint64 words.  All the elevators are stepped by a single vectorized
+    update, Elevator is a view of a single row.
+    '''
+    initial_capacity = 64
+    # steps the doors stay opened
+    door_dwell = 1
+    # the arrays of a value per elevator
+    row_arrays = ('_floors', '_floor', '_load', '_state', '_direction',
+                  '_door_timer', '_used')
+
+    def __init__(self, capacity: int = 0, floors: int = 64) -> None:
+        '''
+        capacity - number of the elevators to allocate for upfront
+        floors - max number of floors to allocate the bitmasks for upfront
+        '''
+        capacity = capacity or self.initial_capacity
+        self._words = max(1, (floors + 63) // 64)
+        self._floors = np.zeros(capacity, dtype=np.int32)
+        self._floor = np.zeros(capacity, dtype=np.int32)
+        self._load = np.zeros(capacity, dtype=np.int32)
+        self._state = np.zeros(capacity, dtype=np.int8)
+        self._direction = np.zeros(capacity, dtype=np.int8)
+        self._door_timer = np.zeros(capacity, dtype=np.int16)
+        self._up = np.zeros((capacity, self._words), dtype=np.uint64)
+        self._down = np.zeros((capacity, self._words), dtype=np.uint64)
+        self._used = np.zeros(capacity, dtype=bool)
+        self._free: List[int] = []
+        self._size = 0
+        # the materialized control panels of the rows, if any
+        self._panels: Dict[int, ButtonWithLedPanel] = {}
+        return
+
+    def __len__(self) -> int:
+        '''Number of the elevators'''
+        return self._size - len(self._free)
+
+    @property
+    def capacity(self) -> int:
+        return len(self._used)
+
+    @property
+    def words(self) -> int:
+        '''Number of uint64 words per stops bitmask'''
+        return self._words
+
+    def grow(self, capacity: int, words: int) -> None:
+        '''
+        Reallocate the arrays for more elevators or floors
+        '''
+        for name in self.row_arrays:
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+        for name in ('_up', '_down'):
+            old = getattr(self, name)
+            new = np.zeros((capacity, words), dtype=old.dtype)
+            new[:old.shape[0], :old.shape[1]] = old
+            setattr(self, name, new)
+        self._words = words
+        return
+
+    def add(self, floors: int, current_floor: int = 0) -> int:
+        '''
+        Add an idle elevator, returns its row
+        '''
+        assert floors > 0
+        words = max(self._words, (floors + 63) // 64)
+        if self._free:
+            row = self._free.pop()
+            if words > self._words:
+                self.grow(self.capacity, words)
+        else:
+            if self._size == self.capacity or words > self._words:
+                capacity = self.capacity
+                if self._size == capacity:
+                    capacity *= 2
+                self.grow(capacity, words)
+            row = self._size
+            self._size += 1
+        self._floors[row] = floors
+        self._floor[row] = current_floor
+        self._load[row] = 0
+        self._state[row] = IDLE
+        self._direction[row] = 0
+        self._door_timer[row] = 0
+        self._up[row] = 0
+        self._down[row] = 0
+        self._used[row] = True
+        return row
+
+    def remove(self, row: int) -> None:
+        '''
+        The row is reused by the elevators to come
+        '''
+        assert self._used[row]
+        self._used[row] = False
+        self._state[row] = IDLE
+        self._up[row] = 0
+        self._down[row] = 0
+        self._panels.pop(row, None)
+        self._free.append(row)
+        return
+
+    def dump(self) -> Dict[str, np.ndarray]:
+        '''
+        The rows so far, the free ones and the LEDs of the materialized
+        control panels, as arrays to checkpoint
+        '''
+        size = self._size
+        arrays = {
+            name[1:]: getattr(self, name)[:size]
+            for name in self.row_arrays + ('_up', '_down')
+        }
+        arrays['free'] = np.array(self._free, dtype=np.int64)
+        # the floor buttons and the doors ones
+        words = (int(self._floors[:size].max(initial=0)) + 2 + 63) // 64
+        leds = np.zeros((len(self._panels), words), dtype=np.uint64)
+        for i, panel in enumerate(self._panels.values()):
+            leds[i] = np.frombuffer(
+                panel.leds_mask.to_bytes(words * 8, 'little'),
+                dtype=np.uint64)
+        arrays['panel_rows'] = np.array(list(self._panels), dtype=np.int64)
+        arrays['panel_leds'] = leds
+        return arrays
+
+    def load(self, arrays: Mapping[str, np.ndarray]) -> None:
+        '''
+        Replace the elevators with the ones dumped, the control panels are
+        up to the elevators
+        '''
+        size = len(arrays['used'])
+        capacity = max(self.initial_capacity, size)
+        self._words = arrays['up'].shape[1]
+        for name in self.row_arrays:
+            new = np.zeros(capacity, dtype=getattr(self, name).dtype)
+            new[:size] = arrays[name[1:]]
+            setattr(self, name, new)
+        for name in ('_up', '_down'):
+            new = np.zeros((capacity, self._words), dtype=np.uint64)
+            new[:size] = arrays[name[1:]]
+            setattr(self, name, new)
+        self._free = arrays['free'].tolist()
+        self._size = size
+        self._panels = {}
+        return
+
+    def get_mask(self, masks: np.ndarray, row: int) -> int:
+        '''
+        Stops bitmask of the row as an int
+        '''
+        if self._words == 1:
+            return int(masks[row, 0])
+        return int.from_bytes(masks[row].tobytes(), 'little')
+
+    def set_mask(self, masks: np.ndarray, row: int, mask: int) -> None:
+        '''
+        Store the int stops bitmask into the row
+        '''
+        if self._words == 1:
+            masks[row, 0] = mask
+        else:
+            masks[row] = np.frombuffer(
+                mask.to_bytes(self._words * 8, 'little'), dtype=np.uint64)
+        return
+
+    def add_stop(self, row: int, floor: int, down: bool) -> None:
+        '''
+        Schedule a stop of the row on the floor, to be served going down
+        or up, see Elevator.add_stop()
+        '''
+        masks = self._down if down else self._up
+        masks[row, floor // 64] |= np.uint64(1) << np.uint64(floor % 64)
+        return
+
+    def panel(self, row: int) -> Optional[ButtonWithLedPanel]:
+        '''The control panel of the row, if materialized'''
+        return self._panels.get(row)
+
+    def set_panel(self, row: int, panel: ButtonWithLedPanel) -> None:
+        self._panels[row] = panel
+        return
+
+    def floor_bits(self, floor: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        Bitmasks of the floors at or above, and at or below every floor
+        '''
+        index = np.arange(self._words, dtype=np.int64)
+        w = (floor // 64)[:, None]
+        bit = (floor % 64).astype(np.uint64)[:, None]
+        one = np.uint64(1)
+        ones = np.uint64(0xFFFFFFFFFFFFFFFF)
+        # bits >= bit within the word of the floor
+        at_or_above = np.where(
+            index > w, ones, np.where(index == w, ones << bit, np.uint64(0)))
+        # bits <= bit within the word of the floor
+        at_or_below = np.where(
+            index < w, ones,
+            np.where(index == w, ~(ones << bit << one), np.uint64(0)))
+        return (at_or_above, at_or_below)
+
+    def next_stops(self, rows: np.ndarray) -> np.ndarray:
+        '''
+        Vectorized Elevator.next_stop() for the rows, -1 for none
+        '''
+        up = self._up[rows]
+        down = self._down[rows]
+        (above, below) = self.floor_bits(self._floor[rows].astype(np.int64))
+        scan_up = words_lowest(up & above)
+        scan_up = np.where(scan_up >= 0, scan_up, words_highest(down & above))
+        scan_down = words_highest(down & below)
+        scan_down = np.where(
+            scan_down >= 0, scan_down, words_lowest(up & below))
+        going_down = self._direction[rows] == -1
+        first = np.where(going_down, scan_down, scan_up)
+        second = np.where(going_down, scan_up, scan_down)
+        return np.where(first >= 0, first, second)
+
+    def arrive(self, rows: np.ndarray) -> None:
+        '''
+        Vectorized Elevator.arrive() for the rows
+        '''
+        floor = self._floor[rows].astype(np.int64)
+        stops = self._up[rows] | self._down[rows]
+        (above, below) = self.floor_bits(floor)
+        w = floor // 64
+        bit = np.uint64(1) << (floor % 64).astype(np.uint64)
+        here = np.zeros_like(above)
+        here[np.arange(len(rows)), w] = bit
+        ahead_up = (stops & above & ~here).any(axis=1)
+        ahead_down = (stops & below & ~here).any(axis=1)
+        direction = self._direction[rows]
+        keep_up = (direction == 1) & ahead_up
+        keep_down = (direction == -1) & ahead_down
+        reverse = ~keep_up & ~keep_down
+        # clear the stop in the direction kept, both when reversing
+        self._up[rows[keep_up | reverse], w[keep_up | reverse]] &= \
+            ~bit[keep_up | reverse]
+        self._down[rows[keep_down | reverse], w[keep_down | reverse]] &= \
+            ~bit[keep_down | reverse]
+        self._direction[rows[reverse]] = np.where(
+            ahead_up[reverse], 1, np.where(ahead_down[reverse], -1, 0))
+        for row, f in zip(rows.tolist(), floor.tolist()):
+            panel = self._panels.get(row)
+            if panel is not None:
+                panel.reset_button(f)
+        return
+
+    def depart(self, rows: np.ndarray, stops: np.ndarray) -> None:
+        '''
+        Vectorized IDLE/DOORS_CLOSING transitions for the rows given their
+        next stops
+        '''
+        floor = self._floor[rows]
+        idle = stops < 0
+        self._direction[rows[idle]] = 0
+        self._state[rows[idle]] = IDLE
+        here = stops == floor
+        self.arrive(rows[here])
+        self._state[rows[here]] = DOORS_OPENING
+        going = ~idle & ~here
+        self._direction[rows[going]] = np.sign(stops[going] - floor[going])
+        self._state[rows[going]] = GOING
+        return
+
+    def step(self) -> None:
+        '''
+        Advance the state machines of all the elevators by one transition,
+        see Elevator.step()
+        '''
+        size = self._size
+        state = self._state[:size]
+        used = self._used[:size]
+        opening = np.flatnonzero(used & (state == DOORS_OPENING))
+        opened = np.flatnonzero(used & (state == DOORS_OPENED))
+        going = np.flatnonzero(used & (state == GOING))
+        departing = np.flatnonzero(
+            used & ((state == IDLE) | (state == DOORS_CLOSING)))
+        # doors
+        self._state[opening] = DOORS_OPENED
+        self._door_timer[opening] = self.door_dwell
+        self._door_timer[opened] -= 1
+        closing = opened[self._door_timer[opened] <= 0]
+        self._state[closing] = DOORS_CLOSING
+        # idle ones with no stops stay idle
+        departing = departing[
+            (self._state[departing] != IDLE) |
+            (self._up[departing] | self._down[departing]).any(axis=1)]
+        self.depart(departing, self.next_stops(departing))
+        # move the going ones one floor
+        self._floor[going] += self._direction[going]
+        stops = self.next_stops(going)
+        floor = self._floor[going]
+        idle = stops < 0
+        self._direction[going[idle]] = 0
+        self._state[going[idle]] = IDLE
+        here = stops == floor
+        self.arrive(going[here])
+        self._state[going[here]] = DOORS_OPENING
+        turning = ~idle & ~here
+        self._direction[going[turning]] = np.sign(
+            stops[turning] - floor[turning])
+        return
+
+
+class BankWatcher:
+    '''
+    Finds the elevators of an ElevatorBank changed since the last look:
+    the floor, state, direction, stops or the buttons lit.  The arrays are
+    compared at once, only the materialized control panels one by one.
+    '''
+
+    def __init__(self, bank: ElevatorBank) -> None:
+        self._bank = bank
+        self._floor = np.zeros(0, dtype=np.int32)
+        self._state = np.zeros(0, dtype=np.int8)
+        self._direction = np.zeros(0, dtype=np.int8)
+        self._up = np.zeros((0, bank.words), dtype=np.uint64)
+        self._down = np.zeros((0, bank.words), dtype=np.uint64)
+        # the LEDs of the materialized panels by the row
+        self._leds: Dict[int, int] = {}
+        # rows reported as changed regardless
+        self._forced: Set[int] = set()
+        return
+
+    def forget(self, row: int) -> None:
+        '''
+        The row is reported as changed on the next look, e.g. reused by
+        another elevator
+        '''
+        self._forced.add(row)
+        return
+
+    def changed_rows(self) -> np.ndarray:
+        '''
+        The rows of the elevators changed since the last call
+        '''
+        bank = self._bank
+        size = bank._size
+        if len(self._floor) == size and self._up.shape[1] == bank.words:
+            changed = (bank._floor[:size] != self._floor) | \
+                (bank._state[:size] != self._state) | \
+                (bank._direction[:size] != self._direction) | \
+                (bank._up[:size] != self._up).any(axis=1) | \
+                (bank._down[:size] != self._down).any(axis=1)
+        else:
+            # grown since
+            changed = np.ones(size, dtype=bool)
+        leds = {row: panel.leds_mask for row, panel in bank._panels.items()}
+        for row, mask in leds.items():
+            if self._leds.get(row, 0) != mask:
+                changed[row] = True
+        for row in self._forced:
+            if row < size:
+                changed[row] = True
+        changed &= bank._used[:size]
+        self._forced.clear()
+        self._leds = leds
+        self._floor = bank._floor[:size].copy()
+        self._state = bank._state[:size].copy()
+        self._direction = bank._direction[:size].copy()
+        self._up = bank._up[:size].copy()
+        self._down = bank._down[:size].copy()
+        return np.flatnonzero(changed)
+
+
 class Elevator:
     '''
-    Elevator
+    Elevator.
+    Stops are scheduled LOOK style: the elevator keeps going in its direction
+    while there are stops ahead, then reverses.  The stops are kept as two
+    floor bitmasks - bit N is floor N - one for the stops to be served going
+    up, the other going down.
+    The state lives in a row of an ElevatorBank, the control panel is
+    created when first used.
     '''
+    __slots__ = ('_id', '_name', '_sim', '_bank', '_row')
     #
     # constant labels
     #
@@ -82,12 +543,21 @@ class Elevator:
     _max_load = 700
 
     def __init__(self, sim: Optional[Simulton], name: str, floors: int,
-                 current_floor: int = 0) -> None:
+                 current_floor: int = 0,
+                 bank: Optional[ElevatorBank] = None) -> None:
         '''
         Initializer
+        bank - where to keep the state, the simulton's one by default
         '''
         assert floors > 0
-        self._floors = floors
+        if bank is None:
+            if isinstance(sim, ElevatorSimulton):
+                bank = sim.bank
+            else:
+                # standalone, important for testing
+                bank = ElevatorBank(1, floors)
+        self._bank = bank
+        self._row = bank.add(floors, current_floor)
         self._id = ''
         self._name = name
         self._sim = sim
@@ -98,25 +568,111 @@ class Elevator:
             self._id = sim.get_new_instance_id()
             sim.add_instance(self, self._id)
         #
-        # Instance Attributes
-        #
-        self._current_floor = current_floor
-        self._current_load = 0
-        self._destination_floors: List[int] = []
-        self._estate = ElevatorState.IDLE
-        #
-        # Controls - create the control panel
-        #
-        labels = [str(i) for i in range(1, floors+1)]
-        labels.append(self._label_open_doors)
-        labels.append(self._label_close_doors)
-        self._panel = ButtonWithLedPanel(labels, self.panel_callback)
-        #
         # create indicators here
         # e.g. going up/down, current floor
         #
         return
 
+    @classmethod
+    def view(cls, sim: Simulton, id: str, name: str,
+             bank: ElevatorBank, row: int) -> 'Elevator':
+        '''
+        The elevator already in the bank row, e.g. restored from a
+        checkpoint
+        '''
+        el = cls.__new__(cls)
+        el._id = id
+        el._name = name
+        el._sim = sim
+        el._bank = bank
+        el._row = row
+        return el
+
+    #
+    # Instance Attributes - views of the bank row
+    #
+    @property
+    def _floors(self) -> int:
+        return int(self._bank._floors[self._row])
+
+    @property
+    def _current_floor(self) -> int:
+        return int(self._bank._floor[self._row])
+
+    @_current_floor.setter
+    def _current_floor(self, floor: int) -> None:
+        self._bank._floor[self._row] = floor
+        return
+
+    @property
+    def _current_load(self) -> int:
+        return int(self._bank._load[self._row])
+
+    @_current_load.setter
+    def _current_load(self, kilos: int) -> None:
+        self._bank._load[self._row] = kilos
+        return
+
+    @property
+    def _up(self) -> int:
+        '''stops bitmask going up'''
+        return self._bank.get_mask(self._bank._up, self._row)
+
+    @_up.setter
+    def _up(self, mask: int) -> None:
+        self._bank.set_mask(self._bank._up, self._row, mask)
+        return
+
+    @property
+    def _down(self) -> int:
+        '''stops bitmask going down'''
+        return self._bank.get_mask(self._bank._down, self._row)
+
+    @_down.setter
+    def _down(self, mask: int) -> None:
+        self._bank.set_mask(self._bank._down, self._row, mask)
+        return
+
+    @property
+    def _direction(self) -> Direction:
+        return directions[self._bank._direction[self._row]]
+
+    @_direction.setter
+    def _direction(self, direction: Direction) -> None:
+        self._bank._direction[self._row] = direction_sign[direction]
+        return
+
+    @property
+    def _estate(self) -> ElevatorState:
+        return estates[self._bank._state[self._row]]
+
+    @_estate.setter
+    def _estate(self, estate: ElevatorState) -> None:
+        self._bank._state[self._row] = estate_code[estate]
+        return
+
+    @property
+    def _panel(self) -> ButtonWithLedPanel:
+        '''
+        Controls - create the control panel when first used
+        '''
+        panel = self._bank.panel(self._row)
+        if panel is None:
+            panel = ButtonWithLedPanel(
+                panel_labels(self._floors), self.panel_callback,
+                deltas=True)
+            self._bank.set_panel(self._row, panel)
+        return panel
+
+    @property
+    def bank(self) -> ElevatorBank:
+        return self._bank
+
+    @property
+    def row(self) -> int:
+        '''The row in the bank'''
+        return self._row
+
     def step_in(self, kilos: int) -> bool:
         '''
         passenger of weight kilos steps in
@@ -141,6 +697,14 @@ class Elevator:
             self._current_load = 0
         return True
 
+    @property
+    def id(self) -> str:
+        return self._id
+
+    @property
+    def name(self) -> str:
+        return self._name
+
     @property
     def floors(self) -> int:
         '''
@@ -159,11 +723,236 @@ class Elevator:
             return LoadValue.SOME
         return LoadValue.NONE
 
+    @property
+    def current_floor(self) -> int:
+        return self._current_floor
+
+    @property
+    def direction(self) -> Direction:
+        return self._direction
+
+    @property
+    def estate(self) -> ElevatorState:
+        '''Elevator state accessor'''
+        return self._estate
+
+    @property
+    def stops(self) -> List[int]:
+        '''
+        Floors to stop at, in no particular order
+        '''
+        mask = self._up | self._down
+        return [f for f in range(mask.bit_length()) if mask >> f & 1]
+
+    @property
+    def stops_mask(self) -> int:
+        '''
+        Floors to stop at as a bitmask
+        '''
+        return self._up | self._down
+
+    def has_stop(self, floor: int) -> bool:
+        return bool((self._up | self._down) >> floor & 1)
+
+    def add_stop(self, floor: int,
+                 direction: Optional[Direction] = None) -> None:
+        '''
+        Schedule a stop on the floor.
+        direction tells where the riders waiting on the floor are going,
+        when it is not known it is where the floor is relative to the
+        current one.
+        '''
+        assert 0 <= floor < self._floors
+        if direction is None or direction == Direction.NONE:
+            if floor > self._current_floor:
+                direction = Direction.UP
+            elif floor < self._current_floor:
+                direction = Direction.DOWN
+            else:
+                direction = self._direction
+        if direction == Direction.DOWN:
+            self._down |= 1 << floor
+        else:
+            self._up |= 1 << floor
+        return
+
+    def clear_stop(self, floor: int) -> None:
+        '''
+        No stop on the floor in either direction
+        '''
+        bit = 1 << floor
+        self._up &= ~bit
+        self._down &= ~bit
+        return
+
+    def scan_up(self) -> Optional[int]:
+        '''
+        Next stop going up from the current floor, current one included
+        '''
+        above = -1 << self._current_floor
+        mask = self._up & above
+        if mask:
+            # the nearest of the stops to be served going up
+            return lowest_floor(mask)
+        mask = self._down & above
+        if mask:
+            # the farthest of the stops to be served going down
+            return highest_floor(mask)
+        return None
+
+    def scan_down(self) -> Optional[int]:
+        '''
+        Next stop going down from the current floor, current one included
+        '''
+        below = (2 << self._current_floor) - 1
+        mask = self._down & below
+        if mask:
+            return highest_floor(mask)
+        mask = self._up & below
+        if mask:
+            return lowest_floor(mask)
+        return None
+
+    def next_stop(self) -> Optional[int]:
+        '''
+        The stop to go to next: the next one in the current direction,
+        if there are none - the next one in the opposite direction
+        '''
+        if self._direction == Direction.DOWN:
+            floor = self.scan_down()
+            return self.scan_up() if floor is None else floor
+        floor = self.scan_up()
+        return self.scan_down() if floor is None else floor
+
+    def head_to(self, floor: int) -> None:
+        '''
+        Set the direction to get to the floor
+        '''
+        if floor > self._current_floor:
+            self._direction = Direction.UP
+        elif floor < self._current_floor:
+            self._direction = Direction.DOWN
+        return
+
+    def arrive(self) -> None:
+        '''
+        Stopped on the current floor: clear the stop, the direction is kept
+        if there are more stops ahead, reversed otherwise
+        '''
+        floor = self._current_floor
+        bit = 1 << floor
+        ahead_up = (self._up | self._down) & (-2 << floor)
+        ahead_down = (self._up | self._down) & (bit - 1)
+        if self._direction == Direction.UP and ahead_up:
+            self._up &= ~bit
+        elif self._direction == Direction.DOWN and ahead_down:
+            self._down &= ~bit
+        else:
+            # reversing, or no more stops at all
+            self.clear_stop(floor)
+            if ahead_up:
+                self._direction = Direction.UP
+            elif ahead_down:
+                self._direction = Direction.DOWN
+            else:
+                self._direction = Direction.NONE
+        panel = self._bank.panel(self._row)
+        if panel is not None:
+            panel.reset_button(floor)
+        return
+
+    def step(self) -> ElevatorState:
+        '''
+        Advance the state machine by one transition: one floor when going.
+        Returns the new state.
+        '''
+        estate = self._estate
+        if estate == ElevatorState.IDLE:
+            floor = self.next_stop()
+            if floor is None:
+                return estate
+            if floor == self._current_floor:
+                self.arrive()
+                self._estate = ElevatorState.DOORS_OPENING
+            else:
+                self.head_to(floor)
+                self._estate = ElevatorState.GOING
+        elif estate == ElevatorState.GOING:
+            if self._direction == Direction.UP:
+                self._current_floor += 1
+            else:
+                self._current_floor -= 1
+            floor = self.next_stop()
+            if floor is None:
+                # the stops were cancelled
+                self._direction = Direction.NONE
+                self._estate = ElevatorState.IDLE
+            elif floor == self._current_floor:
+                self.arrive()
+                self._estate = ElevatorState.DOORS_OPENING
+            else:
+                self.head_to(floor)
+        elif estate == ElevatorState.DOORS_OPENING:
+            self._estate = ElevatorState.DOORS_OPENED
+            self._bank._door_timer[self._row] = self._bank.door_dwell
+        elif estate == ElevatorState.DOORS_OPENED:
+            self._bank._door_timer[self._row] -= 1
+            if self._bank._door_timer[self._row] <= 0:
+                self._estate = ElevatorState.DOORS_CLOSING
+        elif estate == ElevatorState.DOORS_CLOSING:
+            floor = self.next_stop()
+            if floor is None:
+                self._direction = Direction.NONE
+                self._estate = ElevatorState.IDLE
+            elif floor == self._current_floor:
+                # called while closing the doors
+                self.arrive()
+                self._estate = ElevatorState.DOORS_OPENING
+            else:
+                self.head_to(floor)
+                self._estate = ElevatorState.GOING
+        else:
+            assert False
+        return self._estate
+
+    def open_doors(self) -> bool:
+        '''
+        Open doors button, works unless going
+        '''
+        if self._estate in (ElevatorState.IDLE, ElevatorState.DOORS_CLOSING):
+            self._estate = ElevatorState.DOORS_OPENING
+            return True
+        return False
+
+    def close_doors(self) -> bool:
+        '''
+        Close doors button, works when the doors are opened
+        '''
+        if self._estate == ElevatorState.DOORS_OPENED:
+            self._estate = ElevatorState.DOORS_CLOSING
+            return True
+        return False
+
     def panel_callback(
-            self, panel: ButtonWithLedPanel, leds_on: List[int]) -> None:
+            self, panel: ButtonWithLedPanel,
+            changes: List[LedChange]) -> None:
         '''
-        Handle button press here.
+        Handle button press here: floor buttons schedule the stops,
+        the doors buttons are not latched.
         '''
+        for change in changes:
+            if not change.on:
+                continue
+            button = change.index
+            if button < self._floors:
+                if not self.has_stop(button):
+                    self.add_stop(button)
+            elif button == self._floors:
+                self.open_doors()
+                panel.reset_button(button)
+            else:
+                self.close_doors()
+                panel.reset_button(button)
         return
 
     def __repr__(self) -> str:
@@ -174,12 +963,55 @@ class Elevator:
             f"on {self._current_floor} floor {self._panel.annotated_labels} " \
             f"at {hex(id(self))}>"
 
-    def floor_call(self, floor: int) -> None:
+    def floor_call(self, floor: int,
+                   direction: Optional[Direction] = None) -> None:
         '''
         Request for the elevator to go to that floor.
+        direction is where the caller wants to go from there, if known.
         '''
+        self.add_stop(floor, direction)
         return
 
+    def press(self, floor: int) -> None:
+        '''
+        Destination floor button inside the elevator is pressed
+        '''
+        self._panel.click(floor)
+        return
+
+    def press_many(self, floors: Iterable[int]) -> None:
+        '''
+        Destination floor buttons pressed within one tick, handled at once
+        '''
+        panel = self._panel
+        with panel.batch():
+            for floor in floors:
+                panel.click(floor)
+        return
+
+    def to_dict(self) -> Dict[str, Any]:
+        '''
+        Same as to_response().model_dump(), only faster
+        '''
+        return {'id': self._id, 'name': self._name, 'floors': self._floors}
+
+    def to_delta(self) -> Dict[str, Any]:
+        '''
+        Same as ElevatorDelta(...).model_dump(), only faster
+        '''
+        estate = self._estate
+        panel = self._bank.panel(self._row)
+        return {
+            'id': self._id,
+            'floor': self._current_floor,
+            'state': estate.value,
+            'direction': self._direction.value,
+            'doors_open': estate in doors_open_states,
+            'stops': self.stops,
+            'lit': [] if panel is None else panel.leds_on,
+            'deleted': False,
+        }
+
     def to_response(self) -> ElevatorResponse:
         return ElevatorResponse(
             id=self._id, name=self._name, floors=self._floors)
@@ -192,12 +1024,231 @@ class ElevatorSimulton(Simulton):
     title = 'Elevator'
     description = 'Elevator API'
     version = '0.0.1'
+    checkpointable = True
+
+    # secs between the looks for the changes to push to the stream clients
+    stream_interval = 0.1
+    # max number of the changes sent to a stream client in a message
+    stream_batch = 1000
+    # simulated secs between the steps of the bank while running
+    step_interval = 1.0
 
     def __init__(self) -> None:
         '''
         Initializer
         '''
         super().__init__()
+        self._bank = ElevatorBank()
+        # the registry handles of the elevators by the bank row
+        self._by_row: Dict[int, int] = {}
+        # the LEDs of the panels restored, by the bank row
+        self._panel_leds: Dict[int, int] = {}
+        self._watcher = BankWatcher(self._bank)
+        self._hub = StreamHub()
+        # the last state of the elevators deleted since the last look, the
+        # bank rows they were in are freed and no longer tell their ids
+        self._deleted: Dict[str, Dict[str, Any]] = {}
+        self._stream_task: Optional[asyncio.Task] = None
+        # the next step of the bank, scheduled while running
+        self._step_event: Optional[Event] = None
+        return
+
+    @property
+    def bank(self) -> ElevatorBank:
+        '''All the elevators of the simulton'''
+        return self._bank
+
+    def add_instance(self, inst: Any, id: str) -> None:
+        super().add_instance(inst, id)
+        self._by_row[inst.row] = self._instances.handle(id)
+        self._watcher.forget(inst.row)
+        return
+
+    def del_instance_by_id(self, id: str) -> None:
+        '''Raises KeyError if id is not a key'''
+        el = self._instances.pop(id)
+        if self._hub:
+            delta = el.to_delta()
+            delta['deleted'] = True
+            self._deleted[id] = delta
+        del self._by_row[el.row]
+        self._bank.remove(el.row)
+        return
+
+    def on_running(self) -> None:
+        '''
+        The elevators move while running
+        '''
+        super().on_running()
+        if self._step_event is None:
+            self._step_event = self._engine.schedule_in(
+                self.step_interval, self.step_bank)
+        return
+
+    def on_paused(self) -> None:
+        super().on_paused()
+        self.stop_stepping()
+        return
+
+    def on_shutting(self) -> None:
+        super().on_shutting()
+        self.stop_stepping()
+        return
+
+    def stop_stepping(self) -> None:
+        '''
+        Cancel the next step of the bank, if any
+        '''
+        if self._step_event is not None:
+            self._engine.cancel(self._step_event)
+            self._step_event = None
+        return
+
+    def step_bank(self) -> None:
+        '''
+        Engine event: step all the elevators at once, schedule the next step
+        '''
+        self._bank.step()
+        self._step_event = self._engine.schedule_in(
+            self.step_interval, self.step_bank)
+        return
+
+    def on_shutdown(self) -> None:
+        if self._stream_task is not None:
+            self._stream_task.cancel()
+            self._stream_task = None
+        super().on_shutdown()
+        return
+
+    def dump_instances(self) -> Dict[str, np.ndarray]:
+        '''
+        The bank, the rows and the names of the elevators by the registry
+        slot
+        '''
+        arrays = {
+            f'bank.{name}': array for name, array in self._bank.dump().items()
+        }
+        capacity = self._instances.capacity
+        rows = np.full(capacity, -1, dtype=np.int64)
+        names = [''] * capacity
+        for index, el in self._instances.slots():
+            rows[index] = el.row
+            names[index] = el.name
+        (blob, ends) = pack_strings(names)
+        arrays['instances.rows'] = rows
+        arrays['instances.names'] = blob
+        arrays['instances.name_ends'] = ends
+        return arrays
+
+    def load_instances(
+            self, ckpt: Checkpoint) -> Callable[[int, str], Elevator]:
+        '''
+        Restore the bank, the elevators are the views of its rows
+        '''
+        prefix = 'bank.'
+        self._bank.load({
+            name[len(prefix):]: ckpt[name]
+            for name in ckpt if name.startswith(prefix)
+        })
+        self._watcher = BankWatcher(self._bank)
+        rows = ckpt['instances.rows']
+        blob = ckpt['instances.names']
+        ends = ckpt['instances.name_ends']
+        slots = np.flatnonzero(rows >= 0)
+        handles = ckpt['registry.generations'][slots] << \
+            InstanceRegistry.index_bits | slots
+        self._by_row = dict(zip(rows[slots].tolist(), handles.tolist()))
+        self._panel_leds = {
+            row: int.from_bytes(leds.tobytes(), 'little')
+            for row, leds in zip(ckpt['bank.panel_rows'].tolist(),
+                                 ckpt['bank.panel_leds'])
+        }
+
+        def load(index: int, id: str) -> Elevator:
+            row = int(rows[index])
+            el = Elevator.view(
+                self, id, unpack_string(blob, ends, index), self._bank, row)
+            leds = self._panel_leds.pop(row, None)
+            if leds is not None:
+                el._panel.leds_mask = leds
+            return el
+
+        return load
+
+    def restore(self, path: str) -> CheckpointResponse:
+        resp = super().restore(path)
+        # the lit panels are created right away, they need their elevators
+        for row in list(self._panel_leds):
+            self._instances.get_by_handle(self._by_row[row])
+        return resp
+
+    def subscribe(self, ids: Optional[List[str]]) -> StreamClient:
+        '''
+        New stream client of the elevators with the ids, of all of them if
+        none, gets their current state first
+        '''
+        client = StreamClient()
+        if not self._hub:
+            # the changes from now on
+            self._watcher.changed_rows()
+            self._deleted.clear()
+        self._hub.add(client)
+        self.resubscribe(client, ids)
+        if self._stream_task is None or self._stream_task.done():
+            self._stream_task = asyncio.create_task(self.stream_loop())
+        return client
+
+    def resubscribe(self, client: StreamClient,
+                    ids: Optional[List[str]]) -> None:
+        '''
+        Replace the subscription, the client gets the current state of the
+        elevators
+        '''
+        client.subscribe(ids)
+        if client.keys is None:
+            items = self._instances.items()
+        else:
+            items = ((id, self._instances.get(id)) for id in client.keys)
+        for id, el in items:
+            if el is not None:
+                client.queue.put(id, el.to_delta())
+        return
+
+    def row_id(self, row: int) -> str:
+        '''
+        The id of the elevator in the bank row, no instance is created
+        '''
+        return self._instances.to_id(self._by_row[row])
+
+    def unsubscribe(self, client: StreamClient) -> None:
+        self._hub.discard(client)
+        return
+
+    def publish_changes(self) -> int:
+        '''
+        Enqueue the state of the elevators changed since the last call to
+        the clients subscribed, the deleted ones flagged as such, returns
+        the number of the changes
+        '''
+        rows = self._watcher.changed_rows()
+        wanted = self._hub.keys()
+        for row in rows.tolist():
+            el = self._instances.get_by_handle(self._by_row[row])
+            if wanted is None or el.id in wanted:
+                self._hub.publish(el.id, el.to_delta())
+        deleted = self._deleted
+        self._deleted = {}
+        for id, delta in deleted.items():
+            self._hub.publish(id, delta)
+        return len(rows) + len(deleted)
+
+    async def stream_loop(self) -> None:
+        '''
+        Look for the changes while there are stream clients
+        '''
+        while self._hub:
+            await asyncio.sleep(self.stream_interval)
+            self.publish_changes()
         return
 
 
@@ -228,7 +1279,8 @@ async def get_simulton():
     print('get elevator simulton')
     global theElevatorSimulton
     assert theElevatorSimulton is not None
-    return theElevatorSimulton.to_response()
+    return FastJSONResponse(
+        content=theElevatorSimulton.to_response().model_dump())
 
 
 @app.put('/api/v1/simulton')
@@ -241,18 +1293,38 @@ async def put_simulton(req: SimultonRequest):
     return theElevatorSimulton.on_put_simulton(req)
 
 
+@app.post('/api/v1/simulton/checkpoint', response_model=CheckpointResponse,
+          responses={400: {"model": Message}})
+async def checkpoint_simulton(params: CheckpointParams):
+    '''
+    Write all the elevators into the checkpoint file
+    '''
+    global theElevatorSimulton
+    assert theElevatorSimulton is not None
+    return theElevatorSimulton.on_checkpoint(params)
+
+
 @app.get('/api/v1/elevators/', response_model=Dict[str, ElevatorResponse])
-async def get_instances():
+async def get_instances(limit: Optional[PositiveInt] = None,
+                        after: Optional[str] = None, stream: bool = False):
     '''
-    Get all the elevators
+    Get all the elevators, or a page of up to limit ones after the id given,
+    or stream them as NDJSON
     '''
     global theElevatorSimulton
     if theElevatorSimulton is None:
         return {}
-    return {
-        id: el.to_response().model_dump()
-        for id, el in theElevatorSimulton.instances.items()
-    }
+    if limit is None and after is None and not stream:
+        return FastJSONResponse(content={
+            id: el.to_dict()
+            for id, el in theElevatorSimulton.instances.items()
+        })
+    try:
+        return theElevatorSimulton.list_response(
+            lambda id, el: el.to_dict(), limit, after, stream)
+    except KeyError as err:
+        content = Message(f'Bummer: {err}').model_dump()
+        return JSONResponse(status_code=400, content=content)
 
 
 @app.post(
@@ -266,7 +1338,93 @@ async def create_instance(params: NewElevatorParams):
     global theElevatorSimulton
     assert theElevatorSimulton is not None
     el = Elevator(theElevatorSimulton, params.name, params.floors)
-    return el.to_response().model_dump()
+    return FastJSONResponse(status_code=201, content=el.to_dict())
+
+
+@app.post('/api/v1/elevators:batch', response_model=BatchResponse)
+async def create_instances(params: List[Any] = Body()):
+    '''
+    Handle creation of many elevators at once.  Every item is a
+    NewElevatorParams, validated on its own: an invalid one gets 422 in its
+    item, the others are created.
+    '''
+    global theElevatorSimulton
+    assert theElevatorSimulton is not None
+    sim = theElevatorSimulton
+    return sim.create_many(
+        params, NewElevatorParams,
+        lambda p: Elevator(sim, p.name, p.floors).id)
+
+
+@app.post('/api/v1/elevators:batchDelete', response_model=BatchResponse)
+async def delete_elevators(ids: List[str] = Body()):
+    '''
+    Delete many elevators at once
+    '''
+    assert theElevatorSimulton is not None
+    return theElevatorSimulton.delete_many(ids)
+
+
+@app.post(
+    '/api/v1/elevators:dispatch',
+    response_model=DispatchResponse,
+    responses={400: {"model": Message}})
+async def dispatch_hall_call(params: HallCallParams):
+    '''
+    Assign the hall call to one of the elevators
+    '''
+    # imported here to avoid circular dependency
+    from .dispatch import GroupController
+    global theElevatorSimulton
+    assert theElevatorSimulton is not None
+    start = time.time()
+    controller = GroupController(theElevatorSimulton.bank)
+    try:
+        (row, cost) = controller.assign(params.floor, params.direction)
+    except ValueError as err:
+        content = Message(f'Bummer: {err}').model_dump()
+        return JSONResponse(status_code=400, content=content)
+    return DispatchResponse(
+        id=theElevatorSimulton.row_id(row), cost=cost,
+        elapsed=time.time() - start)
+
+
+@app.websocket('/api/v1/elevators/stream')
+async def stream_elevators(websocket: WebSocket,
+                           ids: List[str] = Query(default=[])):
+    '''
+    Push the state changes of the elevators with the ids, of all of them if
+    none, as JSON lists of ElevatorDelta.  The client replaces the
+    subscription by sending StreamSubscription.
+    '''
+    global theElevatorSimulton
+    assert theElevatorSimulton is not None
+    sim = theElevatorSimulton
+    await websocket.accept()
+    client = sim.subscribe(ids)
+
+    async def send_loop() -> None:
+        while True:
+            deltas = await client.queue.get(sim.stream_batch)
+            await websocket.send_text(dumps(deltas).decode())
+
+    sender = asyncio.create_task(send_loop())
+    try:
+        while True:
+            text = await websocket.receive_text()
+            try:
+                sub = StreamSubscription.model_validate_json(text)
+            except ValueError as err:
+                content = Message(f'Bummer: {err}').model_dump()
+                await websocket.send_json(content)
+                continue
+            sim.resubscribe(client, sub.ids)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        sim.unsubscribe(client)
+    return
 
 
 @app.get('/api/v1/elevators/{id}', response_model=ElevatorResponse,
@@ -279,7 +1437,7 @@ async def get_elevator(id: str):
     assert theElevatorSimulton is not None
     try:
         el = theElevatorSimulton.get_instance_by_id(id)
-        return el.to_response().model_dump()
+        return FastJSONResponse(content=el.to_dict())
     except KeyError:
         pass
     content = Message("Item not found").model_dump()
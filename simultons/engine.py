@@ -0,0 +1,331 @@
+'''
+Discrete-event simulation engine: a heap of the timestamped events and
+a virtual clock which jumps straight from one event to the next one.
+
+Every simulton has an engine.  How the virtual time relates to the wall clock
+is up to the pacing policy:
+
+* WALL_CLOCK - the virtual time advances at rate times the wall clock,
+  the events are processed when their time comes;
+* AS_FAST_AS_POSSIBLE - the virtual time jumps to the next event right away,
+  the engine yields to the event loop every batch events;
+* LOCKSTEP - the virtual time advances only when the simulation says so,
+  by run_until().
+'''
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from typing import Any, Callable, Iterator, List, Optional
+from . import Pacing
+
+
+class Event:
+    '''
+    Scheduled call of callback(*args) at the virtual time
+    '''
+    __slots__ = ('time', 'seq', 'callback', 'args')
+
+    def __init__(self, time: float, seq: int,
+                 callback: Callable[..., Any], args: tuple) -> None:
+        self.time = time
+        # events scheduled for the same time are processed in FIFO order
+        self.seq = seq
+        self.callback: Optional[Callable[..., Any]] = callback
+        self.args = args
+        return
+
+    def __lt__(self, other: 'Event') -> bool:
+        return (self.time, self.seq) < (other.time, other.seq)
+
+    @property
+    def cancelled(self) -> bool:
+        return self.callback is None
+
+    def __repr__(self) -> str:
+        '''
+        Object print representation
+        '''
+        return f'<{type(self).__qualname__} {self.seq} at {self.time}' \
+            f' {"cancelled" if self.cancelled else self.callback}>'
+
+
+class Engine:
+    '''
+    Event scheduler with the virtual clock
+    '''
+    # events processed before yielding to the event loop
+    batch = 1000
+
+    def __init__(self, pacing: Pacing = Pacing.WALL_CLOCK) -> None:
+        '''
+        Initializer, the engine is paused
+        '''
+        self._pacing = pacing
+        self._rate: float = 1.0
+        self._queue: List[Event] = []
+        self._seq: Iterator[int] = itertools.count()
+        # virtual time at the wall clock _anchor
+        self._base: float = 0
+        self._anchor: float = 0
+        # time of the event being processed, if any
+        self._current: Optional[float] = None
+        self._running = False
+        self._task: Optional[asyncio.Task] = None
+        # set when the run loop should re-evaluate what to wait for
+        self._wakeup = asyncio.Event()
+        self._processed = 0
+        # if set, the virtual time with WALL_CLOCK pacing is read from it
+        # instead of being extrapolated from the local anchor
+        self.reference: Optional[Callable[[], float]] = None
+        return
+
+    @property
+    def pacing(self) -> Pacing:
+        '''Pacing policy accessor'''
+        return self._pacing
+
+    @pacing.setter
+    def pacing(self, pacing: Pacing) -> Pacing:
+        if pacing == self._pacing:
+            return pacing
+        self.rebase()
+        self._pacing = pacing
+        self._wakeup.set()
+        return pacing
+
+    @property
+    def rate(self) -> float:
+        '''Virtual seconds per wall clock second with WALL_CLOCK pacing'''
+        return self._rate
+
+    @rate.setter
+    def rate(self, rate: float) -> float:
+        assert rate > 0
+        if rate == self._rate:
+            return rate
+        self.rebase()
+        self._rate = rate
+        self._wakeup.set()
+        return rate
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    @property
+    def processed(self) -> int:
+        '''Number of the events processed so far'''
+        return self._processed
+
+    def __len__(self) -> int:
+        '''Number of the scheduled events, cancelled ones included'''
+        return len(self._queue)
+
+    @property
+    def now(self) -> float:
+        '''
+        Current virtual time.  With WALL_CLOCK pacing it is extrapolated from
+        the wall clock but never gets ahead of an event yet to be processed.
+        '''
+        if self._current is not None:
+            return self._current
+        if not self._running or self._pacing != Pacing.WALL_CLOCK:
+            return self._base
+        now = self.wall_time()
+        next_time = self.next_time()
+        if next_time is not None and next_time < now:
+            return next_time
+        return now
+
+    def wall_time(self) -> float:
+        '''
+        Virtual time extrapolated from the wall clock
+        '''
+        if self.reference is not None:
+            return self.reference()
+        return self._base + (time.monotonic() - self._anchor) * self._rate
+
+    def advance(self, to: float) -> None:
+        '''
+        Jump the virtual time forward, if it is not there yet
+        '''
+        if to > self.now:
+            self._base = to
+            self._anchor = time.monotonic()
+        return
+
+    def rebase(self) -> None:
+        '''
+        Anchor the current virtual time to the current wall clock time
+        '''
+        self._base = self.now
+        self._anchor = time.monotonic()
+        return
+
+    def schedule(self, at: float, callback: Callable[..., Any],
+                 *args: Any) -> Event:
+        '''
+        Schedule callback(*args) at the virtual time, the past is now
+        '''
+        now = self.now
+        if at < now:
+            at = now
+        ev = Event(at, next(self._seq), callback, args)
+        if not self._queue or ev < self._queue[0]:
+            # the run loop may be waiting for a later event
+            self._wakeup.set()
+        heapq.heappush(self._queue, ev)
+        return ev
+
+    def schedule_in(self, delay: float, callback: Callable[..., Any],
+                    *args: Any) -> Event:
+        '''
+        Schedule callback(*args) delay virtual seconds from now
+        '''
+        return self.schedule(self.now + delay, callback, *args)
+
+    def cancel(self, ev: Event) -> None:
+        '''
+        The event stays in the queue until it reaches the top
+        '''
+        ev.callback = None
+        ev.args = ()
+        return
+
+    def next_time(self) -> Optional[float]:
+        '''
+        Time of the next event, None if there are none
+        '''
+        queue = self._queue
+        while queue and queue[0].callback is None:
+            heapq.heappop(queue)
+        return queue[0].time if queue else None
+
+    def dispatch(self, ev: Event) -> None:
+        '''
+        Process the event just popped from the queue
+        '''
+        callback = ev.callback
+        if callback is None:
+            return
+        self.advance(ev.time)
+        self._current = ev.time
+        try:
+            callback(*ev.args)
+        except Exception as err:
+            print('Engine.dispatch', ev, 'caught', type(err), err)
+        finally:
+            self._current = None
+        self._processed += 1
+        return
+
+    def process(self, until: float, limit: Optional[int] = None) -> int:
+        '''
+        Process up to limit events scheduled at or before until.
+        Returns the number of the events processed.
+        '''
+        queue = self._queue
+        num = 0
+        while queue and queue[0].time <= until:
+            if limit is not None and num >= limit:
+                break
+            ev = heapq.heappop(queue)
+            if ev.callback is None:
+                continue
+            self.dispatch(ev)
+            num += 1
+        return num
+
+    def step(self) -> bool:
+        '''
+        Process the next event, if any, regardless of the pacing
+        '''
+        next_time = self.next_time()
+        if next_time is None:
+            return False
+        self.dispatch(heapq.heappop(self._queue))
+        return True
+
+    def run_until(self, until: float) -> int:
+        '''
+        Process all the events up to the virtual time until as fast as
+        possible, regardless of the pacing, then jump to until.
+        Returns the number of the events processed.
+        '''
+        num = self.process(until)
+        self.advance(until)
+        return num
+
+    def start(self, rate: Optional[float] = None) -> None:
+        '''
+        Start the virtual clock, has to be called from the event loop
+        '''
+        if rate is not None:
+            self.rate = rate
+        if self._running:
+            return
+        self._anchor = time.monotonic()
+        self._running = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # no event loop, e.g. a proxy: the clock runs, but the events
+            # are processed only by step() and run_until()
+            return
+        self._task = loop.create_task(self.run())
+        return
+
+    def pause(self) -> None:
+        '''
+        Stop the virtual clock
+        '''
+        if not self._running:
+            return
+        self._base = self.now
+        self._running = False
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        return
+
+    async def wait(self, timeout: Optional[float]) -> None:
+        '''
+        Wait for the timeout to expire or for the wakeup, whichever is first
+        '''
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return
+
+    async def run(self) -> None:
+        '''
+        Background task processing the events while running
+        '''
+        print('Engine.run', self._pacing, 'at', self._rate)
+        while self._running:
+            if self._pacing == Pacing.LOCKSTEP:
+                # advanced by the ticks only, see run_until()
+                await self.wait(None)
+                continue
+            if self._pacing == Pacing.AS_FAST_AS_POSSIBLE:
+                if self.next_time() is None:
+                    await self.wait(None)
+                else:
+                    self.process(math.inf, self.batch)
+                    await asyncio.sleep(0)
+                continue
+            next_time = self.next_time()
+            if next_time is None:
+                await self.wait(None)
+                continue
+            delay = (next_time - self.wall_time()) / self._rate
+            if delay > 0:
+                await self.wait(delay)
+                continue
+            self.process(self.wall_time(), self.batch)
+            await asyncio.sleep(0)
+        return
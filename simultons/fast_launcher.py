@@ -1,28 +1,44 @@
 '''
 FastAPI process launcher
 '''
+import asyncio
+import json
 import os
+import select
 import signal
 import subprocess
 import time
-from typing import Any, Dict, Optional
+from typing import IO, Any, Dict, List, Optional, Union
 import httpx
-from . import rest_client
+from . import rest_client, async_rest_client, ProcessExitResponse
+from .globals import ready_fd_env, host_env, port_env
+from .zygote import Zygote, ZygoteProcess
 
 
 class FastLauncher:
     '''
     FastAPI Service Launcher
     '''
+    # secs between the HTTP polls when the service does not announce
+    # its readiness
+    fallback_interval = 1.0
 
-    def __init__(self, path: str, port: int) -> None:
+    def __init__(self, path: str, port: int,
+                 zygote: Optional[Zygote] = None) -> None:
         '''
         path - to the python file which has FastAPI global app defined
+        zygote - if given, the process is forked by the zygote instead of
+        being launched using fastapi CLI
         '''
         self._host = '127.0.0.1'
         self._path = path
         self._port = port
-        self._popen: Optional[subprocess.Popen] = None
+        self._zygote = zygote
+        self._popen: Optional[Union[subprocess.Popen, ZygoteProcess]] = None
+        # read end of the pipe the service announces its readiness into
+        self._ready: Optional[int] = None
+        # the output pipes are drained by someone else
+        self._output_detached = False
         #
         # control REST client verbosity
         #
@@ -41,10 +57,25 @@ class FastLauncher:
         '_port accessor'
         return self._port
 
-    def launch(self, stdout=subprocess.PIPE, stderr=subprocess.PIPE) -> int:
+    @property
+    def path(self) -> str:
+        '_path accessor'
+        return self._path
+
+    def launch(self, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+               env: Optional[Dict[str, str]] = None) -> int:
         '''
         start the FastAPI service process, returns service process pid
+        env - added to the environment of the process
         '''
+        if self._zygote is not None:
+            # stderr goes to stdout
+            self._popen = self._zygote.spawn(
+                self._path, self._host, self._port, env)
+            self._ready = self._popen.ready
+            print('zygote spawned:', self._path, self._popen.pid)
+            return self._popen.pid
+
         parent_dir = os.path.abspath(
             os.path.dirname(os.path.realpath(__file__)) + '/..')
         command_line = [
@@ -52,15 +83,54 @@ class FastLauncher:
             '--port', str(self._port), '--workers', str(1), self._path
         ]
         print('command_line:', command_line)
+        (self._ready, ready_w) = os.pipe()
+        penv = dict(os.environ)
+        penv.update(env or {})
+        penv[ready_fd_env] = str(ready_w)
+        penv[host_env] = self._host
+        penv[port_env] = str(self._port)
+        # in its own process group, so that the whole group can be signalled
         self._popen = subprocess.Popen(
             command_line, cwd=parent_dir, stdout=stdout, stderr=stderr,
-            text=True)
+            text=True, env=penv, pass_fds=(ready_w,), start_new_session=True)
+        # only the child should hold the write end, so that we see EOF
+        # if it dies before the announcement
+        os.close(ready_w)
         return self._popen.pid
 
+    def read_ready(self) -> Optional[Dict[str, Any]]:
+        '''
+        Read the readiness announcement once the ready pipe is readable.
+        The announcement is a single JSON line written atomically.
+        The pipe is closed afterwards.
+        Returns None if the pipe was closed without the announcement.
+        '''
+        assert self._ready is not None
+        data = os.read(self._ready, 4096)
+        self.close_ready()
+        if not data:
+            return None
+        try:
+            return json.loads(data)
+        except json.JSONDecodeError as err:
+            print('FastLauncher.read_ready caught', err, data)
+        return None
+
+    def close_ready(self) -> None:
+        '''
+        Close the read end of the ready pipe, if still open
+        '''
+        if self._ready is not None:
+            os.close(self._ready)
+            self._ready = None
+        return
+
     def wait_until_reachable(
             self, health_uri: str, timeout: int) -> Optional[Dict[str, Any]]:
         '''
         give some room for the process to start.
+        Waits for the readiness announcement, which is expected to be the
+        same JSON health_uri produces, polls health_uri only as a fallback.
         Returns a JSON produced by health_uri
         '''
         url = f'http://{self._host}:{self._port}{health_uri}'
@@ -69,16 +139,27 @@ class FastLauncher:
         print(f'wait_until_reachable({url}, {timeout})', end='', flush=True)
         assert self._popen is not None
         while time.time() < time_to_timeout:
-            try:
-                self._popen.wait(0.2)
-                # if we are here, this means the process has terminated
+            wait = min(self.fallback_interval, time_to_timeout - time.time())
+            if self._ready is not None:
+                (readable, _, _) = select.select(
+                    [self._ready], [], [], max(wait, 0))
+                if readable:
+                    jres = self.read_ready()
+                    if jres is not None:
+                        print(f'\nwait_until_reachable({url}, {timeout})'
+                              f' => {jres}, announced after'
+                              f' {time.time()-start:.2f} secs')
+                        return jres
+            else:
+                time.sleep(max(wait, 0))
+
+            if self._popen.poll() is not None:
+                # the process has terminated
                 print(f'\nwait_until_reachable({url}, {timeout}) => None,'
                       f' after {time.time()-start:.2f} secs,'
                       ' process terminated')
                 return None
-
-            except subprocess.TimeoutExpired:
-                print('.', end='', flush=True)
+            print('.', end='', flush=True)
 
             try:
                 # are we there yet?
@@ -98,6 +179,79 @@ class FastLauncher:
         print(f'\nwait_until_reachable({url}, {timeout}) => None')
         return None
 
+    def on_readable(self, loop: asyncio.AbstractEventLoop,
+                    readable: asyncio.Future) -> None:
+        '''
+        The readiness pipe is readable.  The reader is level-triggered, it
+        is removed first so that it does not fire again.
+        '''
+        assert self._ready is not None
+        loop.remove_reader(self._ready)
+        if not readable.done():
+            readable.set_result(None)
+        return
+
+    async def async_wait_until_reachable(
+            self, health_uri: str, timeout: float) -> Optional[Dict[str, Any]]:
+        '''
+        Same as wait_until_reachable but does not block the event loop,
+        so that many launchers can be awaited concurrently.
+        Returns a JSON produced by health_uri
+        '''
+        url = f'http://{self._host}:{self._port}{health_uri}'
+        start = time.time()
+        time_to_timeout = start + timeout
+        print(f'async_wait_until_reachable({url}, {timeout})')
+        assert self._popen is not None
+        loop = asyncio.get_running_loop()
+        async with httpx.AsyncClient(timeout=0.1) as client:
+            while time.time() < time_to_timeout:
+                wait = min(
+                    self.fallback_interval, time_to_timeout - time.time())
+                if self._ready is not None:
+                    readable = loop.create_future()
+                    loop.add_reader(
+                        self._ready, self.on_readable, loop, readable)
+                    try:
+                        await asyncio.wait_for(readable, max(wait, 0))
+                    except asyncio.TimeoutError:
+                        pass
+                    finally:
+                        loop.remove_reader(self._ready)
+                    if readable.done() and not readable.cancelled():
+                        jres = self.read_ready()
+                        if jres is not None:
+                            print(
+                                f'async_wait_until_reachable({url},'
+                                f' {timeout}) => {jres}, announced after'
+                                f' {time.time()-start:.2f} secs')
+                            return jres
+                else:
+                    await asyncio.sleep(max(wait, 0))
+
+                if self._popen.poll() is not None:
+                    # the process has terminated
+                    print(f'async_wait_until_reachable({url}, {timeout})'
+                          f' => None, after {time.time()-start:.2f} secs,'
+                          ' process terminated')
+                    return None
+                try:
+                    # are we there yet?
+                    x = await client.get(url)
+                    if x.status_code == 200:
+                        # YES!
+                        jres = x.json()
+                        print(
+                            f'async_wait_until_reachable({url}, {timeout})'
+                            f' => {jres}, after {time.time()-start:.2f} secs')
+                        return jres
+
+                except (httpx.ConnectError, httpx.TimeoutException):
+                    pass
+
+        print(f'async_wait_until_reachable({url}, {timeout}) => None')
+        return None
+
     def wait_to_die(self, timeout: float = 0.5) -> bool:
         assert self._popen is not None
         if self._popen.returncode is not None:
@@ -123,29 +277,76 @@ class FastLauncher:
                   timeout, 'secs')
         return False
 
-    def shutdown(self, timeout: float = 0.5) -> bool:
+    @property
+    def pid(self) -> Optional[int]:
+        'service process pid, if launched'
+        return None if self._popen is None else self._popen.pid
+
+    def poll(self) -> Optional[int]:
         '''
-        Stop the FastAPI service process
+        Returns the service process exit code or None if it is still alive
         '''
         assert self._popen is not None
-        if self._popen.returncode is None:
-            try:
-                os.kill(self._popen.pid, signal.SIGINT)
-            except ProcessLookupError:
-                print('Failed to locate process:', self._popen.pid)
-        else:
+        return self._popen.poll()
+
+    def send_signal(self, sig: int) -> bool:
+        '''
+        Signal the service process group, unless the process is already down
+        '''
+        assert self._popen is not None
+        if self._popen.poll() is not None:
             print('FastAPI is already down, ec:', self._popen.returncode)
+            return False
+        try:
+            os.killpg(self._popen.pid, sig)
+            return True
+        except ProcessLookupError:
+            print('Failed to locate process:', self._popen.pid)
+        return False
+
+    def shutdown(self, timeout: float = 0.5) -> bool:
+        '''
+        Stop the FastAPI service process, kill it if it fails to stop within
+        timeout secs
+        '''
+        assert self._popen is not None
+        self.send_signal(signal.SIGINT)
         #
         # wait for the process to actually terminate
         #
         res = self.wait_to_die(timeout)
+        if not res and self.send_signal(signal.SIGKILL):
+            self.wait_to_die(timeout)
+        self.finalize()
+        return res
+
+    def detach_output(self) -> List[IO]:
+        '''
+        Hand over the service output pipes to the caller, e.g. LogPump
+        '''
+        assert self._popen is not None
+        self._output_detached = True
+        return [
+            stream for stream in (self._popen.stdout, self._popen.stderr)
+            if stream is not None
+        ]
+
+    def finalize(self) -> None:
+        '''
+        The service process has terminated: print its output, release
+        the resources
+        '''
+        assert self._popen is not None
         #
         # get the child's stdout and stderr
         #
         stdout_value = ''
         stderr_value = ''
         try:
-            stdout_value, stderr_value = self._popen.communicate()
+            if self._output_detached:
+                self._popen.wait()
+            else:
+                stdout_value, stderr_value = self._popen.communicate()
         except Exception as err:
             print('Caught while tying to communicate with', self._popen.pid,
                   err)
@@ -162,13 +363,22 @@ class FastLauncher:
         if output_produced:
             print(dashes, self._path, self._popen.pid, 'end', dashes)
 
+        self.close_ready()
         # close the socket
-        self._restc.close()
-        self._restc = None
-        return res
+        if self._restc is not None:
+            self._restc.close()
+            self._restc = None
+        return
 
-    def get_rest_client(self, verbose: bool, dumpHeaders: bool):
-        return rest_client(self._host, self._port, verbose, dumpHeaders)
+    def get_rest_client(self, verbose: bool, dumpHeaders: bool,
+                        timeout: Optional[float] = 5.0):
+        return rest_client(
+            self._host, self._port, verbose, dumpHeaders, timeout)
+
+    def get_async_rest_client(self, verbose: bool, dumpHeaders: bool,
+                              timeout: Optional[float] = 5.0):
+        return async_rest_client(
+            self._host, self._port, verbose, dumpHeaders, timeout)
 
     def read_stdout(self) -> Optional[int]:
         '''
@@ -192,3 +402,45 @@ class FastLauncher:
             ec = self._popen.poll()
         print(dashes, self._path, self._popen.pid, 'end', dashes)
         return ec
+
+
+async def shutdown_launchers(
+        launchers: List[FastLauncher],
+        deadline: float = 3.0) -> List[ProcessExitResponse]:
+    '''
+    Stop all the service processes at once: signal all the process groups,
+    wait for all of them concurrently, kill the survivors at the deadline.
+    The total time is bounded by the deadline (secs), not by the number of
+    the processes.
+    Returns the exit times of the processes.
+    '''
+    start = time.time()
+    for launcher in launchers:
+        launcher.send_signal(signal.SIGINT)
+    exits: Dict[FastLauncher, ProcessExitResponse] = {}
+    pending = [launcher for launcher in launchers]
+    killed = False
+    while pending:
+        for launcher in pending:
+            ec = launcher.poll()
+            if ec is not None:
+                assert launcher.pid is not None
+                exits[launcher] = ProcessExitResponse(
+                    port=launcher.port, pid=launcher.pid, returncode=ec,
+                    elapsed=time.time() - start, killed=killed)
+        pending = [launcher for launcher in pending if launcher not in exits]
+        if not pending:
+            break
+        if not killed and time.time() - start >= deadline:
+            print('shutdown_launchers: killing', len(pending), 'survivors')
+            for launcher in pending:
+                launcher.send_signal(signal.SIGKILL)
+            killed = True
+        await asyncio.sleep(0.01)
+
+    for launcher in launchers:
+        launcher.finalize()
+    res = [exits[launcher] for launcher in launchers]
+    print(f'shutdown_launchers: {len(res)} processes down after'
+          f' {time.time() - start:.3f} secs')
+    return res
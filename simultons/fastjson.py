@@ -0,0 +1,43 @@
+'''
+Fast path for serializing the trusted internal data: plain dicts straight
+into JSON bytes, no pydantic models built, no response_model validation.
+
+orjson is used if installed, pydantic-core otherwise - both are way faster
+than the standard json module.
+'''
+from typing import Any, Dict, List
+from fastapi.responses import JSONResponse
+import pydantic_core
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    '''
+    Serialize the content to JSON bytes
+    '''
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    return pydantic_core.to_json(content)
+
+
+def dumps_lines(contents: List[Dict[str, Any]]) -> bytes:
+    '''
+    Serialize the contents to NDJSON bytes, a line each
+    '''
+    if not contents:
+        return b''
+    return b'\n'.join(dumps(content) for content in contents) + b'\n'
+
+
+class FastJSONResponse(JSONResponse):
+    '''
+    JSON response of the content already in the shape of the response
+    model: returning it from a handler skips the validation
+    '''
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -2,3 +2,28 @@
 # simulation_zspec = "ipc:///var/run/sss"
 simulation_zspec = 'ipc:///tmp/sss'
 simulation_ztopic = 'simulation'
+# lockstep ticks are published next to the state updates, the topic must not
+# be a prefix of simulation_ztopic or vice versa
+tick_ztopic = 'tick'
+# simultons acknowledge the ticks here
+ack_zspec = 'ipc:///tmp/sss-ack'
+# simultons ask for the latest state update here, REQ/REP
+snapshot_zspec = 'ipc:///tmp/sss-snapshot'
+# paginated listings: the id to continue after
+next_after_header = 'X-Next-After'
+# simulated time shared by the simulation, see shmtime.py
+shared_time_path = '/tmp/sss.time'
+# set by the simulation for the simultons to find the shared time
+shared_time_env = 'SIMULTONS_SHARED_TIME'
+# when set, simultons are forked by the zygote which keeps that many
+# idle warm workers, e.g. SIMULTONS_ZYGOTE=2
+zygote_env = 'SIMULTONS_ZYGOTE'
+# set by the launcher for the launched service: the write end of the pipe
+# to announce the readiness into, service host and port
+ready_fd_env = 'SIMULTON_READY_FD'
+host_env = 'SIMULTON_HOST'
+port_env = 'SIMULTON_PORT'
+# when set, the simulton restores its instances from the checkpoint file
+restore_env = 'SIMULTON_RESTORE'
+# when set, the output of every simulton is spilled into a file there
+log_dir_env = 'SIMULTONS_LOG_DIR'
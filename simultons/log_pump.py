@@ -0,0 +1,203 @@
+'''
+Continuously drain the output of the simulton processes into bounded
+per-simulton ring buffers, so that a chatty simulton never stalls on a full
+pipe.
+'''
+import asyncio
+from collections import deque
+import os
+import select
+from typing import IO, Deque, Dict, List, Optional, Set
+
+
+class LogRing:
+    '''
+    Bounded ring of the most recent output lines of a process.
+    Optionally spills every line into a file.
+    '''
+    # max number of the lines queued for a single streaming subscriber
+    subscriber_maxsize = 1000
+
+    def __init__(self, maxlen: int, spill_path: Optional[str] = None) -> None:
+        '''
+        maxlen - number of the most recent lines to keep
+        spill_path - file to append all the lines to
+        '''
+        self._lines: Deque[str] = deque(maxlen=maxlen)
+        self._spill: Optional[IO] = None
+        if spill_path is not None:
+            self._spill = open(spill_path, 'a')
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._closed = False
+        return
+
+    @property
+    def closed(self) -> bool:
+        '''No more lines to come'''
+        return self._closed
+
+    def append(self, line: str) -> None:
+        '''
+        Add a line, let the subscribers know
+        '''
+        self._lines.append(line)
+        if self._spill is not None:
+            self._spill.write(line)
+            self._spill.write('\n')
+        for q in self._subscribers:
+            if q.full():
+                # slow subscriber, drop the oldest line
+                q.get_nowait()
+            q.put_nowait(line)
+        return
+
+    def tail(self, num: Optional[int] = None) -> List[str]:
+        '''
+        Returns up to num most recent lines, all of them if num is None
+        '''
+        if num is None or num >= len(self._lines):
+            return list(self._lines)
+        if num <= 0:
+            return []
+        return list(self._lines)[-num:]
+
+    def subscribe(self) -> asyncio.Queue:
+        '''
+        Get a queue of the lines to come, None is queued once the output
+        is closed
+        '''
+        q: asyncio.Queue = asyncio.Queue(maxsize=self.subscriber_maxsize)
+        if self._closed:
+            q.put_nowait(None)
+        else:
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q: asyncio.Queue) -> None:
+        self._subscribers.discard(q)
+        return
+
+    def close(self) -> None:
+        '''
+        The output is closed
+        '''
+        if self._closed:
+            return
+        self._closed = True
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+        for q in self._subscribers:
+            if q.full():
+                q.get_nowait()
+            q.put_nowait(None)
+        self._subscribers.clear()
+        return
+
+
+class LogPump:
+    '''
+    Drains the pipes of many processes from the event loop
+    '''
+
+    def __init__(self, maxlen: int = 1000,
+                 spill_dir: Optional[str] = None) -> None:
+        '''
+        maxlen - number of the most recent lines to keep per process
+        spill_dir - if given, all the lines are spilled there as well
+        '''
+        self._maxlen = maxlen
+        self._spill_dir = spill_dir
+        self._rings: Dict[int, LogRing] = {}
+        # pipes being drained: fd -> (key, stream, incomplete line)
+        self._pipes: Dict[int, List] = {}
+        return
+
+    def attach(self, key: int, streams: List[IO]) -> LogRing:
+        '''
+        Start draining the streams of the process known by the key, e.g. the
+        simulton port.  The pump owns the streams from now on.
+        Has to be called from the event loop.
+        '''
+        spill_path = None
+        if self._spill_dir is not None:
+            spill_path = os.path.join(self._spill_dir, f'simulton-{key}.log')
+        ring = LogRing(self._maxlen, spill_path)
+        self._rings[key] = ring
+        loop = asyncio.get_running_loop()
+        for stream in streams:
+            fd = stream.fileno()
+            os.set_blocking(fd, False)
+            self._pipes[fd] = [key, stream, b'']
+            loop.add_reader(fd, self.on_readable, fd)
+        if not streams:
+            ring.close()
+        return ring
+
+    def get(self, key: int) -> LogRing:
+        '''Raises KeyError if there is no such key'''
+        return self._rings[key]
+
+    def on_readable(self, fd: int) -> None:
+        '''
+        Read whatever is available, split it into lines
+        '''
+        pipe = self._pipes[fd]
+        try:
+            data = os.read(fd, 65536)
+        except BlockingIOError:
+            return
+        except OSError as err:
+            print('LogPump.on_readable caught', err)
+            data = b''
+        if not data:
+            self.close_pipe(fd)
+            return
+        lines = (pipe[2] + data).split(b'\n')
+        # the last one is incomplete, if any
+        pipe[2] = lines.pop()
+        ring = self._rings[pipe[0]]
+        for line in lines:
+            ring.append(line.decode(errors='replace'))
+        return
+
+    def close_pipe(self, fd: int) -> None:
+        '''
+        The pipe reached EOF, or is no longer needed
+        '''
+        key, stream, rest = self._pipes.pop(fd)
+        asyncio.get_running_loop().remove_reader(fd)
+        ring = self._rings[key]
+        if rest:
+            ring.append(rest.decode(errors='replace'))
+        stream.close()
+        if not any(pipe[0] == key for pipe in self._pipes.values()):
+            ring.close()
+        return
+
+    def detach(self, key: int) -> None:
+        '''
+        Drain what is left in the pipes of the process, stop pumping them
+        '''
+        for fd in [fd for fd, pipe in self._pipes.items() if pipe[0] == key]:
+            while fd in self._pipes:
+                self.on_readable(fd)
+                if fd in self._pipes and not self.readable(fd):
+                    self.close_pipe(fd)
+        return
+
+    def readable(self, fd: int) -> bool:
+        '''
+        Is there anything to read from fd right now?
+        '''
+        (readable, _, _) = select.select([fd], [], [], 0)
+        return bool(readable)
+
+    def close(self) -> None:
+        '''
+        Drain and stop pumping all the pipes
+        '''
+        for key in list(self._rings.keys()):
+            self.detach(key)
+            self._rings[key].close()
+        return
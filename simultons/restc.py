@@ -3,7 +3,7 @@ REST client and other utilities, now based on httpx, not requests
 '''
 from urllib.parse import urljoin
 import time
-from typing import Any, Optional, Tuple
+from typing import Any, List, Optional, Tuple
 import httpx
 from json.decoder import JSONDecodeError
 
@@ -14,15 +14,16 @@ class rest_client:
     '''
 
     def __init__(self, host: str, port: int, verbose: bool,
-                 dumpHeaders: bool) -> None:
+                 dumpHeaders: bool, timeout: Optional[float] = 5.0) -> None:
         '''
         In: iface - server interface, or host name
             port - server port
+            timeout - secs to wait for a response, None to wait forever
         '''
         self.base_url = f'http://{host}:{port}'
         self.verbose = verbose
         self.dumpHeaders = dumpHeaders
-        self.ses = httpx.Client(base_url=self.base_url)
+        self.ses = httpx.Client(base_url=self.base_url, timeout=timeout)
         return
 
     def close(self):
@@ -128,6 +129,37 @@ class rest_client:
             jresp = resp
         return (resp.status_code, jresp)
 
+    def batch_post(self, uri: str, data: List[Any]) -> Tuple[int, Any]:
+        '''
+        Issue HTTP POST of the list to a base_url + uri, print the size only
+        returns (http_status, response_json)
+        '''
+        self.print_req('POST', uri, f'[{len(data)} items]')
+        resp = self.ses.post(uri, json=data)
+        if self.verbose:
+            print('HTTP POST =>', resp.status_code)
+        try:
+            jresp = resp.json()
+        except JSONDecodeError:
+            jresp = resp
+        return (resp.status_code, jresp)
+
+    def create_many(self, uri: str, data: List[Any]) -> Tuple[int, Any]:
+        '''
+        Create many instances in one request, e.g.
+        create_many('/api/v1/clocks/', [{'name': 'foo'}, {'name': 'bar'}])
+        returns (http_status, BatchResponse json)
+        '''
+        return self.batch_post(f"{uri.rstrip('/')}:batch", data)
+
+    def delete_many(self, uri: str, ids: List[str]) -> Tuple[int, Any]:
+        '''
+        Delete many instances in one request, e.g.
+        delete_many('/api/v1/clocks/', ['Clock-0.0', 'Clock-1.0'])
+        returns (http_status, BatchResponse json)
+        '''
+        return self.batch_post(f"{uri.rstrip('/')}:batchDelete", ids)
+
 
 def wait_until_reachable(url: str, timeout: int) -> Optional[httpx.Response]:
     '''
@@ -2,15 +2,20 @@
 Schemas for the REST APIs inputs and outputs
 '''
 from enum import auto
+from typing import List
 from fastapi_utils.enums import StrEnum
-from pydantic import BaseModel, PositiveInt
+from pydantic import BaseModel, NonNegativeInt, PositiveFloat, \
+    PositiveInt
 
 
 class NewClockParams(BaseModel):
     '''
-    JSON describing new clock
+    JSON describing new clock.
+    rate is clock secs per simulated sec, offset is the initial clock time.
     '''
     name: str
+    rate: float = 1.0
+    offset: float = 0.0
 
 
 class ClockResponse(BaseModel):
@@ -20,6 +25,8 @@ class ClockResponse(BaseModel):
     id: str
     name: str
     time: float
+    rate: float = 1.0
+    offset: float = 0.0
 
 
 class NewElevatorParams(BaseModel):
@@ -30,6 +37,23 @@ class NewElevatorParams(BaseModel):
     floors: PositiveInt
 
 
+class Direction(StrEnum):
+    '''
+    Possible values of the elevator movement direction
+    '''
+
+    UP = auto()
+    DOWN = auto()
+    # no stops to go to
+    NONE = auto()
+
+    def __repr__(self):
+        '''
+        To enable serialization as a string...
+        '''
+        return repr(self.value)
+
+
 class ElevatorResponse(BaseModel):
     '''
     JSON describing the elevator in the body of the HTTP response
@@ -39,6 +63,69 @@ class ElevatorResponse(BaseModel):
     floors: PositiveInt
 
 
+class ElevatorDelta(BaseModel):
+    '''
+    JSON describing the elevator state pushed to the stream clients.
+    stops are the floors to stop at, lit are the indexes of the control
+    panel buttons lit.
+    '''
+    id: str
+    floor: NonNegativeInt
+    state: str
+    direction: Direction
+    doors_open: bool
+    stops: List[int]
+    lit: List[int]
+    deleted: bool = False
+
+
+class StreamSubscription(BaseModel):
+    '''
+    JSON sent by a stream client to replace its subscription, all the
+    instances if ids is empty
+    '''
+    ids: List[str] = []
+
+
+class HallCallParams(BaseModel):
+    '''
+    JSON describing a hall call: a rider on the floor wants to go in the
+    direction
+    '''
+    floor: NonNegativeInt
+    direction: Direction
+
+
+class DispatchResponse(BaseModel):
+    '''
+    JSON describing the elevator the hall call was assigned to.
+    cost is the estimated time to serve the call in secs, elapsed is how
+    long the assignment took in secs.
+    '''
+    id: str
+    cost: float
+    elapsed: float
+
+
+class BatchItemResponse(BaseModel):
+    '''
+    JSON describing the outcome for one item of a batch request.
+    status_code is the one the single item request would have got.
+    '''
+    id: str | None = None
+    status_code: int
+    message: str | None = None
+
+
+class BatchResponse(BaseModel):
+    '''
+    JSON describing the outcome of a batch request, item by item in the
+    order of the request.  elapsed is in secs.
+    '''
+    items: List[BatchItemResponse]
+    elapsed: float
+
+
 class Message(BaseModel):
     '''
     JSON carrying a single message in the body of the HTTP response
@@ -66,6 +153,24 @@ class SimulationState(StrEnum):
         return repr(self.value)
 
 
+class Pacing(StrEnum):
+    '''
+    How the simulated time relates to the wall clock
+    '''
+    # simulated time advances at rate times the wall clock
+    WALL_CLOCK = auto()
+    # simulated time jumps from one event to the next one without waiting
+    AS_FAST_AS_POSSIBLE = auto()
+    # simulated time advances only on the ticks published by the simulation
+    LOCKSTEP = auto()
+
+    def __repr__(self):
+        '''
+        To enable serialization as a string...
+        '''
+        return repr(self.value)
+
+
 class SimulationRequest(BaseModel):
     '''
     JSON describing simulation state.
@@ -76,6 +181,9 @@ class SimulationRequest(BaseModel):
     '''
     state: SimulationState
     rate: float | None = None
+    pacing: Pacing | None = None
+    # False - the simultons follow the zmq bus only, no HTTP requests
+    fan_out: bool = True
 
 
 class SimulationResponse(BaseModel):
@@ -84,6 +192,91 @@ class SimulationResponse(BaseModel):
     '''
     state: SimulationState
     rate: float
+    pacing: Pacing = Pacing.WALL_CLOCK
+
+
+class SimultonsFanOutResponse(BaseModel):
+    '''
+    JSON describing the outcome of a request sent to all the simultons.
+    Simultons are identified by their ports, elapsed is in secs.
+    '''
+    acked: List[int] = []
+    timed_out: List[int] = []
+    failed: List[int] = []
+    elapsed: float = 0
+
+
+class SimulationUpdateResponse(SimulationResponse):
+    '''
+    JSON describing simulation state after an update along with the outcome
+    of the simultons notification, if any
+    '''
+    fanout: SimultonsFanOutResponse | None = None
+
+
+class SimulationStepParams(BaseModel):
+    '''
+    JSON describing lockstep stepping of the simulation.
+    quantum is the simulated time of a single tick in secs, batch is the
+    number of ticks published in a single message.  Every simulton is given
+    timeout secs to acknowledge a batch, which is republished up to retries
+    times.
+    '''
+    ticks: PositiveInt = 1
+    quantum: PositiveFloat = 0.1
+    batch: PositiveInt = 1
+    timeout: PositiveFloat = 1.0
+    retries: NonNegativeInt = 3
+
+
+class SimulationTick(BaseModel):
+    '''
+    Published to the simultons, see wire.py: advance by count ticks of
+    quantum secs each.  seq numbers the messages, so that a republished one
+    is not applied twice.
+    '''
+    seq: int
+    first_tick: int
+    count: int
+    quantum: float
+
+
+class SimulationTickAck(BaseModel):
+    '''
+    Sent back, see wire.py, by the simulton identified by its port once it
+    is done with the tick message seq, time is its simulated time
+    '''
+    port: int
+    seq: int
+    time: float
+
+
+class SimulationStepResponse(BaseModel):
+    '''
+    JSON describing the outcome of the lockstep stepping.
+    tick is the number of ticks done since the simulation start, time is the
+    simulated time they add up to.  missing lists the ports of the simultons
+    which did not acknowledge the last batch, the stepping stops there.
+    '''
+    tick: int
+    time: float
+    batches: int = 0
+    republished: int = 0
+    missing: List[int] = []
+    elapsed: float = 0
+
+
+class ProcessExitResponse(BaseModel):
+    '''
+    JSON describing how a service process was shut.
+    elapsed is in secs since the shutdown started, killed tells if SIGKILL
+    had to be used.
+    '''
+    port: int
+    pid: int
+    returncode: int
+    elapsed: float
+    killed: bool
 
 
 class SimultonState(StrEnum):
@@ -115,6 +308,84 @@ class NewSimultonParams(BaseModel):
     src_path: str
 
 
+class CheckpointParams(BaseModel):
+    '''
+    JSON describing where to write the simulton checkpoint to
+    '''
+    path: str
+
+
+class CheckpointResponse(BaseModel):
+    '''
+    JSON describing the checkpoint written or restored: the number of the
+    instances, the file size in bytes and how long it took in secs
+    '''
+    path: str
+    instances: NonNegativeInt
+    size: NonNegativeInt
+    elapsed: float
+
+
+class SimulationSnapshotParams(BaseModel):
+    '''
+    JSON describing the directory to write the simulation snapshot to: the
+    manifest and a checkpoint per simulton.  timeout is in secs, given to
+    every simulton to write its checkpoint, the client should wait longer.
+    '''
+    path: str
+    timeout: PositiveFloat = 10.0
+
+
+class SimultonSnapshot(BaseModel):
+    '''
+    JSON describing a simulton in the simulation snapshot.  checkpoint is
+    the file name in the snapshot directory, None if the simulton could not
+    write one, message tells why.
+    '''
+    port: int
+    src_path: str
+    title: str
+    checkpoint: str | None = None
+    instances: NonNegativeInt = 0
+    size: NonNegativeInt = 0
+    message: str | None = None
+
+
+class SimulationManifest(BaseModel):
+    '''
+    JSON describing the simulation snapshot: the simulated time all the
+    simultons were checkpointed at, in secs, the simulation settings and
+    the simultons.
+    '''
+    time: float
+    state: SimulationState
+    rate: float
+    pacing: Pacing
+    tick: int = 0
+    tick_time: float = 0.0
+    simultons: List[SimultonSnapshot] = []
+
+
+class SimulationSnapshotResponse(BaseModel):
+    '''
+    JSON describing the simulation snapshot written: the manifest path and
+    how long it took in secs, the simulation was paused meanwhile
+    '''
+    path: str
+    manifest: SimulationManifest
+    elapsed: float
+
+
+class SimulationRestoreParams(BaseModel):
+    '''
+    JSON describing the simulation snapshot to restore: the manifest or
+    the directory it is in.  timeout is in secs, given to every simulton to
+    become reachable, the client should wait longer.
+    '''
+    path: str
+    timeout: PositiveFloat = 10.0
+
+
 class SimultonRequest(BaseModel):
     '''
     JSON describing simulation state.
@@ -125,15 +396,77 @@ class SimultonRequest(BaseModel):
     '''
     state: SimultonState
     rate: float | None = None
+    pacing: Pacing | None = None
+
+
+class SubscriberCounters(BaseModel):
+    '''
+    JSON describing the simulton's ZMQ subscriber: messages received,
+    state updates conflated - superseded by a later one received in the
+    same batch - and the messages which could not be decoded.
+    State updates come with seq numbers: stale ones are ignored, gaps and
+    joining late are made up for by the snapshot resyncs.
+    '''
+    received: int = 0
+    batches: int = 0
+    conflated: int = 0
+    decode_errors: int = 0
+    stale: int = 0
+    gaps: int = 0
+    resyncs: int = 0
 
 
 class SimultonResponse(BaseModel):
     '''
-    JSON describing simulton
+    JSON describing simulton, time is the simulated time in secs
     '''
     description: str
     port: PositiveInt | None = None
     rate: float
+    pacing: Pacing = Pacing.WALL_CLOCK
+    time: float = 0
     state: SimultonState
     title: str
     version: str
+    subscriber: SubscriberCounters | None = None
+
+
+class BatchSimultonParams(BaseModel):
+    '''
+    JSON describing one simulton in a batch.
+    name defaults to src_path, depends_on lists the names of the simultons
+    which have to be reachable before this one is launched.
+    '''
+    src_path: str
+    name: str | None = None
+    depends_on: List[str] = []
+
+
+class NewSimultonsBatchParams(BaseModel):
+    '''
+    JSON describing a batch of new simultons.
+    timeout is in secs, applies to every dependency level: the client
+    should wait longer than the number of the levels times the timeout.
+    '''
+    simultons: List[BatchSimultonParams]
+    timeout: float = 5
+
+
+class SimultonLaunchResponse(BaseModel):
+    '''
+    JSON describing the launch of a single simulton of a batch.
+    latency is in secs, from the launch until the simulton is reachable.
+    '''
+    name: str
+    level: int
+    latency: float | None = None
+    simulton: SimultonResponse | None = None
+    message: str | None = None
+
+
+class SimultonsBatchResponse(BaseModel):
+    '''
+    JSON describing the launch of a batch of simultons
+    '''
+    simultons: List[SimultonLaunchResponse]
+    elapsed: float
@@ -0,0 +1,176 @@
+'''
+Simulated time shared by the simulation with the simultons via a small
+memory-mapped file.
+
+The simulation writes an anchor: the monotonic clock in ns, the simulated
+time in ns at that moment, the rate and the simulation state.  A reader
+extrapolates the simulated time from the anchor with no IPC at all.
+The anchor is protected by a seqlock: the writer makes the sequence number
+odd while writing, a reader retries if it saw an odd or changed one.
+Simulated time is kept in int64 ns, so that the precision does not degrade
+at high rates over long runs.
+
+CLOCK_MONOTONIC is shared by all the processes of the host.
+'''
+import mmap
+import os
+import struct
+import time
+from typing import NamedTuple, Optional
+from . import SimulationState
+
+# seq, wall_ns, sim_ns, rate, state
+layout = struct.Struct('<Qqqdi')
+segment_size = 64
+
+states = list(SimulationState)
+
+
+class SharedTime(NamedTuple):
+    '''
+    Consistent snapshot of the anchor
+    '''
+    wall_ns: int
+    sim_ns: int
+    rate: float
+    state: SimulationState
+
+    def now_ns(self, wall_ns: Optional[int] = None) -> int:
+        '''
+        Simulated time in ns at the monotonic wall_ns, now by default
+        '''
+        if self.state != SimulationState.RUNNING or self.rate == 0:
+            return self.sim_ns
+        if wall_ns is None:
+            wall_ns = time.monotonic_ns()
+        return self.sim_ns + int((wall_ns - self.wall_ns) * self.rate)
+
+
+class SharedTimeWriter:
+    '''
+    The simulation side, the only writer
+    '''
+
+    def __init__(self, path: str) -> None:
+        '''
+        Create the segment, the simulation is in INIT
+        '''
+        self._path = path
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, segment_size)
+            self._mm = mmap.mmap(fd, segment_size)
+        finally:
+            os.close(fd)
+        self._seq = 0
+        self._anchor = SharedTime(
+            time.monotonic_ns(), 0, 0.0, SimulationState.INIT)
+        self.write(self._anchor)
+        return
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def anchor(self) -> SharedTime:
+        '''The last anchor written'''
+        return self._anchor
+
+    def write(self, anchor: SharedTime) -> None:
+        '''
+        Write the anchor under the seqlock
+        '''
+        self._seq += 1
+        # odd - the write is in progress
+        struct.pack_into('<Q', self._mm, 0, self._seq)
+        layout.pack_into(
+            self._mm, 0, self._seq, anchor.wall_ns, anchor.sim_ns,
+            anchor.rate, states.index(anchor.state))
+        self._seq += 1
+        struct.pack_into('<Q', self._mm, 0, self._seq)
+        self._anchor = anchor
+        return
+
+    def publish(self, state: SimulationState, rate: float) -> SharedTime:
+        '''
+        Re-anchor the simulated time: from now on it goes at the rate if
+        the state is RUNNING, stands still otherwise
+        '''
+        wall_ns = time.monotonic_ns()
+        anchor = SharedTime(
+            wall_ns, self._anchor.now_ns(wall_ns), rate, state)
+        self.write(anchor)
+        return anchor
+
+    def advance(self, delta_ns: int) -> SharedTime:
+        '''
+        Move the simulated time forward, e.g. by lockstep ticks
+        '''
+        wall_ns = time.monotonic_ns()
+        anchor = self._anchor._replace(
+            wall_ns=wall_ns,
+            sim_ns=self._anchor.now_ns(wall_ns) + delta_ns)
+        self.write(anchor)
+        return anchor
+
+    def close(self) -> None:
+        '''
+        Unmap and remove the segment
+        '''
+        self._mm.close()
+        try:
+            os.unlink(self._path)
+        except OSError as err:
+            print('SharedTimeWriter.close caught', err)
+        return
+
+
+class SharedTimeReader:
+    '''
+    The simulton side, any number of readers
+    '''
+
+    def __init__(self, path: str) -> None:
+        '''
+        Raises OSError if there is no segment
+        '''
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            self._mm = mmap.mmap(fd, segment_size, prot=mmap.PROT_READ)
+        finally:
+            os.close(fd)
+        # number of the times a read had to be retried
+        self.retries = 0
+        return
+
+    def read(self) -> SharedTime:
+        '''
+        Consistent snapshot of the anchor
+        '''
+        mm = self._mm
+        while True:
+            (seq0,) = struct.unpack_from('<Q', mm, 0)
+            if seq0 & 1 == 0:
+                (seq, wall_ns, sim_ns, rate, state) = layout.unpack_from(mm, 0)
+                (seq1,) = struct.unpack_from('<Q', mm, 0)
+                if seq == seq0 == seq1:
+                    return SharedTime(wall_ns, sim_ns, rate, states[state])
+            self.retries += 1
+        return
+
+    def now_ns(self) -> int:
+        '''
+        Simulated time in ns
+        '''
+        return self.read().now_ns()
+
+    def time(self) -> float:
+        '''
+        Simulated time in secs
+        '''
+        return self.now_ns() / 1e9
+
+    def close(self) -> None:
+        self._mm.close()
+        return
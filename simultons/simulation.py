@@ -1,17 +1,35 @@
 '''
 Simulation launcher which in turn launches all the simultons
 '''
-from typing import Dict, Optional
+import asyncio
+import os
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
 from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from starlette.background import BackgroundTask
+import httpx
 import zmq
 import zmq.asyncio
-from .globals import simulation_zspec, simulation_ztopic
-from . import FastLauncher, \
-    SimulationState, SimulationRequest, SimulationResponse, \
-    SimultonState, Simulton, NewSimultonParams, \
-    SimultonRequest, SimultonResponse, Message, shut_the_process
+from .globals import simulation_zspec, simulation_ztopic, tick_ztopic, \
+    ack_zspec, snapshot_zspec, zygote_env, log_dir_env, shared_time_path, \
+    shared_time_env, restore_env
+from .log_pump import LogPump, LogRing
+from .shmtime import SharedTime, SharedTimeWriter
+from .zygote import Zygote
+from . import FastLauncher, shutdown_launchers, async_rest_client, \
+    Pacing, SimulationState, SimulationRequest, SimulationResponse, \
+    SimultonsFanOutResponse, SimulationUpdateResponse, \
+    SimulationStepParams, SimulationTick, \
+    SimulationStepResponse, \
+    SimultonState, Simulton, NewSimultonParams, SimultonRequest, \
+    SimultonResponse, Message, shut_the_process, \
+    BatchSimultonParams, NewSimultonsBatchParams, SimultonLaunchResponse, \
+    SimultonsBatchResponse, CheckpointParams, CheckpointResponse, \
+    SimulationSnapshotParams, SimultonSnapshot, SimulationManifest, \
+    SimulationSnapshotResponse, SimulationRestoreParams
+from .simulton import announce_ready
+from .wire import decode_ack, encode_state, encode_tick, frames
 
 
 class SimultonProxy(Simulton):
@@ -19,10 +37,14 @@ class SimultonProxy(Simulton):
     This is how simulation thinks of simulton(s)
     '''
     simulton_uri = '/api/v1/simulton'
+    checkpoint_uri = '/api/v1/simulton/checkpoint'
 
-    def __init__(self, source_path: str, port: int) -> None:
+    def __init__(self, source_path: str, port: int,
+                 zygote: Optional[Zygote] = None) -> None:
         super().__init__()
-        self._launcher = FastLauncher(source_path, port)
+        self._launcher = FastLauncher(source_path, port, zygote)
+        # async REST client is created on the first use, in the event loop
+        self._arestc: Optional[async_rest_client] = None
         self.title = ''
         self.description = ''
         self.version = ''
@@ -33,6 +55,8 @@ class SimultonProxy(Simulton):
             description=self.description,
             port=self.port,
             rate=self.rate,
+            pacing=self.pacing,
+            time=self._engine.now,
             state=self.state,
             title=self.title,
             version=self.version)
@@ -42,11 +66,22 @@ class SimultonProxy(Simulton):
         '_port accessor'
         return self._launcher.port
 
-    def launch(self) -> int:
+    @property
+    def launcher(self) -> FastLauncher:
+        '_launcher accessor'
+        return self._launcher
+
+    @property
+    def src_path(self) -> str:
+        'path to the simulton source'
+        return self._launcher.path
+
+    def launch(self, env: Optional[Dict[str, str]] = None) -> int:
         '''
         Launch the simulton process
+        env - added to its environment, e.g. restore_env
         '''
-        return self._launcher.launch()
+        return self._launcher.launch(env=env)
 
     def wait_until_reachable(self, timeout: int) -> bool:
         jresp = self._launcher.wait_until_reachable(
@@ -54,12 +89,31 @@ class SimultonProxy(Simulton):
         if jresp is None:
             return False
         print('wait_until_reachable =>', jresp)
+        self.on_reachable(jresp)
+        return True
+
+    async def async_wait_until_reachable(self, timeout: float) -> bool:
+        '''
+        Same as wait_until_reachable but without blocking the event loop
+        '''
+        jresp = await self._launcher.async_wait_until_reachable(
+            self.simulton_uri, timeout)
+        if jresp is None:
+            return False
+        self.on_reachable(jresp)
+        return True
+
+    def on_reachable(self, jresp: Dict[str, Any]) -> None:
+        '''
+        Simulton reported its state via simulton_uri
+        '''
         self.description = jresp['description']
         self.rate = jresp['rate']
+        self.pacing = Pacing(jresp['pacing'])
         self.title = jresp['title']
         self.version = jresp['version']
         self.state = jresp['state']
-        return True
+        return
 
     def pause(self) -> bool:
         '''
@@ -70,11 +124,13 @@ class SimultonProxy(Simulton):
             self.simulton_uri, params.model_dump())
         return status_code == 202
 
-    def run(self, rate: float = 1.0) -> bool:
+    def run(self, rate: float = 1.0,
+            pacing: Optional[Pacing] = None) -> bool:
         '''
         Send a request to the simulton to move to the RUNNING state
         '''
-        params = SimultonRequest(state=SimultonState.RUNNING, rate=rate)
+        params = SimultonRequest(
+            state=SimultonState.RUNNING, rate=rate, pacing=pacing)
         (status_code, rdata) = self._launcher._restc.put(
             self.simulton_uri, params.model_dump())
         return status_code == 202
@@ -88,6 +144,46 @@ class SimultonProxy(Simulton):
             self.simulton_uri, params.model_dump())
         return status_code == 202
 
+    async def async_request(self, req: SimultonRequest) -> bool:
+        '''
+        Send a request to the simulton to change its state and rate
+        without blocking the event loop
+        '''
+        (status_code, rdata) = await self.arestc().put(
+            self.simulton_uri, req.model_dump())
+        return status_code == 202
+
+    async def async_checkpoint(self, path: str) -> Tuple[int, Any]:
+        '''
+        Ask the simulton to write its checkpoint into the file at path,
+        returns (http_status, response_json)
+        '''
+        params = CheckpointParams(path=path)
+        return await self.arestc().post(
+            self.checkpoint_uri, params.model_dump())
+
+    def arestc(self) -> async_rest_client:
+        '''
+        The async REST client, created on the first use, in the event loop
+        '''
+        if self._arestc is None:
+            # keep it quiet, there could be a lot of simultons
+            verbose = False
+            dumpHeaders = False
+            # the callers bound the requests with their own timeouts
+            self._arestc = self._launcher.get_async_rest_client(
+                verbose, dumpHeaders, timeout=None)
+        return self._arestc
+
+    async def aclose(self) -> None:
+        '''
+        Close the async REST client, if any
+        '''
+        if self._arestc is not None:
+            await self._arestc.close()
+            self._arestc = None
+        return
+
     def shutdown(self):
         '''
         Forcefully shut the simulton process
@@ -106,32 +202,92 @@ class Simulation:
 
     _zspec = simulation_zspec
     _ztopic = simulation_ztopic
-
-    def __init__(self) -> None:
+    # secs given to every simulton to acknowledge the state change
+    control_timeout = 1.0
+    # secs given to all the simultons to exit before they are killed
+    shutdown_deadline = 3.0
+    # file name of the manifest in the snapshot directory
+    manifest_name = 'manifest.json'
+
+    def __init__(self, zygote_pool: Optional[int] = None,
+                 log_dir: Optional[str] = None) -> None:
         '''
         Initializer
+        zygote_pool - if not None, simultons are forked by the zygote which
+        keeps that many idle warm workers
+        log_dir - if not None, the output of the simultons is spilled there
         '''
         self._state = SimulationState.INIT
         # start in paused
         self._rate = 0.0
+        self._pacing = Pacing.WALL_CLOCK
         # start zmq publisher - destroyed in on_shutdown
         self._zcontext = zmq.asyncio.Context()
         self._zsocket = self._zcontext.socket(zmq.PUB)
         self._zsocket.bind(self._zspec)
+        # lockstep ticks acknowledgements from the simultons
+        self._zack = self._zcontext.socket(zmq.PULL)
+        self._zack.bind(ack_zspec)
+        # the latest state update for the simultons joining late or having
+        # missed some, served once started
+        self._zsnapshot = self._zcontext.socket(zmq.REP)
+        self._zsnapshot.bind(snapshot_zspec)
+        self._snapshot_task: Optional[asyncio.Task] = None
+        # seq of the last state update published
+        self._state_seq = 0
+        # notify the simultons via HTTP too
+        self._http_fan_out = True
+        # lockstep: seq of the last tick message, ticks done and
+        # the simulated time they add up to
+        self._tick_seq = 0
+        self._tick = 0
+        self._tick_time = 0.0
+        # one step at a time: the acks of all of them come via _zack
+        self._step_lock = asyncio.Lock()
+        # simulated time shared with the simultons, inherited by them
+        self._shared_time = SharedTimeWriter(shared_time_path)
+        os.environ[shared_time_env] = shared_time_path
         # simulton accumulator
         self._simultons: Dict[int, SimultonProxy] = {}
         self._next_simulton_port = 9500
+        # outcome of the last fan out
+        self._fanout: Optional[SimultonsFanOutResponse] = None
+        self._zygote: Optional[Zygote] = None
+        if zygote_pool is not None:
+            self._zygote = Zygote(zygote_pool)
+        # drains the output of the simultons
+        self._log_pump = LogPump(spill_dir=log_dir)
         return
 
     async def broadcast_state_update(self) -> None:
         '''
         share the state update with the subscribers
         '''
-        message = SimulationResponse(
-            state=self._state, rate=self._rate).model_dump_json()
+        # the shared simulated time stands still unless paced by the wall
+        # clock, the lockstep ticks advance it explicitly
+        rate = self._rate if self._pacing == Pacing.WALL_CLOCK else 0
+        self._shared_time.publish(self._state, rate)
+        resp = self.to_response()
         assert self._zsocket is not None
-        print('Broadcasting state update:', message)
-        self._zsocket.send_string(f'{self._ztopic} {message}')
+        self._state_seq += 1
+        print(f'Broadcasting state update {self._state_seq}:', resp)
+        self._zsocket.send_multipart(
+            frames(self._ztopic, encode_state(resp, self._state_seq)))
+        return
+
+    async def serve_snapshots(self) -> None:
+        '''
+        Background async task to answer any request with the latest state
+        update until the socket is closed
+        '''
+        while not self._zsnapshot.closed:
+            try:
+                await self._zsnapshot.recv()
+                await self._zsnapshot.send(
+                    encode_state(self.to_response(), self._state_seq))
+            except (asyncio.CancelledError, zmq.ZMQError) as err:
+                print('serve_snapshots caught', type(err), err)
+                break
         return
 
     @property
@@ -147,9 +303,9 @@ class Simulation:
         self._state = state
         await self.broadcast_state_update()
         if state == SimulationState.RUNNING:
-            self.on_running()
+            await self.on_running()
         elif state == SimulationState.PAUSED:
-            self.on_paused()
+            await self.on_paused()
         elif state == SimulationState.SHUTTING:
             self.on_shutting()
         else:
@@ -169,6 +325,11 @@ class Simulation:
         self._rate = rate
         return self._rate
 
+    @property
+    def pacing(self) -> Pacing:
+        '''How the simulated time relates to the wall clock'''
+        return self._pacing
+
     def is_paused(self) -> bool:
         '''
         is it paused?
@@ -182,20 +343,165 @@ class Simulation:
         return f'<{type(self).__qualname__} is {self._state}' \
             f' at {self._rate} at {hex(id(self))}>'
 
-    def on_running(self) -> None:
+    @property
+    def fanout(self) -> Optional[SimultonsFanOutResponse]:
+        '''Outcome of the last request sent to all the simultons'''
+        return self._fanout
+
+    async def update(self, state: SimulationState,
+                     rate: Optional[float],
+                     pacing: Optional[Pacing] = None,
+                     fan_out: bool = True) -> SimulationState:
+        '''
+        Update the simulation state, rate and pacing, notify the simultons.
+        fan_out - whether from now on the simultons are notified via HTTP
+        too, not only via the zmq bus
+        '''
+        self._fanout = None
+        self._http_fan_out = fan_out
+        rate_changed = rate is not None and rate != self._rate
+        if rate is not None:
+            self.rate = rate
+        if pacing is not None and pacing != self._pacing:
+            print(f'Simulation pacing {self._pacing} -> {pacing}')
+            self._pacing = pacing
+            rate_changed = True
+        if state != self._state:
+            return await self.setState(state)
+        if rate_changed and state == SimulationState.RUNNING:
+            # the state is the same, share the new rate and pacing
+            await self.broadcast_state_update()
+            await self.on_running()
+        return state
+
+    async def fan_out(self, req: SimultonRequest) -> SimultonsFanOutResponse:
+        '''
+        Send the request to all the simultons concurrently, each simulton is
+        given control_timeout secs to acknowledge it.
+        '''
+        start = time.time()
+
+        async def notify(port: int, s: SimultonProxy) -> Tuple[int, str]:
+            try:
+                ok = await asyncio.wait_for(
+                    s.async_request(req), self.control_timeout)
+                return (port, 'acked' if ok else 'failed')
+            except asyncio.TimeoutError:
+                return (port, 'timed_out')
+            except httpx.HTTPError as err:
+                print('Simulation.fan_out caught', type(err), err)
+                return (port, 'failed')
+
+        res = SimultonsFanOutResponse()
+        for port, outcome in await asyncio.gather(
+                *(notify(port, s) for port, s in self._simultons.items())):
+            getattr(res, outcome).append(port)
+        res.elapsed = time.time() - start
+        print('Simulation.fan_out', req, '=>', res)
+        self._fanout = res
+        return res
+
+    async def step(
+            self, params: SimulationStepParams) -> SimulationStepResponse:
+        '''
+        Advance all the simultons in lockstep by params.ticks ticks,
+        params.batch ticks per message.  Every batch is a barrier: the next
+        one is published only once all the simultons acknowledged the
+        previous one.  Concurrent steps are done one after another.
+        '''
+        async with self._step_lock:
+            return await self.step_locked(params)
+
+    async def step_locked(
+            self, params: SimulationStepParams) -> SimulationStepResponse:
+        '''
+        step() holding the step lock
+        '''
+        start = time.time()
+        if self._pacing != Pacing.LOCKSTEP:
+            print(f'Simulation pacing {self._pacing} -> {Pacing.LOCKSTEP}')
+            self._pacing = Pacing.LOCKSTEP
+            await self.broadcast_state_update()
+        res = SimulationStepResponse(tick=self._tick, time=self._tick_time)
+        ports = set(self._simultons.keys())
+        done = 0
+        while done < params.ticks:
+            count = min(params.batch, params.ticks - done)
+            self._tick_seq += 1
+            tick = SimulationTick(
+                seq=self._tick_seq, first_tick=self._tick, count=count,
+                quantum=params.quantum)
+            missing = await self.publish_tick(tick, ports, params, res)
+            if missing:
+                res.missing = sorted(missing)
+                break
+            done += count
+            self._tick += count
+            self._tick_time += count * params.quantum
+            self._shared_time.advance(round(count * params.quantum * 1e9))
+            res.batches += 1
+        res.tick = self._tick
+        res.time = self._tick_time
+        res.elapsed = time.time() - start
+        print('Simulation.step', params, '=>', res)
+        return res
+
+    async def publish_tick(
+            self, tick: SimulationTick, ports: Set[int],
+            params: SimulationStepParams,
+            res: SimulationStepResponse) -> Set[int]:
+        '''
+        Publish the tick message, collect the acknowledgements.
+        The message is republished up to params.retries times to those who
+        missed it.  Returns the ports of the simultons which did not
+        acknowledge it.
+        '''
+        message = frames(tick_ztopic, encode_tick(tick))
+        pending = set(ports)
+        for attempt in range(params.retries + 1):
+            if not pending:
+                break
+            if attempt > 0:
+                res.republished += 1
+            self._zsocket.send_multipart(message)
+            time_to_timeout = time.time() + params.timeout
+            while pending:
+                remaining = time_to_timeout - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    ack = decode_ack(await asyncio.wait_for(
+                        self._zack.recv(), remaining))
+                except asyncio.TimeoutError:
+                    break
+                except ValueError as err:
+                    print('Simulation.publish_tick caught', err)
+                    continue
+                # acks of the earlier messages are late, ignore them
+                if ack.seq == tick.seq:
+                    pending.discard(ack.port)
+        return pending
+
+    async def on_running(self) -> None:
         '''
         State just transitioned to RUNNING
         '''
         print('Simulation.on_running')
-        for _, s in self._simultons.items():
-            s.run(self._rate)
+        if not self._http_fan_out:
+            return
+        await self.fan_out(
+            SimultonRequest(state=SimultonState.RUNNING, rate=self._rate,
+                            pacing=self._pacing))
         return
 
-    def on_paused(self) -> None:
+    async def on_paused(self) -> None:
         '''
         State just transitioned to PAUSED
         '''
         print('Simulation.on_paused')
+        if not self._http_fan_out:
+            return
+        await self.fan_out(SimultonRequest(state=SimultonState.PAUSED))
         return
 
     def on_shutting(self) -> None:
@@ -210,7 +516,13 @@ class Simulation:
         Simulation FastAPI startup event handler
         '''
         print('Simulation.on_startup')
+        if self._zygote is not None:
+            self._zygote.start()
         await self.setState(SimulationState.PAUSED)
+        self._snapshot_task = asyncio.create_task(self.serve_snapshots())
+        # let the launcher know we are up
+        self._announce_task = asyncio.create_task(
+            announce_ready(lambda: self.to_response().model_dump()))
         return
 
     async def on_shutdown(self) -> None:
@@ -220,29 +532,269 @@ class Simulation:
         print('Simulation.on_shutdown', self)
         await self.setState(SimulationState.SHUTTING)
         print('Shutting the simultons')
-        for _, s in self._simultons.items():
-            s.shutdown()
+        simultons = list(self._simultons.values())
+        await asyncio.gather(*(s.aclose() for s in simultons))
+        await shutdown_launchers(
+            [s.launcher for s in simultons], self.shutdown_deadline)
+        self._log_pump.close()
+        if self._zygote is not None:
+            self._zygote.close()
         print('Closing zmq publisher')
         # close the zmq publisher
         # to avoid hanging infinitely
+        self._zack.setsockopt(zmq.LINGER, 0)
+        self._zack.close()
+        if self._snapshot_task is not None:
+            self._snapshot_task.cancel()
+        self._zsnapshot.setsockopt(zmq.LINGER, 0)
+        self._zsnapshot.close()
         self._zsocket.setsockopt(zmq.LINGER, 0)
         self._zsocket.close()
         self._zcontext.term()
+        self._shared_time.close()
         return
 
     def create_simulton(self, params: NewSimultonParams) -> SimultonResponse:
         '''
         Handle new simulton creation
         '''
-        simulton = SimultonProxy(params.src_path, self._next_simulton_port)
+        simulton = SimultonProxy(
+            params.src_path, self._next_simulton_port, self._zygote)
         if not simulton.launch():
             raise ValueError(f'Bad path {params.src_path}')
+        self.pump_logs(simulton)
         self._simultons[simulton.port] = simulton
         self._next_simulton_port += 1
         return simulton.to_response()
 
+    @staticmethod
+    def dependency_levels(
+            params: List[BatchSimultonParams]
+    ) -> List[List[BatchSimultonParams]]:
+        '''
+        Sort the simultons into the dependency levels: simultons of level N
+        depend only on simultons of the levels < N.
+        Raises ValueError on duplicate or unknown names and on cycles.
+        '''
+        by_name: Dict[str, BatchSimultonParams] = {}
+        for p in params:
+            name = p.name or p.src_path
+            if name in by_name:
+                raise ValueError(f'Duplicate simulton name {name}')
+            by_name[name] = p
+        for name, p in by_name.items():
+            for dep in p.depends_on:
+                if dep not in by_name:
+                    raise ValueError(f'{name} depends on unknown {dep}')
+        levels: List[List[BatchSimultonParams]] = []
+        placed: set = set()
+        while len(placed) < len(by_name):
+            level = [
+                p for name, p in by_name.items()
+                if name not in placed and placed.issuperset(p.depends_on)
+            ]
+            if not level:
+                raise ValueError('Simultons dependencies have a cycle')
+            placed.update(p.name or p.src_path for p in level)
+            levels.append(level)
+        return levels
+
+    async def launch_simulton(
+            self, params: BatchSimultonParams, level: int,
+            timeout: float, port: Optional[int] = None,
+            env: Optional[Dict[str, str]] = None) -> SimultonLaunchResponse:
+        '''
+        Launch a simulton and wait for it to become reachable
+        port - the next one if None
+        env - added to the simulton environment
+        '''
+        name = params.name or params.src_path
+        start = time.time()
+        if port is None:
+            port = self._next_simulton_port
+            self._next_simulton_port += 1
+        simulton = SimultonProxy(params.src_path, port, self._zygote)
+        if not simulton.launch(env):
+            return SimultonLaunchResponse(
+                name=name, level=level, message=f'Bad path {params.src_path}')
+        self.pump_logs(simulton)
+        self._simultons[simulton.port] = simulton
+        if not await simulton.async_wait_until_reachable(timeout):
+            return SimultonLaunchResponse(
+                name=name, level=level, simulton=simulton.to_response(),
+                message='Not reachable')
+        return SimultonLaunchResponse(
+            name=name, level=level, latency=time.time() - start,
+            simulton=simulton.to_response())
+
+    async def create_simultons(
+            self, params: NewSimultonsBatchParams) -> SimultonsBatchResponse:
+        '''
+        Launch a batch of simultons, one dependency level at a time.
+        Simultons of the same level are launched and awaited concurrently.
+        Raises ValueError if the dependencies can not be satisfied.
+        '''
+        start = time.time()
+        levels = self.dependency_levels(params.simultons)
+        results: List[SimultonLaunchResponse] = []
+        failed: set = set()
+        for num, level in enumerate(levels):
+            launching = []
+            for p in level:
+                name = p.name or p.src_path
+                if failed.intersection(p.depends_on):
+                    failed.add(name)
+                    results.append(SimultonLaunchResponse(
+                        name=name, level=num, message='Dependency failed'))
+                else:
+                    launching.append(
+                        self.launch_simulton(p, num, params.timeout))
+            for res in await asyncio.gather(*launching):
+                if res.latency is None:
+                    failed.add(res.name)
+                results.append(res)
+        return SimultonsBatchResponse(
+            simultons=results, elapsed=time.time() - start)
+
+    async def snapshot(
+            self, params: SimulationSnapshotParams
+    ) -> SimulationSnapshotResponse:
+        '''
+        Write the snapshot of the whole simulation into the directory
+        params.path: the manifest and a checkpoint per simulton.
+        The simulation is paused meanwhile, so that the shared simulated
+        time stands still and all the simultons are checkpointed at the
+        same simulated instant, concurrently.
+        Raises OSError if the manifest can not be written.
+        '''
+        start = time.time()
+        os.makedirs(params.path, exist_ok=True)
+        directory = os.path.abspath(params.path)
+        (state, rate) = (self._state, self._rate)
+        if state == SimulationState.RUNNING:
+            await self.update(
+                SimulationState.PAUSED, None, fan_out=self._http_fan_out)
+        manifest = SimulationManifest(
+            time=self._shared_time.anchor.sim_ns / 1e9, state=state,
+            rate=rate, pacing=self._pacing, tick=self._tick,
+            tick_time=self._tick_time)
+        try:
+            manifest.simultons = list(await asyncio.gather(*(
+                self.checkpoint_simulton(s, directory, params.timeout)
+                for s in self._simultons.values())))
+        finally:
+            if state == SimulationState.RUNNING:
+                await self.update(state, rate, fan_out=self._http_fan_out)
+        path = os.path.join(directory, self.manifest_name)
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(manifest.model_dump_json(indent=2))
+        os.replace(tmp, path)
+        res = SimulationSnapshotResponse(
+            path=path, manifest=manifest, elapsed=time.time() - start)
+        print(f'Simulation.snapshot {path}: {len(manifest.simultons)}'
+              f' simultons in {res.elapsed:.3f} secs')
+        return res
+
+    async def checkpoint_simulton(
+            self, simulton: SimultonProxy, directory: str,
+            timeout: float) -> SimultonSnapshot:
+        '''
+        Have the simulton write its checkpoint into the directory.
+        The outcome is in the message if it could not.
+        '''
+        res = SimultonSnapshot(
+            port=simulton.port, src_path=simulton.src_path,
+            title=simulton.title)
+        name = f'{simulton.port}.ckpt'
+        try:
+            (status_code, rdata) = await asyncio.wait_for(
+                simulton.async_checkpoint(os.path.join(directory, name)),
+                timeout)
+        except asyncio.TimeoutError:
+            res.message = 'Timed out'
+            return res
+        except httpx.HTTPError as err:
+            print('Simulation.checkpoint_simulton caught', type(err), err)
+            res.message = f'Bummer: {err}'
+            return res
+        if status_code != 200:
+            res.message = rdata['message'] if isinstance(rdata, dict) \
+                else f'HTTP {status_code}'
+            return res
+        ckpt = CheckpointResponse(**rdata)
+        res.checkpoint = name
+        res.instances = ckpt.instances
+        res.size = ckpt.size
+        return res
+
+    async def restore(
+            self, params: SimulationRestoreParams) -> SimultonsBatchResponse:
+        '''
+        Relaunch the simultons of the snapshot, concurrently, every one
+        restoring its checkpoint on startup.  The shared simulated time is
+        set back to the snapshot time first, so that the simultons go on
+        from there, then the simulation state and rate are restored.
+        Raises OSError if the manifest can not be read, ValueError if it
+        is not valid or the simultons ports are taken.
+        '''
+        start = time.time()
+        path = params.path
+        if os.path.isdir(path):
+            path = os.path.join(path, self.manifest_name)
+        with open(path) as f:
+            manifest = SimulationManifest.model_validate_json(f.read())
+        directory = os.path.dirname(os.path.abspath(path))
+        taken = [
+            s.port for s in manifest.simultons if s.port in self._simultons]
+        if taken:
+            raise ValueError(f'Simultons ports {taken} are taken')
+        await self.update(
+            SimulationState.PAUSED, None, manifest.pacing, self._http_fan_out)
+        self._shared_time.write(SharedTime(
+            time.monotonic_ns(), round(manifest.time * 1e9), 0.0,
+            SimulationState.PAUSED))
+        self._tick = manifest.tick
+        self._tick_time = manifest.tick_time
+        if manifest.simultons:
+            self._next_simulton_port = max(
+                self._next_simulton_port,
+                max(s.port for s in manifest.simultons) + 1)
+        launching = []
+        for s in manifest.simultons:
+            env = None
+            if s.checkpoint is not None:
+                env = {restore_env: os.path.join(directory, s.checkpoint)}
+            launching.append(self.launch_simulton(
+                BatchSimultonParams(src_path=s.src_path, name=str(s.port)),
+                0, params.timeout, s.port, env))
+        results = list(await asyncio.gather(*launching))
+        if manifest.state in (SimulationState.PAUSED, SimulationState.RUNNING):
+            await self.update(
+                manifest.state, manifest.rate, fan_out=self._http_fan_out)
+        res = SimultonsBatchResponse(
+            simultons=results, elapsed=time.time() - start)
+        print(f'Simulation.restore {path}: {len(results)} simultons'
+              f' in {res.elapsed:.3f} secs')
+        return res
+
+    def pump_logs(self, simulton: SimultonProxy) -> None:
+        '''
+        Start draining the output of the just launched simulton
+        '''
+        self._log_pump.attach(
+            simulton.port, simulton.launcher.detach_output())
+        return
+
+    def get_logs(self, port: int) -> LogRing:
+        '''
+        Output of the simulton, raises KeyError if there is no such simulton
+        '''
+        return self._log_pump.get(port)
+
     def to_response(self) -> SimulationResponse:
-        return SimulationResponse(state=self.state, rate=self.rate)
+        return SimulationResponse(
+            state=self.state, rate=self.rate, pacing=self.pacing)
 
 
 theSimulation: Optional[Simulation] = None  # Simulation()
@@ -263,7 +815,10 @@ app = FastAPI(
 async def startup_event():
     print('simulation startup_event')
     global theSimulation
-    theSimulation = Simulation()
+    zygote_pool = os.environ.get(zygote_env)
+    theSimulation = Simulation(
+        None if zygote_pool is None else int(zygote_pool),
+        os.environ.get(log_dir_env))
     await theSimulation.on_startup()
     return
 
@@ -284,13 +839,12 @@ async def get_simulation():
     Get the simulation state
     '''
     assert theSimulation is not None
-    return SimulationResponse(
-        state=theSimulation.state, rate=theSimulation.rate).model_dump()
+    return theSimulation.to_response().model_dump()
 
 
 @app.put(
     '/api/v1/simulation',
-    response_model=SimulationResponse,
+    response_model=SimulationUpdateResponse,
     status_code=202,
     responses={400: {"model": Message}})
 async def put_simulation(req: SimulationRequest):
@@ -298,19 +852,62 @@ async def put_simulation(req: SimulationRequest):
     Update the simulation state
     '''
     assert theSimulation is not None
-    if req.rate is not None:
-        theSimulation.rate = req.rate
-    # this assignment will result in multiple functions being called
-    await theSimulation.setState(req.state)
+    # this will result in multiple functions being called
+    await theSimulation.update(req.state, req.rate, req.pacing, req.fan_out)
     if theSimulation.state == SimulationState.SHUTTING:
         background = BackgroundTask(shut_the_process)
     else:
         background = None
-    content = SimulationResponse(
-        state=theSimulation.state, rate=theSimulation.rate).model_dump()
+    content = SimulationUpdateResponse(
+        state=theSimulation.state, rate=theSimulation.rate,
+        pacing=theSimulation.pacing, fanout=theSimulation.fanout).model_dump()
     return JSONResponse(content=content, background=background)
 
 
+@app.post(
+    '/api/v1/simulation:step',
+    response_model=SimulationStepResponse)
+async def step_simulation(params: SimulationStepParams):
+    '''
+    Advance all the simultons in lockstep
+    '''
+    assert theSimulation is not None
+    return await theSimulation.step(params)
+
+
+@app.post(
+    '/api/v1/simulation:snapshot',
+    response_model=SimulationSnapshotResponse,
+    responses={400: {"model": Message}})
+async def snapshot_simulation(params: SimulationSnapshotParams):
+    '''
+    Write the snapshot of all the simultons taken at the same simulated time
+    '''
+    assert theSimulation is not None
+    try:
+        return await theSimulation.snapshot(params)
+    except OSError as err:
+        content = Message(f'Bummer: {err}').model_dump()
+        return JSONResponse(status_code=400, content=content)
+
+
+@app.post(
+    '/api/v1/simulation:restore',
+    response_model=SimultonsBatchResponse,
+    status_code=201,
+    responses={400: {"model": Message}})
+async def restore_simulation(params: SimulationRestoreParams):
+    '''
+    Relaunch the simultons of the snapshot, restoring their checkpoints
+    '''
+    assert theSimulation is not None
+    try:
+        return await theSimulation.restore(params)
+    except (OSError, ValueError) as err:
+        content = Message(f'Bummer: {err}').model_dump()
+        return JSONResponse(status_code=400, content=content)
+
+
 @app.post(
     '/api/v1/simultons',
     response_model=SimultonResponse,
@@ -328,6 +925,23 @@ async def create_simulton(params: NewSimultonParams):
         return JSONResponse(status_code=400, content=content)
 
 
+@app.post(
+    '/api/v1/simultons:batch',
+    response_model=SimultonsBatchResponse,
+    status_code=201,
+    responses={400: {"model": Message}})
+async def create_simultons(params: NewSimultonsBatchParams):
+    '''
+    Handle creation of a batch of simultons with dependencies
+    '''
+    assert theSimulation is not None
+    try:
+        return await theSimulation.create_simultons(params)
+    except ValueError as err:
+        content = Message(f'Bummer: {err}').model_dump()
+        return JSONResponse(status_code=400, content=content)
+
+
 @app.get('/api/v1/simultons', response_model=Dict[int, SimultonResponse])
 async def get_simultons():
     '''
@@ -355,3 +969,44 @@ async def get_simulton(id: int):
         content = Message("Item not found").model_dump()
         return JSONResponse(status_code=404, content=content)
     return sim.to_response()
+
+
+async def stream_logs(
+        logs: LogRing, tail: Optional[int]) -> AsyncIterator[str]:
+    '''
+    Yield the tail of the logs followed by the lines to come
+    '''
+    q = logs.subscribe()
+    try:
+        for line in logs.tail(tail):
+            yield line + '\n'
+        while True:
+            line = await q.get()
+            if line is None:
+                break
+            yield line + '\n'
+    finally:
+        logs.unsubscribe(q)
+    return
+
+
+@app.get(
+    '/api/v1/simultons/{port}/logs',
+    response_model=List[str],
+    responses={404: {"model": Message}})
+async def get_simulton_logs(
+        port: int, tail: Optional[int] = None, stream: bool = False):
+    '''
+    Get the most recent output lines of the simulton, up to tail of them.
+    With stream the lines to come are streamed as well, as text/plain.
+    '''
+    assert theSimulation is not None
+    try:
+        logs = theSimulation.get_logs(port)
+    except KeyError:
+        content = Message("Item not found").model_dump()
+        return JSONResponse(status_code=404, content=content)
+    if stream:
+        return StreamingResponse(
+            stream_logs(logs, tail), media_type='text/plain')
+    return logs.tail(tail)
@@ -7,20 +7,36 @@ A simulton is:
 This simulton is not related to https://ogden.eu/simultons/
 '''
 import asyncio
+from collections.abc import MutableMapping
 import json
 import os
 import random
+import re
 import signal
 import string
-from typing import Any, Dict
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, \
+    Optional, Set, Tuple, Type
 from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+import numpy as np
+from pydantic import BaseModel, ValidationError
 from starlette.background import BackgroundTask
 import zmq
 import zmq.asyncio
-from .globals import simulation_zspec, simulation_ztopic
-from . import SimulationState, SimulationResponse, \
-    SimultonRequest, SimultonResponse, SimultonState
+from .globals import simulation_zspec, simulation_ztopic, tick_ztopic, \
+    ack_zspec, snapshot_zspec, ready_fd_env, host_env, port_env, \
+    shared_time_env, next_after_header, restore_env
+from . import BatchItemResponse, BatchResponse, \
+    CheckpointParams, CheckpointResponse, Message, \
+    Pacing, SimulationState, SimulationResponse, \
+    SimulationTick, SimulationTickAck, \
+    SimultonRequest, SimultonResponse, SimultonState, SubscriberCounters, \
+    Engine
+from .checkpoint import Checkpoint, write_checkpoint
+from .shmtime import SharedTimeReader
+from .fastjson import FastJSONResponse, dumps_lines
+from .wire import decode_state, decode_tick, encode_ack
 
 
 def get_random_id() -> str:
@@ -29,6 +45,198 @@ def get_random_id() -> str:
         random.choice(string.ascii_lowercase) for _ in range(length))
 
 
+class InstanceRegistry(MutableMapping):
+    '''
+    Instances of a simulton keyed by the ids like 'Clock-1f.2': the slot
+    index and its generation in hex.  Slots of the deleted instances are
+    reused, the generation is bumped, so a stale id is not found.
+    The slots are dense, creating and deleting are O(1), the ids never
+    collide.
+    '''
+    # bits of the index in a handle
+    index_bits = 32
+    # index.generation in lower case hex with no leading zeros, so that
+    # an instance has exactly one id
+    id_pattern = re.compile(r'(0|[1-9a-f][0-9a-f]*)\.(0|[1-9a-f][0-9a-f]*)')
+
+    def __init__(self, prefix: str) -> None:
+        '''
+        prefix - of the ids, the simulton title
+        '''
+        self._prefix = prefix + '-'
+        self._items: List[Any] = []
+        self._generations: List[int] = []
+        # the slot is taken, the instance may be added later
+        self._used: List[bool] = []
+        self._free: List[int] = []
+        self._count = 0
+        # slots restored from a checkpoint, the instances not created yet
+        self._lazy: Set[int] = set()
+        self._loader: Optional[Callable[[int, str], Any]] = None
+        return
+
+    @property
+    def capacity(self) -> int:
+        return len(self._items)
+
+    def dump(self) -> Tuple[List[int], List[bool], List[int]]:
+        '''
+        The generations and the used flags of the slots, the free list
+        '''
+        return (self._generations, self._used, self._free)
+
+    def load(self, generations: List[int], used: List[bool], free: List[int],
+             loader: Callable[[int, str], Any]) -> None:
+        '''
+        Replace the slots with the ones dumped.  The instance of a used slot
+        is created by loader(index, id) when first accessed.
+        '''
+        assert len(generations) == len(used)
+        self._items = [None] * len(used)
+        self._generations = list(generations)
+        self._used = list(used)
+        self._free = list(free)
+        self._lazy = {index for index, u in enumerate(self._used) if u}
+        self._count = len(self._lazy)
+        self._loader = loader
+        return
+
+    def slots(self) -> Iterator[Tuple[int, Any]]:
+        '''
+        (slot index, instance) of the used slots
+        '''
+        for index, used in enumerate(self._used):
+            if used:
+                yield (index, self.item(index))
+        return
+
+    def item(self, index: int) -> Any:
+        '''
+        The instance of the slot, created if restored and not yet
+        '''
+        if index in self._lazy:
+            assert self._loader is not None
+            self._lazy.discard(index)
+            self._items[index] = self._loader(index, self.to_id(
+                self._generations[index] << self.index_bits | index))
+        return self._items[index]
+
+    def parse(self, id: str) -> Tuple[int, int]:
+        '''
+        The slot index and the generation of the id, live or not.
+        Raises KeyError if it is not an id.
+        '''
+        if not isinstance(id, str) or not id.startswith(self._prefix):
+            raise KeyError(id)
+        match = self.id_pattern.fullmatch(id, len(self._prefix))
+        if match is None:
+            raise KeyError(id)
+        index = int(match.group(1), 16)
+        if index >= 1 << self.index_bits:
+            raise KeyError(id)
+        return (index, int(match.group(2), 16))
+
+    def handle(self, id: str) -> int:
+        '''
+        The integer handle of the live id.
+        Raises KeyError if there is no such id.
+        '''
+        (index, generation) = self.parse(id)
+        if index >= len(self._items) or not self._used[index] or \
+                self._generations[index] != generation:
+            raise KeyError(id)
+        return generation << self.index_bits | index
+
+    def to_id(self, handle: int) -> str:
+        '''
+        The id of the handle
+        '''
+        index = handle & ((1 << self.index_bits) - 1)
+        return f'{self._prefix}{index:x}.{handle >> self.index_bits:x}'
+
+    def reserve(self) -> str:
+        '''
+        Take a slot, returns the id for the instance to come
+        '''
+        if self._free:
+            index = self._free.pop()
+        else:
+            index = len(self._items)
+            assert index < 1 << self.index_bits
+            self._items.append(None)
+            self._generations.append(0)
+            self._used.append(False)
+        self._used[index] = True
+        self._count += 1
+        return self.to_id(self._generations[index] << self.index_bits | index)
+
+    def add(self, inst: Any) -> str:
+        '''
+        Add the instance, returns its new id
+        '''
+        id = self.reserve()
+        self[id] = inst
+        return id
+
+    def get_by_handle(self, handle: int) -> Any:
+        '''Raises KeyError if the handle is stale'''
+        index = handle & ((1 << self.index_bits) - 1)
+        if index >= len(self._items) or not self._used[index] or \
+                self._generations[index] != handle >> self.index_bits:
+            raise KeyError(handle)
+        return self.item(index)
+
+    def __getitem__(self, id: str) -> Any:
+        '''Raises KeyError if id is not a key'''
+        index = self.handle(id) & ((1 << self.index_bits) - 1)
+        return self.item(index)
+
+    def __setitem__(self, id: str, inst: Any) -> None:
+        '''Only the reserved ids can be set'''
+        index = self.handle(id) & ((1 << self.index_bits) - 1)
+        self._lazy.discard(index)
+        self._items[index] = inst
+        return
+
+    def __delitem__(self, id: str) -> None:
+        '''Raises KeyError if id is not a key'''
+        index = self.handle(id) & ((1 << self.index_bits) - 1)
+        self._lazy.discard(index)
+        self._items[index] = None
+        self._used[index] = False
+        self._generations[index] += 1
+        self._free.append(index)
+        self._count -= 1
+        return
+
+    def __iter__(self) -> Iterator[str]:
+        for index, used in enumerate(self._used):
+            if used:
+                yield self.to_id(
+                    self._generations[index] << self.index_bits | index)
+        return
+
+    def __len__(self) -> int:
+        return self._count
+
+    def items_after(
+            self, after: Optional[str] = None) -> Iterator[Tuple[str, Any]]:
+        '''
+        (id, instance) in the slots order, starting after the slot of the id
+        given, which may be deleted by now.
+        Raises KeyError if after is not an id.
+        '''
+        index = 0 if after is None else self.parse(after)[0] + 1
+        # the slots may be added while iterating
+        while index < len(self._used):
+            if self._used[index]:
+                yield (self.to_id(
+                    self._generations[index] << self.index_bits | index),
+                    self.item(index))
+            index += 1
+        return
+
+
 async def shut_the_process():
     '''
     This is how we exit FastAPI app
@@ -39,6 +247,46 @@ async def shut_the_process():
     return
 
 
+def get_service_port() -> Optional[int]:
+    '''
+    Port this service was launched on, if launched by FastLauncher
+    '''
+    port = os.environ.get(port_env)
+    return None if port is None else int(port)
+
+
+async def announce_ready(
+        get_content: Callable[[], Dict[str, Any]],
+        timeout: float = 10) -> bool:
+    '''
+    Let the launcher know this service is ready: once the service port
+    accepts connections, write the content as a single JSON line into the
+    pipe inherited from the launcher and close it.
+    Returns False if there was no pipe or the port did not become reachable.
+    '''
+    fd = os.environ.pop(ready_fd_env, None)
+    if fd is None:
+        return False
+    host = os.environ.get(host_env, '127.0.0.1')
+    port = get_service_port()
+    assert port is not None
+    # ASGI startup is done before the port is bound, wait for the latter
+    time_to_timeout = time.time() + timeout
+    listening = False
+    while not listening and time.time() < time_to_timeout:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            listening = True
+        except OSError:
+            await asyncio.sleep(0.002)
+    if listening:
+        # small enough for the write to be atomic
+        os.write(int(fd), (json.dumps(get_content()) + '\n').encode())
+    os.close(int(fd))
+    return listening
+
+
 class Simulton:
     '''
     A unit of simulation with REST API exposed via FastAPI(s).
@@ -46,6 +294,15 @@ class Simulton:
     simulton process.
     '''
     title = 'FooBar'
+    # instances per chunk of a streamed listing
+    stream_chunk = 1000
+    # max zmq messages dispatched at once
+    zmq_batch = 256
+    # secs to wait for the state snapshot
+    snapshot_timeout = 1.0
+    # the instances can be checkpointed, see dump_instances()
+    # and load_instances()
+    checkpointable = False
     description = 'FooBar API'
     version = '0.0.1'
 
@@ -55,50 +312,186 @@ class Simulton:
         if not name:
             name = f'{type(self).__qualname__}@{hex(id(self))}'
         self._name = name
+        self._port = get_service_port()
+        # discrete-event engine with the virtual clock
+        self._engine = Engine()
+        # simulated time shared by the simulation, if any
+        self._shared_time: Optional[SharedTimeReader] = None
+        shared_time_path = os.environ.get(shared_time_env)
+        if shared_time_path is not None:
+            try:
+                self._shared_time = SharedTimeReader(shared_time_path)
+                self._engine.reference = self._shared_time.time
+            except OSError as err:
+                print('Simulton caught', err)
         # start zmq subscriber, will be destroyed in on_shutdown
         self._zcontext = zmq.asyncio.Context()
         self._zsocket = self._zcontext.socket(zmq.SUB)
         self._zsocket.setsockopt(zmq.SUBSCRIBE, simulation_ztopic.encode())
+        self._zsocket.setsockopt(zmq.SUBSCRIBE, tick_ztopic.encode())
         self._zsocket.connect(simulation_zspec)
+        # lockstep ticks are acknowledged via this one, created on the first
+        # tick
+        self._zack: Optional[zmq.asyncio.Socket] = None
+        # seq of the last tick message applied
+        self._tick_seq = 0
+        self._tick_ztopic = tick_ztopic.encode()
+        self._simulation_ztopic = simulation_ztopic.encode()
+        self._subscriber = SubscriberCounters()
+        # seq of the last state update applied
+        self._state_seq = 0
+        # the snapshot request in progress, if any
+        self._zresync: Optional[zmq.asyncio.Socket] = None
+        self._shut_task: Optional[asyncio.Task] = None
 
         # map of instance ID to the instance itself
-        self._instances: Dict[str, Any] = {}
+        self._instances = InstanceRegistry(self.title)
         return
 
-    async def recv_zmq_string(self) -> str:
+    async def recv_zmq_loop(self) -> None:
         '''
-        Background async task to receive zmq data
+        Background async task to receive zmq data until the socket is closed:
+        waits for a message, then drains whatever else is pending, up to
+        zmq_batch messages, and dispatches them all.
+        Subscribed already, asks for the state snapshot first: the updates
+        published before are missed by now.
         '''
-        print('Simulton.recv_zmq_string..')
-        res = await self._zsocket.recv_string()
-        print('Simulton.recv_zmq_string() =>', res)
-        topic, message = res.split()
-        assert topic == simulation_ztopic
-        # dispatch message
-        from pydantic import parse_obj_as
         try:
-            self.on_simulation_state_update(
-                parse_obj_as(SimulationResponse, json.loads(message)))
-        except json.JSONDecodeError as err:
-            print('recv_zmq_string caught JSONDecodeError', err)
-        except Exception as err:
-            print('recv_zmq_string caught Exception', err)
+            await self.resync()
+        except (asyncio.CancelledError, zmq.ZMQError) as err:
+            print('recv_zmq_loop caught', type(err), err)
+            return
+        while not self._zsocket.closed:
+            try:
+                batch = [await self._zsocket.recv_multipart()]
+                while len(batch) < self.zmq_batch:
+                    try:
+                        batch.append(await self._zsocket.recv_multipart(
+                            flags=zmq.NOBLOCK))
+                    except zmq.Again:
+                        break
+                await self.dispatch_zmq(batch)
+            except (asyncio.CancelledError, zmq.ZMQError) as err:
+                print('recv_zmq_loop caught', type(err), err)
+                break
+        return
+
+    async def dispatch_zmq(self, batch: List[List[bytes]]) -> None:
+        '''
+        Dispatch the multipart messages received in one go.  Only the latest
+        state update matters, the earlier ones are conflated; the ticks are
+        all applied, in order.  The state updates already applied are
+        ignored, if some were missed the snapshot is applied instead.
+        '''
+        counters = self._subscriber
+        counters.batches += 1
+        counters.received += len(batch)
+        messages: List[Tuple[bytes, Any]] = []
+        latest = -1
+        seq = self._state_seq
+        gap = False
+        for frames in batch:
+            try:
+                (topic, payload) = frames
+                if topic == self._tick_ztopic:
+                    messages.append((topic, decode_tick(payload)))
+                elif topic == self._simulation_ztopic:
+                    (resp_seq, resp) = decode_state(payload)
+                    if resp_seq <= seq:
+                        counters.stale += 1
+                        continue
+                    if resp_seq > seq + 1:
+                        gap = True
+                    seq = resp_seq
+                    if latest >= 0:
+                        counters.conflated += 1
+                    latest = len(messages)
+                    messages.append((topic, (resp_seq, resp)))
+                else:
+                    raise ValueError(f'unexpected topic {topic!r}')
+            except ValueError as err:
+                counters.decode_errors += 1
+                print('dispatch_zmq caught', err)
+        for i, (topic, msg) in enumerate(messages):
+            if topic == self._tick_ztopic:
+                # lockstep ticks could be many, keep it quiet
+                await self.on_tick(msg)
+            elif i == latest:
+                if gap:
+                    counters.gaps += 1
+                    if await self.resync():
+                        continue
+                print('Simulton.dispatch_zmq() =>', msg)
+                (self._state_seq, resp) = msg
+                self.on_simulation_state_update(resp)
+        return
 
-        return message
+    async def resync(self) -> bool:
+        '''
+        Ask the simulation for the latest state update, apply it unless
+        already applied.  Returns whether it answered in time.
+        '''
+        # a fresh one every time, a REQ socket is stuck if not answered
+        sock = self._zcontext.socket(zmq.REQ)
+        sock.setsockopt(zmq.LINGER, 0)
+        self._zresync = sock
+        try:
+            sock.connect(snapshot_zspec)
+            await sock.send(b'')
+            payload = await asyncio.wait_for(
+                sock.recv(), self.snapshot_timeout)
+            (seq, resp) = decode_state(payload)
+        except asyncio.TimeoutError:
+            print('Simulton.resync: no snapshot')
+            return False
+        except ValueError as err:
+            self._subscriber.decode_errors += 1
+            print('Simulton.resync caught', err)
+            return False
+        finally:
+            sock.close()
+            self._zresync = None
+        self._subscriber.resyncs += 1
+        print(f'Simulton.resync => {seq}', resp)
+        if seq > self._state_seq:
+            self._state_seq = seq
+            self.on_simulation_state_update(resp)
+        return True
 
     def on_simulation_state_update(self, resp: SimulationResponse) -> None:
         print('on_simulation_state_update', resp)
+        self.pacing = resp.pacing
+        if resp.rate > 0:
+            self.rate = resp.rate
         if resp.state == SimulationState.PAUSED:
             self.state = SimultonState.PAUSED
         elif resp.state == SimulationState.RUNNING:
             self.state = SimultonState.RUNNING
         elif resp.state == SimulationState.SHUTTING:
             self.state = SimultonState.SHUTTING
-            shut_the_process()
+            self._shut_task = asyncio.create_task(shut_the_process())
         else:
             assert False
         return
 
+    async def on_tick(self, tick: SimulationTick) -> None:
+        '''
+        Advance the simulated time by the ticks, acknowledge
+        '''
+        if tick.seq > self._tick_seq:
+            self._tick_seq = tick.seq
+            self.pacing = Pacing.LOCKSTEP
+            self._engine.run_until(
+                self._engine.now + tick.count * tick.quantum)
+        # a republished tick is acknowledged again, but not applied
+        if self._zack is None:
+            self._zack = self._zcontext.socket(zmq.PUSH)
+            self._zack.connect(ack_zspec)
+        ack = SimulationTickAck(
+            port=self._port or 0, seq=tick.seq, time=self._engine.now)
+        await self._zack.send(encode_ack(ack))
+        return
+
     @property
     def state(self) -> SimultonState:
         '''Simulton state accessor'''
@@ -113,10 +506,13 @@ class Simulton:
         # old_state = self._state
         self._state = state
         if state == SimultonState.RUNNING:
+            self._engine.start(self._rate if self._rate > 0 else None)
             self.on_running()
         elif state == SimultonState.PAUSED:
+            self._engine.pause()
             self.on_paused()
         elif state == SimultonState.SHUTTING:
+            self._engine.pause()
             self.on_shutting()
         else:
             assert False
@@ -149,10 +545,42 @@ class Simulton:
             return rate
         print(f'Simulton rate {self._rate} -> {rate}')
         self._rate = rate
+        if rate > 0:
+            self._engine.rate = rate
         return rate
 
     @property
-    def instances(self) -> Dict[str, Any]:
+    def pacing(self) -> Pacing:
+        '''
+        just get the pacing policy
+        '''
+        return self._engine.pacing
+
+    @pacing.setter
+    def pacing(self, pacing: Pacing) -> Pacing:
+        '''Simulton pacing policy setter'''
+        if pacing == self._engine.pacing:
+            return pacing
+        print(f'Simulton pacing {self._engine.pacing} -> {pacing}')
+        self._engine.pacing = pacing
+        return pacing
+
+    @property
+    def engine(self) -> Engine:
+        '''
+        Discrete-event engine, its virtual clock is the simulated time
+        '''
+        return self._engine
+
+    @property
+    def subscriber(self) -> SubscriberCounters:
+        '''
+        Counters of the ZMQ subscriber
+        '''
+        return self._subscriber
+
+    @property
+    def instances(self) -> InstanceRegistry:
         return self._instances
 
     def on_running(self) -> None:
@@ -181,8 +609,19 @@ class Simulton:
         Simulton FastAPI app startup event handler
         '''
         # prepare to read from the zmq socket
-        asyncio.create_task(self.recv_zmq_string())
+        self._zmq_task = asyncio.create_task(self.recv_zmq_loop())
         self.state = SimultonState.PAUSED
+        # pick up where the previous process left, before anyone can see
+        path = os.environ.pop(restore_env, None)
+        if path:
+            try:
+                print('Simulton restored', self.restore(path))
+            except (OSError, ValueError) as err:
+                # start afresh rather than not at all
+                print(f'Simulton could not restore {path}:', err)
+        # let the launcher know we are up
+        self._announce_task = asyncio.create_task(
+            announce_ready(lambda: self.to_response().model_dump()))
         return
 
     def on_shutdown(self) -> None:
@@ -194,15 +633,25 @@ class Simulton:
         # https://zguide.zeromq.org/docs/chapter1/#Making-a-Clean-Exit
         # to avoid hanging infinitely
         try:
+            if self._zack is not None:
+                self._zack.setsockopt(zmq.LINGER, 0)
+                self._zack.close()
+            if self._zresync is not None:
+                self._zresync.close()
             self._zsocket.setsockopt(zmq.LINGER, 0)
             self._zsocket.close()
             self._zcontext.term()
         except Exception as e:
             print('Caught:', type(e), e)
+        if self._shared_time is not None:
+            self._engine.reference = None
+            self._shared_time.close()
+            self._shared_time = None
         return
 
     def get_new_instance_id(self) -> str:
-        return f'{self.title}-{get_random_id()}'
+        '''Reserves the id for add_instance'''
+        return self._instances.reserve()
 
     def add_instance(self, inst: Any, id: str) -> None:
         assert id
@@ -218,6 +667,173 @@ class Simulton:
         del self._instances[id]
         return
 
+    def create_many(self, params: List[Any], model: Type[BaseModel],
+                    create: Callable[[Any], str]) -> BatchResponse:
+        '''
+        Create the instances item by item: every item is validated as the
+        model and create(item) returns the new id.  The invalid items are
+        reported as 422, the rest are created regardless.
+        '''
+        start = time.time()
+        items: List[BatchItemResponse] = []
+        for p in params:
+            try:
+                valid = model.model_validate(p)
+            except ValidationError as err:
+                message = '; '.join(
+                    f"{'.'.join(str(loc) for loc in e['loc'])}: {e['msg']}"
+                    for e in err.errors())
+                items.append(BatchItemResponse(
+                    status_code=422, message=f'Bummer: {message}'))
+                continue
+            items.append(BatchItemResponse(id=create(valid), status_code=201))
+        return BatchResponse(items=items, elapsed=time.time() - start)
+
+    def delete_many(self, ids: List[str]) -> BatchResponse:
+        '''
+        Delete the instances, those not found are reported as such
+        '''
+        start = time.time()
+        items: List[BatchItemResponse] = []
+        for id in ids:
+            try:
+                self.del_instance_by_id(id)
+                items.append(BatchItemResponse(id=id, status_code=200))
+            except KeyError:
+                items.append(BatchItemResponse(
+                    id=id, status_code=404, message='Item not found'))
+        return BatchResponse(items=items, elapsed=time.time() - start)
+
+    def checkpoint(self, path: str) -> CheckpointResponse:
+        '''
+        Write the instances into the checkpoint file at path.
+        Raises OSError if it can not be written, ValueError if the
+        simulton is not checkpointable.
+        '''
+        if not self.checkpointable:
+            raise ValueError(f'{self.title} can not be checkpointed')
+        start = time.time()
+        (generations, used, free) = self._instances.dump()
+        arrays: Dict[str, np.ndarray] = {
+            'registry.generations': np.array(generations, dtype=np.int64),
+            'registry.used': np.array(used, dtype=bool),
+            'registry.free': np.array(free, dtype=np.int64),
+        }
+        arrays.update(self.dump_instances())
+        count = len(self._instances)
+        meta = {
+            'title': self.title, 'version': self.version,
+            'time': self._engine.now, 'instances': count
+        }
+        size = write_checkpoint(path, meta, arrays)
+        return CheckpointResponse(
+            path=path, instances=count, size=size,
+            elapsed=time.time() - start)
+
+    def restore(self, path: str) -> CheckpointResponse:
+        '''
+        Replace the instances with the ones of the checkpoint file at path,
+        which is memory-mapped: an instance is created when first used.
+        The simulated time goes on from the time of the checkpoint.
+        Raises OSError if it can not be read, ValueError if it is not
+        a checkpoint of this simulton or the simulton is not checkpointable.
+        '''
+        if not self.checkpointable:
+            raise ValueError(f'{self.title} can not be restored')
+        start = time.time()
+        ckpt = Checkpoint(path)
+        title = ckpt.meta.get('title')
+        if title != self.title:
+            raise ValueError(f'{path} is a checkpoint of {title}')
+        self._engine.advance(ckpt.meta.get('time', 0.0))
+        loader = self.load_instances(ckpt)
+        self._instances.load(
+            ckpt['registry.generations'].tolist(),
+            ckpt['registry.used'].tolist(),
+            ckpt['registry.free'].tolist(), loader)
+        return CheckpointResponse(
+            path=path, instances=len(self._instances), size=ckpt.size,
+            elapsed=time.time() - start)
+
+    def dump_instances(self) -> Dict[str, np.ndarray]:
+        '''
+        The state of the instances as arrays to checkpoint, keyed by the
+        names load_instances() finds them by, if checkpointable
+        '''
+        raise NotImplementedError(f'{self.title} can not be checkpointed')
+
+    def load_instances(self, ckpt: Checkpoint) -> Callable[[int, str], Any]:
+        '''
+        Restore the state the instances share from the checkpoint, returns
+        the loader of the instance of a registry slot, see
+        InstanceRegistry.load(), if checkpointable
+        '''
+        raise NotImplementedError(f'{self.title} can not be restored')
+
+    def on_checkpoint(self, params: CheckpointParams) -> JSONResponse:
+        '''
+        Handle REST API POST to write a checkpoint
+        '''
+        try:
+            resp = self.checkpoint(params.path)
+        except (OSError, ValueError) as err:
+            content = Message(f'Bummer: {err}').model_dump()
+            return JSONResponse(status_code=400, content=content)
+        return FastJSONResponse(content=resp.model_dump())
+
+    def list_response(self, to_dict: Callable[[str, Any], Dict[str, Any]],
+                      limit: Optional[int] = None,
+                      after: Optional[str] = None,
+                      stream: bool = False) -> Response:
+        '''
+        Listing of the instances serialized by to_dict(id, instance):
+        all of them, or a page of up to limit ones after the id given,
+        X-Next-After header tells the id to continue after.
+        With stream - NDJSON, an instance per line, produced as it goes.
+        Raises KeyError if after is not an id.
+        '''
+        items = self._instances.items_after(after)
+        if after is not None:
+            # validate now, before anything is sent
+            self._instances.parse(after)
+        if stream:
+            return StreamingResponse(
+                self.ndjson(items, to_dict, limit),
+                media_type='application/x-ndjson')
+        page: Dict[str, Any] = {}
+        headers: Dict[str, str] = {}
+        last = None
+        for id, inst in items:
+            if limit is not None and len(page) == limit:
+                # there are more
+                headers[next_after_header] = last
+                break
+            page[id] = to_dict(id, inst)
+            last = id
+        return FastJSONResponse(content=page, headers=headers)
+
+    async def ndjson(self, items: Iterator[Tuple[str, Any]],
+                     to_dict: Callable[[str, Any], Dict[str, Any]],
+                     limit: Optional[int] = None) -> AsyncIterator[bytes]:
+        '''
+        The instances serialized as NDJSON, in chunks of lines
+        '''
+        chunk: List[Dict[str, Any]] = []
+        count = 0
+        for id, inst in items:
+            if limit is not None and count == limit:
+                break
+            chunk.append(to_dict(id, inst))
+            count += 1
+            if len(chunk) == self.stream_chunk:
+                yield dumps_lines(chunk)
+                chunk = []
+                # let the others in
+                await asyncio.sleep(0)
+        if chunk:
+            yield dumps_lines(chunk)
+        return
+
     @classmethod
     def create_app(cls) -> FastAPI:
         print('Creating a FastAPI app', cls.description)
@@ -228,10 +844,14 @@ class Simulton:
     def to_response(self) -> SimultonResponse:
         return SimultonResponse(
             description=self.description,
+            port=self._port,
             rate=self.rate,
+            pacing=self.pacing,
+            time=self._engine.now,
             state=self.state,
             title=self.title,
-            version=self.version)
+            version=self.version,
+            subscriber=self._subscriber.model_copy())
 
     def on_put_simulton(self, req: SimultonRequest) -> JSONResponse:
         '''
@@ -239,6 +859,8 @@ class Simulton:
         '''
         if req.rate is not None:
             self.rate = req.rate
+        if req.pacing is not None:
+            self.pacing = req.pacing
         self.state = req.state
         if req.state == SimultonState.SHUTTING:
             background = BackgroundTask(shut_the_process)
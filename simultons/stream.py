@@ -0,0 +1,122 @@
+'''
+Push streams of the instance state changes to the clients.
+
+Every client has its own send queue which holds the latest item per key
+only: a newer item replaces the one pending for the same key, so the queue
+never grows beyond the number of the keys the client is subscribed to and a
+slow consumer gets the latest state with no backlog.
+'''
+import asyncio
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+
+class CoalescingQueue:
+    '''
+    Send queue of a stream client, keeps the latest item per key
+    '''
+
+    def __init__(self) -> None:
+        self._items: Dict[str, Any] = {}
+        self._ready = asyncio.Event()
+        # number of the items replaced by the newer ones before sent
+        self.coalesced = 0
+        return
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def put(self, key: str, item: Any) -> None:
+        '''
+        Enqueue the item, replacing the one pending for the key
+        '''
+        if key in self._items:
+            self.coalesced += 1
+        self._items[key] = item
+        self._ready.set()
+        return
+
+    def get_nowait(self, limit: int = 0) -> List[Any]:
+        '''
+        Dequeue up to limit items, all of them if 0, oldest keys first
+        '''
+        if limit <= 0 or limit >= len(self._items):
+            items = list(self._items.values())
+            self._items.clear()
+        else:
+            keys = list(self._items.keys())[:limit]
+            items = [self._items.pop(key) for key in keys]
+        if not self._items:
+            self._ready.clear()
+        return items
+
+    async def get(self, limit: int = 0) -> List[Any]:
+        '''
+        Wait for the items, dequeue up to limit of them
+        '''
+        while not self._items:
+            await self._ready.wait()
+        return self.get_nowait(limit)
+
+
+class StreamClient:
+    '''
+    Subscription of a client: the keys wanted, all of them if None,
+    and the send queue
+    '''
+
+    def __init__(self, keys: Optional[Iterable[str]] = None) -> None:
+        self.keys: Optional[Set[str]] = None
+        self.queue = CoalescingQueue()
+        self.subscribe(keys)
+        return
+
+    def subscribe(self, keys: Optional[Iterable[str]]) -> None:
+        '''
+        Replace the subscription, None or empty for all the keys
+        '''
+        self.keys = set(keys) if keys else None
+        return
+
+    def wants(self, key: str) -> bool:
+        return self.keys is None or key in self.keys
+
+
+class StreamHub:
+    '''
+    The clients of a stream
+    '''
+
+    def __init__(self) -> None:
+        self._clients: Set[StreamClient] = set()
+        return
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def add(self, client: StreamClient) -> None:
+        self._clients.add(client)
+        return
+
+    def discard(self, client: StreamClient) -> None:
+        self._clients.discard(client)
+        return
+
+    def keys(self) -> Optional[Set[str]]:
+        '''
+        The keys any of the clients is subscribed to, None for all
+        '''
+        keys: Set[str] = set()
+        for client in self._clients:
+            if client.keys is None:
+                return None
+            keys |= client.keys
+        return keys
+
+    def publish(self, key: str, item: Any) -> None:
+        '''
+        Enqueue the item to all the clients subscribed to the key
+        '''
+        for client in self._clients:
+            if client.wants(key):
+                client.queue.put(key, item)
+        return
@@ -0,0 +1,79 @@
+'''
+Binary encoding of the messages on the ZMQ bus.
+
+Every message is two frames: the topic and the struct-packed payload,
+little-endian, fixed size per topic.  Enums go as their index.
+
+* state update - seq, state, pacing, rate; seq increments with every state
+  update published, the snapshot is the latest one
+* tick - seq, first tick, count, quantum
+* tick acknowledgement - port, seq, simulated time
+'''
+import struct
+from typing import List, Tuple
+from . import Pacing, SimulationState, SimulationResponse, \
+    SimulationTick, SimulationTickAck
+
+state_layout = struct.Struct('<QBBd')
+tick_layout = struct.Struct('<QQId')
+ack_layout = struct.Struct('<IQd')
+
+states = list(SimulationState)
+pacings = list(Pacing)
+
+
+def encode_state(resp: SimulationResponse, seq: int) -> bytes:
+    return state_layout.pack(
+        seq, states.index(resp.state), pacings.index(resp.pacing), resp.rate)
+
+
+def decode_state(payload: bytes) -> Tuple[int, SimulationResponse]:
+    '''
+    Returns seq and the state update.
+    Raises ValueError if the payload is malformed
+    '''
+    try:
+        (seq, state, pacing, rate) = state_layout.unpack(payload)
+        return (seq, SimulationResponse.model_construct(
+            state=states[state], pacing=pacings[pacing], rate=rate))
+    except (struct.error, IndexError) as err:
+        raise ValueError(f'bad state update: {err}') from None
+
+
+def encode_tick(tick: SimulationTick) -> bytes:
+    return tick_layout.pack(
+        tick.seq, tick.first_tick, tick.count, tick.quantum)
+
+
+def decode_tick(payload: bytes) -> SimulationTick:
+    '''
+    Raises ValueError if the payload is malformed
+    '''
+    try:
+        (seq, first_tick, count, quantum) = tick_layout.unpack(payload)
+    except struct.error as err:
+        raise ValueError(f'bad tick: {err}') from None
+    return SimulationTick.model_construct(
+        seq=seq, first_tick=first_tick, count=count, quantum=quantum)
+
+
+def encode_ack(ack: SimulationTickAck) -> bytes:
+    return ack_layout.pack(ack.port, ack.seq, ack.time)
+
+
+def decode_ack(payload: bytes) -> SimulationTickAck:
+    '''
+    Raises ValueError if the payload is malformed
+    '''
+    try:
+        (port, seq, time) = ack_layout.unpack(payload)
+    except struct.error as err:
+        raise ValueError(f'bad tick ack: {err}') from None
+    return SimulationTickAck.model_construct(port=port, seq=seq, time=time)
+
+
+def frames(topic: str, payload: bytes) -> List[bytes]:
+    '''
+    The multipart message
+    '''
+    return [topic.encode(), payload]
@@ -0,0 +1,255 @@
+'''
+Zygote - a process with the simultons already imported which forks ready
+to run simulton processes on request.
+
+This is built on top of multiprocessing forkserver: the fork server imports
+the preloaded modules once, every simulton process is then forked from it.
+Optionally a pool of idle warm workers is kept - these are forked upfront and
+just wait to be told which simulton to run on which port.
+'''
+from collections import deque
+import importlib
+import multiprocessing
+import multiprocessing.connection
+import multiprocessing.forkserver
+import multiprocessing.process
+import os
+import subprocess
+from typing import Deque, Dict, List, Optional, Tuple
+import uvicorn
+from .globals import ready_fd_env, host_env, port_env
+
+# modules imported by the zygote before it forks anything
+preloaded_modules = [
+    '__main__', 'simultons', 'simultons.clock', 'simultons.elevator'
+]
+
+parent_dir = os.path.abspath(
+    os.path.dirname(os.path.realpath(__file__)) + '/..')
+
+
+def module_name(path: str) -> str:
+    '''
+    Convert the path to the simulton source, e.g. simultons/clock.py,
+    to the module name, e.g. simultons.clock
+    '''
+    path = os.path.relpath(os.path.join(parent_dir, path), parent_dir)
+    if path.endswith('.py'):
+        path = path[:-3]
+    return path.replace(os.sep, '.')
+
+
+def redirect_output(output: multiprocessing.connection.Connection) -> None:
+    '''
+    Make stdout and stderr of this process go into the output pipe
+    '''
+    fd = output.fileno()
+    os.dup2(fd, 1)
+    os.dup2(fd, 2)
+    output.close()
+    return
+
+
+def run_simulton(path: str, host: str, port: int,
+                 ready: multiprocessing.connection.Connection,
+                 env: Optional[Dict[str, str]] = None) -> None:
+    '''
+    Run the simulton FastAPI app in this process
+    env - added to the environment of the process
+    '''
+    os.environ.update(env or {})
+    # the simulton announces its readiness the same way it does
+    # when launched by the fastapi CLI
+    os.environ[ready_fd_env] = str(os.dup(ready.fileno()))
+    os.environ[host_env] = host
+    os.environ[port_env] = str(port)
+    ready.close()
+    os.chdir(parent_dir)
+    module = importlib.import_module(module_name(path))
+    uvicorn.run(module.app, host=host, port=port, workers=1)
+    return
+
+
+def cold_worker(path: str, host: str, port: int,
+                output: multiprocessing.connection.Connection,
+                ready: multiprocessing.connection.Connection,
+                env: Optional[Dict[str, str]] = None) -> None:
+    '''
+    Entry point of the simulton process forked on request
+    '''
+    # in its own process group, same as when launched by FastLauncher
+    os.setsid()
+    redirect_output(output)
+    run_simulton(path, host, port, ready, env)
+    return
+
+
+def warm_worker(control: multiprocessing.connection.Connection,
+                output: multiprocessing.connection.Connection,
+                ready: multiprocessing.connection.Connection) -> None:
+    '''
+    Entry point of the idle warm worker: wait for (path, host, port, env) to
+    run the simulton, or for None to exit
+    '''
+    # in its own process group, same as when launched by FastLauncher
+    os.setsid()
+    redirect_output(output)
+    try:
+        req = control.recv()
+    except EOFError:
+        return
+    control.close()
+    if req is None:
+        return
+    path, host, port, env = req
+    run_simulton(path, host, port, ready, env)
+    return
+
+
+class ZygoteProcess:
+    '''
+    Simulton process forked by the zygote.
+    Mimics just enough of subprocess.Popen for FastLauncher to use it.
+    '''
+
+    def __init__(self, process: multiprocessing.process.BaseProcess,
+                 output: multiprocessing.connection.Connection,
+                 ready: multiprocessing.connection.Connection) -> None:
+        self._process = process
+        self.pid = process.pid
+        self.returncode: Optional[int] = None
+        # stderr is redirected to stdout
+        self.stdout = os.fdopen(os.dup(output.fileno()), 'r')
+        self.stderr = None
+        output.close()
+        # read end of the pipe the simulton announces its readiness into,
+        # to be closed by FastLauncher
+        self.ready = os.dup(ready.fileno())
+        ready.close()
+        return
+
+    def poll(self) -> Optional[int]:
+        '''
+        Returns the exit code or None if the process is still alive
+        '''
+        if self.returncode is None and not self._process.is_alive():
+            self.returncode = self._process.exitcode
+        return self.returncode
+
+    def wait(self, timeout: Optional[float] = None) -> int:
+        '''
+        Raises subprocess.TimeoutExpired if the process did not terminate
+        '''
+        self._process.join(timeout)
+        ec = self.poll()
+        if ec is None:
+            assert timeout is not None
+            raise subprocess.TimeoutExpired(str(self.pid), timeout)
+        return ec
+
+    def communicate(self) -> Tuple[str, None]:
+        '''
+        Wait for the process to terminate, return its output
+        '''
+        self.wait()
+        out = self.stdout.read()
+        self.stdout.close()
+        return (out, None)
+
+
+class Zygote:
+    '''
+    Forks the simulton processes from a process with everything preloaded
+    '''
+
+    def __init__(self, pool_size: int = 0,
+                 preload: Optional[List[str]] = None) -> None:
+        '''
+        pool_size - number of idle warm workers to keep around
+        '''
+        self._pool_size = pool_size
+        self._preload = preloaded_modules if preload is None else preload
+        self._ctx = multiprocessing.get_context('forkserver')
+        # idle warm workers: process, control, output and ready pipes
+        self._pool: Deque[Tuple[
+            multiprocessing.process.BaseProcess,
+            multiprocessing.connection.Connection,
+            multiprocessing.connection.Connection,
+            multiprocessing.connection.Connection]] = deque()
+        return
+
+    @property
+    def pool_size(self) -> int:
+        '_pool_size accessor'
+        return self._pool_size
+
+    def start(self) -> None:
+        '''
+        Start the fork server and fill the pool of the warm workers
+        '''
+        self._ctx.set_forkserver_preload(self._preload)
+        multiprocessing.forkserver.ensure_running()
+        while len(self._pool) < self._pool_size:
+            self._pool.append(self.fork_warm_worker())
+        return
+
+    def fork_warm_worker(self) -> Tuple[
+            multiprocessing.process.BaseProcess,
+            multiprocessing.connection.Connection,
+            multiprocessing.connection.Connection,
+            multiprocessing.connection.Connection]:
+        '''
+        Fork an idle warm worker
+        '''
+        control_r, control_w = self._ctx.Pipe(duplex=False)
+        output_r, output_w = self._ctx.Pipe(duplex=False)
+        ready_r, ready_w = self._ctx.Pipe(duplex=False)
+        process = self._ctx.Process(
+            target=warm_worker, args=(control_r, output_w, ready_w),
+            daemon=True)
+        process.start()
+        control_r.close()
+        output_w.close()
+        ready_w.close()
+        return (process, control_w, output_r, ready_r)
+
+    def spawn(self, path: str, host: str, port: int,
+              env: Optional[Dict[str, str]] = None) -> ZygoteProcess:
+        '''
+        Get a simulton process running path on host:port
+        env - added to the environment of the process
+        '''
+        if self._pool:
+            process, control, output, ready = self._pool.popleft()
+            control.send((path, host, port, env))
+            control.close()
+            # replenish the pool
+            self._pool.append(self.fork_warm_worker())
+            return ZygoteProcess(process, output, ready)
+
+        output_r, output_w = self._ctx.Pipe(duplex=False)
+        ready_r, ready_w = self._ctx.Pipe(duplex=False)
+        process = self._ctx.Process(
+            target=cold_worker,
+            args=(path, host, port, output_w, ready_w, env),
+            daemon=True)
+        process.start()
+        output_w.close()
+        ready_w.close()
+        return ZygoteProcess(process, output_r, ready_r)
+
+    def close(self) -> None:
+        '''
+        Dismiss the idle warm workers
+        '''
+        while self._pool:
+            process, control, output, ready = self._pool.popleft()
+            try:
+                control.send(None)
+            except OSError as err:
+                print('Zygote.close caught', err)
+            control.close()
+            output.close()
+            ready.close()
+            process.join(1)
+        return
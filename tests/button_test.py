@@ -1,10 +1,12 @@
 '''
 Testing all the button-related stuff
 '''
+import sys
 import unittest
 from typing import List
 
-from simultons import Button, ButtonWithLed, ButtonWithLedPanel
+from simultons import Button, ButtonWithLed, ButtonWithLedPanel, \
+    LedChange, PanelButton
 
 
 class TestButton(unittest.TestCase):
@@ -157,8 +159,8 @@ class TestButtonWithLedPanel(unittest.TestCase):
             self.panel.annotated_labels,
             ['1', '2', '*_3_*', '4', '*_5_*'])
 
-        self.panel._buttons[0].disable()
-        self.panel._buttons[4].disable()
+        self.panel.buttons[0].disable()
+        self.panel.buttons[4].disable()
         self.assertEqual(
             self.panel.annotated_labels,
             ['_1_', '2', '*_3_*', '4', '*_5_*'])
@@ -193,6 +195,104 @@ class TestButtonWithLedPanel(unittest.TestCase):
         self.assertEqual(
             self.panel.__repr__(),
             f"<ButtonWithLedPanel {annotated_labels} at {hex(id(self.panel))}>")
+        # no such buttons
+        for button in (-1, 5):
+            with self.assertRaises(IndexError):
+                self.panel.click(button)
+        self.assertEqual(self.panel.leds_on, [2, 4])
+        return
+
+    def test_many(self):
+        '''
+        Large panel: compact state, button views on demand
+        '''
+        labels = tuple(str(i) for i in range(250))
+        panel = ButtonWithLedPanel(labels, None)
+        self.assertFalse(hasattr(panel, '__dict__'))
+        self.assertFalse(hasattr(Button('x', None), '__dict__'))
+        self.assertFalse(hasattr(ButtonWithLed('x', None), '__dict__'))
+        print(f'{len(labels)} buttons panel: {sys.getsizeof(panel)} bytes')
+        self.assertLess(sys.getsizeof(panel), 100)
+        for i in (200, 3, 249, 3):
+            panel.click(i)
+        self.assertEqual(panel.leds_on, [3, 200, 249])
+        self.assertEqual(list(panel.iter_leds_on()), [3, 200, 249])
+        self.assertEqual(panel.leds_count, 3)
+        self.assertEqual(panel.leds_mask, 1 << 3 | 1 << 200 | 1 << 249)
+        panel.reset_button(200)
+        self.assertEqual(panel.leds_on, [3, 249])
+        # the views
+        button = panel.buttons[-1]
+        self.assertIsInstance(button, PanelButton)
+        self.assertEqual((button.index, button.label), (249, '249'))
+        self.assertTrue(button.is_on())
+        self.assertEqual(button.annotated_label, '*_249_*')
+        button.reset()
+        self.assertFalse(panel.is_on(249))
+        self.assertTrue(button.click())
+        self.assertFalse(button.click())
+        self.assertEqual(len(panel.buttons), 250)
+        with self.assertRaises(IndexError):
+            panel.buttons[250]
+        return
+
+    def test_deltas(self):
+        '''
+        The changes are called back, coalesced within a batch
+        '''
+        calls: List[List[LedChange]] = []
+        panel = ButtonWithLedPanel(
+            self.labels, lambda p, changes: calls.append(changes),
+            deltas=True)
+        panel.click(3)
+        # no change - no call
+        panel.click(3)
+        self.assertEqual(calls, [[LedChange(3, True, 1)]])
+        calls.clear()
+        with panel.batch():
+            panel.click(4)
+            panel.click(0)
+            panel.click(1)
+            # on and off within the batch
+            panel.reset_button(1)
+            panel.reset_button(3)
+            with panel.batch():
+                panel.click(2)
+            self.assertEqual(calls, [])
+        self.assertEqual(calls, [[
+            LedChange(0, True, 2), LedChange(2, True, 3),
+            LedChange(3, False, 4), LedChange(4, True, 5)]])
+        self.assertEqual(panel.seq, 5)
+        # the LEDs going off are reported too
+        calls.clear()
+        panel.reset_button(4)
+        # not lit - no call
+        panel.reset_button(4)
+        panel.reset_button(5)
+        self.assertEqual(calls, [[LedChange(4, False, 6)]])
+        calls.clear()
+        panel.reset()
+        self.assertEqual(calls, [[
+            LedChange(0, False, 7), LedChange(2, False, 8)]])
+        # the stream of the changes ends with nothing lit
+        panel.click(1)
+        panel.reset_button(1)
+        lit = set()
+        for change in [c for changes in calls for c in changes]:
+            if change.on:
+                lit.add(change.index)
+            else:
+                lit.discard(change.index)
+        self.assertEqual(lit, set())
+        self.assertEqual(panel.seq, 10)
+        # the full list without deltas, once per batch
+        calls.clear()
+        panel = ButtonWithLedPanel(
+            self.labels, lambda p, leds_on: calls.append(leds_on))
+        with panel.batch():
+            panel.click(1)
+            panel.click(2)
+        self.assertEqual(calls, [[1, 2]])
         return
 
 
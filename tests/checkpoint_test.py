@@ -0,0 +1,73 @@
+'''
+Testing the checkpoint files
+'''
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from simultons.checkpoint import Checkpoint, pack_strings, unpack_string, \
+    write_checkpoint
+
+
+class TestCheckpoint(unittest.TestCase):
+    '''
+    Verify write_checkpoint and Checkpoint functionality
+    '''
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self._path = os.path.join(self._dir.name, 'test.ckpt')
+        return
+
+    def tearDown(self):
+        self._dir.cleanup()
+        return
+
+    def test_all(self):
+        '''
+        The arrays are read back as they were written
+        '''
+        names = ['car', '', 'лифт', 'x' * 100]
+        (blob, ends) = pack_strings(names)
+        arrays = {
+            'floor': np.arange(7, dtype=np.int32),
+            'up': np.arange(12, dtype=np.uint64).reshape(6, 2),
+            'used': np.array([True, False, True]),
+            'empty': np.zeros(0, dtype=np.int64),
+            'names': blob,
+            'name_ends': ends,
+        }
+        expected = {name: array.copy() for name, array in arrays.items()}
+        size = write_checkpoint(self._path, {'title': 'Test'}, arrays)
+        self.assertEqual(os.path.getsize(self._path), size)
+        with Checkpoint(self._path) as ckpt:
+            self.assertEqual(ckpt.meta, {'title': 'Test'})
+            self.assertEqual(list(ckpt), list(expected))
+            for name, array in expected.items():
+                np.testing.assert_array_equal(ckpt[name], array)
+                self.assertEqual(ckpt[name].dtype, array.dtype)
+                self.assertFalse(ckpt[name].flags.writeable)
+            self.assertEqual(
+                [unpack_string(ckpt['names'], ckpt['name_ends'], i)
+                 for i in range(len(names))], names)
+            with self.assertRaises(KeyError):
+                ckpt['foo']
+        return
+
+    def test_bad(self):
+        '''
+        Not a checkpoint
+        '''
+        with open(self._path, 'wb') as f:
+            f.write(b'{"foo": "bar"}')
+        with self.assertRaises(ValueError):
+            Checkpoint(self._path)
+        with self.assertRaises(OSError):
+            Checkpoint(self._path + '.none')
+        return
+
+
+if __name__ == '__main__':
+    unittest.main()
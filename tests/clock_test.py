@@ -1,10 +1,220 @@
+import asyncio
+import json
+import os
+import tempfile
 import time
-from typing import Dict
+from typing import Any, Dict, List, Tuple
 import unittest
-from simultons import SimultonProxy, NewClockParams, ClockResponse
+from fastapi.testclient import TestClient
+from simultons import SimultonProxy, NewClockParams, ClockResponse, Engine
+import simultons.clock as clock_simulton
+from simultons.clock import ClockBank
+from simultons.globals import restore_env
 
 simulton_uri = '/api/v1/simulton'
 clocks_uri = '/api/v1/clocks/'
+feed_uri = '/api/v1/clocks:feed'
+checkpoint_uri = '/api/v1/simulton/checkpoint'
+
+
+class TestClockBank(unittest.TestCase):
+    '''
+    Verify ClockBank functionality
+    '''
+
+    def test_all(self):
+        '''
+        The clocks go at their rates from their offsets, the slots are reused
+        '''
+        engine = Engine()
+        bank = ClockBank(engine)
+        a = bank.add()
+        b = bank.add(rate=2, offset=100)
+        engine.run_until(10)
+        c = bank.add(rate=0.5)
+        engine.run_until(20)
+        self.assertEqual(bank.times().tolist(), [20, 140, 5])
+        self.assertEqual(bank.time(b), 140)
+        # slow it down
+        bank.set_rate(b, 1)
+        engine.run_until(30)
+        self.assertEqual(bank.times().tolist(), [30, 150, 10])
+        bank.remove(a)
+        self.assertEqual(len(bank), 2)
+        self.assertEqual(bank.add(), a)
+        self.assertEqual(bank.time(a), 0)
+        # way over the initial capacity
+        N = 10 * ClockBank.initial_capacity
+        for _ in range(N):
+            bank.add()
+        self.assertEqual(len(bank), N + 3)
+        self.assertGreaterEqual(bank.capacity, N + 3)
+        engine.run_until(31)
+        self.assertEqual(bank.times()[c], 10.5)
+        self.assertTrue((bank.times()[3:] == 1).all())
+        return
+
+    def test_many(self):
+        '''
+        Reading many clocks at once is a single vectorized computation
+        '''
+        engine = Engine()
+        bank = ClockBank(engine)
+        N = 100000
+        for i in range(N):
+            bank.add(rate=1 + i % 3)
+        engine.run_until(10)
+        start = time.time()
+        times = bank.times()
+        elapsed = time.time() - start
+        print(f'Read {N} clocks in {elapsed*1000:.3f} msecs')
+        self.assertEqual(times[:3].tolist(), [10, 20, 30])
+        return
+
+
+class TestClockFeed(unittest.TestCase):
+    '''
+    Verify ClockFeed functionality using TestClient
+    '''
+
+    def test_all(self):
+        '''
+        The subscribers of a tick share its payload
+        '''
+        with TestClient(clock_simulton.app) as client:
+            sim = clock_simulton.theClockSimulton
+            for num in range(3):
+                params = NewClockParams(name=f'clock-{num}', offset=num)
+                client.post(clocks_uri, json=params.model_dump())
+            response = client.get(feed_uri, params={'hz': 50, 'count': 2})
+            self.assertEqual(
+                response.headers['content-type'],
+                'text/event-stream; charset=utf-8')
+            lines = response.text.splitlines()
+            self.assertEqual(lines[0], 'id: 1')
+            data = json.loads(lines[1][len('data:'):])
+            self.assertEqual(sorted(data.values()), [0.0, 1.0, 2.0])
+            self.assertEqual(lines[3], 'id: 2')
+            # gone once the last subscriber is
+            self.assertEqual(sim._feeds, {})
+
+            async def view_many() -> List[List[bytes]]:
+                feed = sim.feed(50.0)
+                self.assertIs(sim.feed(50.0), feed)
+
+                async def view() -> List[bytes]:
+                    return [payload async for payload in feed.events(3)]
+
+                return await asyncio.gather(*(view() for _ in range(100)))
+
+            views = client.portal.call(view_many)
+            for payloads in views:
+                for (payload, first) in zip(payloads, views[0]):
+                    self.assertIs(payload, first)
+        return
+
+
+class TestClockCheckpoint(unittest.TestCase):
+    '''
+    Verify the clocks checkpoint using TestClient
+    '''
+
+    def test_all(self):
+        '''
+        The clocks go on from the times checkpointed
+        '''
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'clocks.ckpt')
+            with TestClient(clock_simulton.app) as client:
+                sim = clock_simulton.theClockSimulton
+                for num in range(5):
+                    params = NewClockParams(
+                        name=f'clock-{num}', rate=num, offset=10 * num)
+                    client.post(clocks_uri, json=params.model_dump())
+                sim.engine.advance(3.0)
+                client.delete(f'{clocks_uri}{next(iter(sim.instances))}')
+                expected = client.get(clocks_uri).json()
+                response = client.post(
+                    checkpoint_uri, json={'path': path})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()['instances'], 4)
+
+            os.environ[restore_env] = path
+            try:
+                with TestClient(clock_simulton.app) as client:
+                    sim = clock_simulton.theClockSimulton
+                    # the simulated time goes on from the checkpoint
+                    self.assertEqual(sim.engine.now, 3.0)
+                    self.assertEqual(
+                        client.get(clocks_uri).json(), expected)
+                    sim.engine.advance(4.0)
+                    for id, cl in expected.items():
+                        self.assertAlmostEqual(
+                            sim.get_instance_by_id(id).time,
+                            cl['time'] + cl['rate'])
+            finally:
+                os.environ.pop(restore_env, None)
+        return
+
+    def test_bad(self):
+        '''
+        A checkpoint which can not be restored is reported, the simulton
+        starts afresh; a simulton not checkpointable says so
+        '''
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'garbage.ckpt')
+            with open(path, 'w') as f:
+                f.write('garbage')
+            for bad in (path, os.path.join(tmp, 'missing.ckpt')):
+                os.environ[restore_env] = bad
+                try:
+                    with TestClient(clock_simulton.app) as client:
+                        self.assertEqual(client.get(clocks_uri).json(), {})
+                        self.assertEqual(
+                            client.get(simulton_uri).json()['state'],
+                            'PAUSED')
+                finally:
+                    os.environ.pop(restore_env, None)
+            with TestClient(clock_simulton.app) as client:
+                sim = clock_simulton.theClockSimulton
+                sim.checkpointable = False
+                response = client.post(checkpoint_uri, json={'path': path})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(
+                    'can not be checkpointed', response.json()['message'])
+                with self.assertRaises(ValueError):
+                    sim.restore(path)
+        return
+
+
+class TestClockListing(unittest.TestCase):
+    '''
+    Verify the clocks listings using TestClient
+    '''
+
+    def test_reused_slot(self):
+        '''
+        A clock created in the slot of a deleted one while the clocks are
+        listed is read as itself, not as the one deleted
+        '''
+        with TestClient(clock_simulton.app) as client:
+            sim = clock_simulton.theClockSimulton
+            for num in range(2):
+                params = NewClockParams(name=f'clock-{num}', offset=100)
+                client.post(clocks_uri, json=params.model_dump())
+            to_dict = sim.to_dict_now()
+            (gone, kept) = list(sim.instances)
+            client.delete(f'{clocks_uri}{gone}')
+            params = NewClockParams(name='new', rate=2, offset=7)
+            id = client.post(clocks_uri, json=params.model_dump()).json()['id']
+            cl = sim.get_instance_by_id(id)
+            self.assertEqual(cl.index, 0)
+            self.assertEqual(to_dict(id, cl), {
+                'id': id, 'name': 'new', 'time': 7.0, 'rate': 2.0,
+                'offset': 7.0})
+            self.assertEqual(
+                to_dict(kept, sim.get_instance_by_id(kept))['offset'], 100)
+        return
 
 
 class TestClockSimulton(unittest.TestCase):
@@ -80,19 +290,19 @@ class TestClockSimulton(unittest.TestCase):
 
     def get_nonexistent_clock(self) -> None:
         assert self.restc is not None
-        (status_code, rdata) = self.restc.get(
-            f'{clocks_uri}1234567890')
-        self.assertEqual(status_code, 404)
-        expected = {'message': 'Item not found'}
-        self.assertEqual(expected, rdata)
+        for id in ('1234567890', 'Clock--1.0', 'Clock-00.0'):
+            (status_code, rdata) = self.restc.get(f'{clocks_uri}{id}')
+            self.assertEqual(status_code, 404)
+            expected = {'message': 'Item not found'}
+            self.assertEqual(expected, rdata)
         return
 
     def del_nonexistent_clock(self) -> None:
-        (status_code, rdata) = self.restc.delete(
-            f'{clocks_uri}1234567890')
-        self.assertEqual(status_code, 404)
-        expected = {'message': 'Item not found'}
-        self.assertEqual(expected, rdata)
+        for id in ('1234567890', 'Clock--1.0', 'Clock-00.0'):
+            (status_code, rdata) = self.restc.delete(f'{clocks_uri}{id}')
+            self.assertEqual(status_code, 404)
+            expected = {'message': 'Item not found'}
+            self.assertEqual(expected, rdata)
         return
 
     def test_one(self):
@@ -118,6 +328,10 @@ class TestClockSimulton(unittest.TestCase):
         self.assertEqual(rdata, clocks[theClockId])
         # clock was never started yet
         self.assertEqual(rdata['time'], 0.0)
+        # all the clocks at once
+        (status_code, rdata) = self.restc.get(clocks_uri)
+        self.assertEqual(status_code, 200)
+        self.assertEqual(rdata, clocks)
 
         # pause it
         self.assertTrue(self._service.pause())
@@ -162,6 +376,105 @@ class TestClockSimulton(unittest.TestCase):
         self.del_nonexistent_clock()
         return
 
+    def test_batch(self):
+        '''
+        Create and delete many clocks in one request
+        '''
+        params = [NewClockParams(name=f'batch-{num}').model_dump()
+                  for num in range(300)]
+        (status_code, rdata) = self.restc.create_many(clocks_uri, params)
+        self.assertEqual(status_code, 200)
+        print(f'created {len(params)} clocks in {rdata["elapsed"]:.3f} secs')
+        ids = [item['id'] for item in rdata['items']]
+        self.assertEqual({item['status_code'] for item in rdata['items']},
+                         {201})
+        (status_code, rdata) = self.restc.get(clocks_uri)
+        self.assertEqual([cl['name'] for cl in rdata.values()],
+                         [p['name'] for p in params])
+
+        async def delete_many() -> Tuple[int, Any]:
+            acl = self._service._launcher.get_async_rest_client(False, False)
+            try:
+                return await acl.delete_many(
+                    clocks_uri, ids[:2] + ['foo', 'Clock--1.0'])
+            finally:
+                await acl.close()
+
+        (status_code, rdata) = asyncio.run(delete_many())
+        self.assertEqual(status_code, 200)
+        self.assertEqual(
+            [item['status_code'] for item in rdata['items']],
+            [200, 200, 404, 404])
+        (status_code, rdata) = self.restc.delete_many(clocks_uri, ids)
+        self.assertEqual(
+            [item['status_code'] for item in rdata['items']],
+            [404, 404] + [200] * (len(ids) - 2))
+        (status_code, rdata) = self.restc.get(clocks_uri)
+        self.assertEqual(rdata, {})
+        return
+
+    def test_pages(self):
+        '''
+        Paginated and streamed listings, consumed by the async client
+        '''
+        clocks = self.create_clocks(25)
+
+        async def consume(uri: str, limit: int = 0) -> List[Dict[str, Any]]:
+            acl = self._service._launcher.get_async_rest_client(False, False)
+            try:
+                if limit:
+                    return [obj async for obj in acl.iter_pages(uri, limit)]
+                return [obj async for obj in acl.iter_stream(uri)]
+            finally:
+                await acl.close()
+
+        # in the slots order, the slots of the deleted ones are reused
+        (status_code, rdata) = self.restc.get(clocks_uri)
+        self.assertEqual(set(rdata), set(clocks))
+        objs = asyncio.run(consume(clocks_uri, 7))
+        self.assertEqual([obj['id'] for obj in objs], list(rdata))
+        objs = asyncio.run(consume(f'{clocks_uri}?stream=true'))
+        self.assertEqual([obj['id'] for obj in objs], list(rdata))
+        self.assertEqual(objs[3]['name'], clocks[objs[3]['id']]['name'])
+        # a single page
+        (status_code, rdata) = self.restc.get(f'{clocks_uri}?limit=25')
+        self.assertEqual(status_code, 200)
+        self.assertEqual(set(rdata), set(clocks))
+        (status_code, rdata) = self.restc.get(f'{clocks_uri}?after=foo')
+        self.assertEqual(status_code, 400)
+        for id in clocks:
+            (status_code, rdata) = self.restc.delete(f'{clocks_uri}{id}')
+            self.assertEqual(status_code, 200)
+        return
+
+    def test_feed(self):
+        '''
+        Server-Sent Events of the clocks times to many viewers at once
+        '''
+        clocks = self.create_clocks(5)
+        ids = list(clocks)[:2]
+        uri = f'{feed_uri}?hz=20&count=3&ids={ids[0]}&ids={ids[1]}'
+
+        async def view() -> List[Dict[str, float]]:
+            acl = self._service._launcher.get_async_rest_client(False, False)
+            try:
+                return [data async for data in acl.iter_events(uri)]
+            finally:
+                await acl.close()
+
+        async def view_many() -> List[List[Dict[str, float]]]:
+            return await asyncio.gather(*(view() for _ in range(10)))
+
+        for events in asyncio.run(view_many()):
+            self.assertEqual(len(events), 3)
+            self.assertEqual([set(data) for data in events], [set(ids)] * 3)
+        (status_code, rdata) = self.restc.get(f'{feed_uri}?hz=1000')
+        self.assertEqual(status_code, 400)
+        for id in clocks:
+            (status_code, rdata) = self.restc.delete(f'{clocks_uri}{id}')
+            self.assertEqual(status_code, 200)
+        return
+
     def test_many(self):
         '''
         Test the simulation clocks functionality:
@@ -0,0 +1,119 @@
+'''
+Testing the group dispatch of the hall calls
+'''
+import random
+import time
+import unittest
+
+from simultons import Direction, Elevator
+from simultons.dispatch import GroupController
+from simultons.elevator import ElevatorBank
+
+
+class TestGroupController(unittest.TestCase):
+    '''
+    Verify GroupController functionality
+    '''
+
+    def test_all(self):
+        '''
+        The cheapest elevator gets the call
+        '''
+        bank = ElevatorBank()
+        low = Elevator(None, 'low', 20, current_floor=2, bank=bank)
+        high = Elevator(None, 'high', 20, current_floor=15, bank=bank)
+        short = Elevator(None, 'short', 5, current_floor=4, bank=bank)
+        controller = GroupController.of([low, high, short])
+        # nearest idle one
+        self.assertEqual(controller.assign(12, Direction.UP)[0], high.row)
+        self.assertEqual(high.stops, [12])
+        # short can not get there
+        costs = controller.costs(10, Direction.DOWN)
+        self.assertEqual(costs[2], float('inf'))
+        # the call ahead on the way beats the one behind
+        low.floor_call(10, Direction.UP)
+        low.step()
+        self.assertEqual(low.direction, Direction.UP)
+        (row, cost) = controller.assign(6, Direction.UP)
+        self.assertEqual(row, low.row)
+        self.assertEqual(low.stops, [6, 10])
+        # the call behind costs a detour
+        costs = controller.costs(1, Direction.UP)
+        self.assertGreater(costs[0], costs[2])
+
+        with self.assertRaises(ValueError):
+            controller.assign(30, Direction.UP)
+        with self.assertRaises(ValueError):
+            controller.assign(3, Direction.NONE)
+        with self.assertRaises(ValueError):
+            GroupController.of([]).assign(3, Direction.UP)
+        with self.assertRaises(ValueError):
+            GroupController.of([low, Elevator(None, 'alone', 5)])
+        # the whole bank by default, the down calls go to the down stops
+        (row, cost) = GroupController(bank).assign(3, Direction.DOWN)
+        self.assertEqual(row, short.row)
+        self.assertEqual(short.stops, [3])
+        self.assertEqual(short.next_stop(), 3)
+        return
+
+    def test_up_peak(self):
+        '''
+        Assignment time for a bank of 64 elevators under heavy up-peak
+        traffic: most of the calls are from the lobby going up
+        '''
+        random.seed(5)
+        floors = 60
+        bank = ElevatorBank()
+        cars = [Elevator(None, f'car{i}', floors, bank=bank)
+                for i in range(64)]
+        controller = GroupController(bank)
+        calls = 5000
+        elapsed = 0.0
+        worst = 0.0
+        for num in range(calls):
+            if random.random() < 0.9:
+                (floor, direction) = (0, Direction.UP)
+            else:
+                (floor, direction) = (
+                    random.randrange(1, floors), Direction.DOWN)
+            start = time.perf_counter()
+            controller.assign(floor, direction)
+            took = time.perf_counter() - start
+            elapsed += took
+            worst = max(worst, took)
+            # riders keep pressing the buttons, the cars keep moving
+            if direction == Direction.UP:
+                cars[num % len(cars)].floor_call(random.randrange(1, floors))
+            for car in cars[num % 4::4]:
+                car.step()
+        print(f'{calls} up-peak calls to {len(cars)} cars: avg'
+              f' {elapsed/calls*1e6:.1f} usecs, worst {worst*1e6:.1f} usecs')
+        return
+
+    def test_fleet_size(self):
+        '''
+        Assignment time barely grows with the number of the elevators
+        '''
+        random.seed(7)
+        floors = 100
+        calls = 200
+        for num in (64, 1000, 10000):
+            bank = ElevatorBank(num, floors)
+            cars = [Elevator(None, f'car{i}', floors,
+                             current_floor=random.randrange(floors),
+                             bank=bank)
+                    for i in range(num)]
+            for car in cars[::3]:
+                car.floor_call(random.randrange(floors))
+            bank.step()
+            controller = GroupController(bank)
+            start = time.perf_counter()
+            for _ in range(calls):
+                controller.assign(random.randrange(1, floors), Direction.DOWN)
+            elapsed = (time.perf_counter() - start) / calls
+            print(f'{num} cars: {elapsed*1e3:.3f} msecs per call')
+        return
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,21 @@
+import json
+import os
+import tempfile
+import time
 import unittest
 from fastapi.testclient import TestClient
 
-from simultons import NewElevatorParams, ElevatorResponse
+from simultons import Elevator, NewElevatorParams, ElevatorResponse, \
+    HallCallParams, Direction, ElevatorDelta, next_after_header
+from simultons import elevator
 from simultons.elevator import app
+from simultons.globals import restore_env
 
 elevators_uri = '/api/v1/elevators/'
+dispatch_uri = '/api/v1/elevators:dispatch'
+stream_uri = '/api/v1/elevators/stream'
+checkpoint_uri = '/api/v1/simulton/checkpoint'
+simulton_uri = '/api/v1/simulton'
 
 
 class TestElevatorSimultonWithTestClient(unittest.TestCase):
@@ -59,5 +70,255 @@ class TestElevatorSimultonWithTestClient(unittest.TestCase):
                 print('received:', response.json())
                 print('expected:', expected.model_dump())
                 self.assertEqual(response.json(), expected.model_dump())
+            #
+            # dispatch a hall call
+            #
+            params = HallCallParams(floor=5, direction=Direction.DOWN)
+            response = client.post(dispatch_uri, json=params.model_dump())
+            self.assertEqual(response.status_code, 200)
+            jresp = response.json()
+            print('dispatched:', jresp)
+            self.assertIn(jresp['id'], client.get(elevators_uri).json())
+            self.assertGreater(jresp['cost'], 0)
+            sim = elevator.theElevatorSimulton
+            self.assertIn(5, sim.get_instance_by_id(jresp['id']).stops)
+            # no such floor
+            params = HallCallParams(floor=floors, direction=Direction.DOWN)
+            response = client.post(dispatch_uri, json=params.model_dump())
+            self.assertEqual(response.status_code, 400)
+            #
+            # paginate, stream
+            #
+            everything = client.get(elevators_uri).json()
+            response = client.get(elevators_uri, params={'limit': 2})
+            self.assertEqual(response.status_code, 200)
+            page = response.json()
+            after = response.headers[next_after_header]
+            self.assertEqual(list(page), list(everything)[:2])
+            self.assertEqual(after, list(everything)[1])
+            response = client.get(
+                elevators_uri, params={'limit': 2, 'after': after})
+            self.assertEqual(list(response.json()), list(everything)[2:])
+            self.assertNotIn(next_after_header, response.headers)
+            response = client.get(elevators_uri, params={'stream': True})
+            self.assertEqual(
+                response.headers['content-type'], 'application/x-ndjson')
+            lines = [json.loads(line) for line in response.text.splitlines()]
+            self.assertEqual(lines, list(everything.values()))
+            #
+            # many at once
+            #
+            params = [NewElevatorParams(name=f'batch-{num}', floors=floors)
+                      for num in range(100)]
+            response = client.post(
+                f'{elevators_uri[:-1]}:batch',
+                json=[p.model_dump() for p in params])
+            self.assertEqual(response.status_code, 200)
+            ids = [item['id'] for item in response.json()['items']]
+            self.assertEqual(len(client.get(elevators_uri).json()), 103)
+            response = client.post(
+                f'{elevators_uri[:-1]}:batchDelete', json=ids + ['foo'])
+            self.assertEqual(response.status_code, 200)
+            items = response.json()['items']
+            self.assertEqual([item['status_code'] for item in items],
+                             [200] * len(ids) + [404])
+            self.assertEqual(items[-1]['message'], 'Item not found')
+            self.assertEqual(client.get(elevators_uri).json(), everything)
+            #
+            # the invalid items are reported, the valid ones created
+            #
+            response = client.post(
+                f'{elevators_uri[:-1]}:batch',
+                json=[{'name': 'ok', 'floors': 5},
+                      {'name': 'bad', 'floors': 0}, {'floors': 5}, 'junk'])
+            self.assertEqual(response.status_code, 200)
+            items = response.json()['items']
+            self.assertEqual([item['status_code'] for item in items],
+                             [201, 422, 422, 422])
+            self.assertIsNone(items[1]['id'])
+            self.assertIn('floors', items[1]['message'])
+            self.assertIn('name', items[2]['message'])
+            self.assertEqual(
+                list(client.get(elevators_uri).json()),
+                list(everything) + [items[0]['id']])
+
+        return
+
+    def test_checkpoint(self):
+        '''
+        The elevators are restored from the checkpoint by the next process,
+        100k of them well under a sec
+        '''
+        num = 100000
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'elevators.ckpt')
+            with TestClient(app) as client:
+                sim = elevator.theElevatorSimulton
+                cars = [Elevator(sim, f'car{i}', 10 + i % 100)
+                        for i in range(num)]
+                for car in cars[::7]:
+                    car.floor_call(5)
+                cars[3].press_many([8, 9])
+                sim.bank.step()
+                client.post(f'{elevators_uri[:-1]}:batchDelete',
+                            json=[car.id for car in cars[10:20]])
+                expected = client.get(elevators_uri).json()
+                deltas = {id: el.to_delta()
+                          for id, el in sim.instances.items()}
+                labels = cars[3]._panel.annotated_labels
+                self.assertEqual(labels[8], '*_9_*')
+                response = client.post(checkpoint_uri, json={'path': path})
+                self.assertEqual(response.status_code, 200)
+                jresp = response.json()
+                print('checkpoint:', jresp)
+                self.assertEqual(jresp['instances'], num - 10)
+                response = client.post(
+                    checkpoint_uri, json={'path': f'{tmp}/none/x.ckpt'})
+                self.assertEqual(response.status_code, 400)
 
+            os.environ[restore_env] = path
+            try:
+                with TestClient(app) as client:
+                    sim = elevator.theElevatorSimulton
+                    self.assertEqual(len(sim.instances), num - 10)
+                    # only the one with the panel lit is created
+                    self.assertEqual(len(sim.instances._lazy), num - 11)
+                    # dispatching creates no instances
+                    params = HallCallParams(floor=4, direction=Direction.UP)
+                    response = client.post(
+                        dispatch_uri, json=params.model_dump())
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(len(sim.instances._lazy), num - 11)
+                    el = sim.get_instance_by_id(response.json()['id'])
+                    self.assertIn(4, el.stops)
+                    self.assertNotIn(4, deltas[el.id]['stops'])
+                    deltas[el.id]['stops'] = sorted(
+                        deltas[el.id]['stops'] + [4])
+                    self.assertEqual(
+                        client.get(elevators_uri).json(), expected)
+                    self.assertEqual(
+                        {id: el.to_delta()
+                         for id, el in sim.instances.items()}, deltas)
+                    self.assertEqual(deltas[cars[3].id]['lit'], [8, 9])
+                    # the lit buttons are still disabled
+                    car = sim.get_instance_by_id(cars[3].id)
+                    self.assertEqual(car._panel.annotated_labels, labels)
+                    self.assertFalse(car._panel.press(8))
+                    params = NewElevatorParams(name='new', floors=5)
+                    response = client.post(
+                        elevators_uri, json=params.model_dump())
+                    self.assertNotIn(response.json()['id'], expected)
+                    start = time.time()
+                    sim.restore(path)
+                    elapsed = time.time() - start
+                    print(f'restored {num - 10} elevators in {elapsed} secs')
+            finally:
+                os.environ.pop(restore_env, None)
+        return
+
+    def test_running(self):
+        '''
+        The elevators move while the simulton is running, stand still while
+        paused
+        '''
+        with TestClient(app) as client:
+            sim = elevator.theElevatorSimulton
+            response = client.post(
+                elevators_uri, json={'name': 'car', 'floors': 10})
+            id = response.json()['id']
+            params = HallCallParams(floor=6, direction=Direction.DOWN)
+            response = client.post(dispatch_uri, json=params.model_dump())
+            self.assertEqual(response.json()['id'], id)
+            el = sim.get_instance_by_id(id)
+            # one step per simulated sec, 50 simulated secs per sec
+            response = client.put(simulton_uri, json={
+                'state': 'RUNNING', 'rate': 50.0, 'pacing': 'WALL_CLOCK'})
+            self.assertEqual(response.status_code, 202)
+            deadline = time.time() + 5
+            while el.current_floor != 6 and time.time() < deadline:
+                time.sleep(0.02)
+            self.assertEqual(el.current_floor, 6)
+            # the stop is served, the doors open
+            while el.stops and time.time() < deadline:
+                time.sleep(0.02)
+            self.assertEqual(el.stops, [])
+            response = client.put(simulton_uri, json={'state': 'PAUSED'})
+            self.assertEqual(response.status_code, 202)
+            el.floor_call(1)
+            time.sleep(0.2)
+            self.assertEqual(el.stops, [1])
+            self.assertEqual(el.current_floor, 6)
+        return
+
+    def test_stream(self):
+        '''
+        The changes of the elevators subscribed to are pushed
+        '''
+        with TestClient(app) as client:
+            params = [NewElevatorParams(name=f'car{num}', floors=10)
+                      for num in range(3)]
+            response = client.post(
+                f'{elevators_uri[:-1]}:batch',
+                json=[p.model_dump() for p in params])
+            ids = [item['id'] for item in response.json()['items']]
+            sim = elevator.theElevatorSimulton
+            with client.websocket_connect(
+                    stream_uri, params={'ids': ids[:2]}) as ws:
+                # the current state first
+                deltas = ws.receive_json()
+                self.assertEqual({d['id'] for d in deltas}, set(ids[:2]))
+                self.assertEqual(deltas[0]['state'], 'IDLE')
+                # the car starts going
+                el = sim.get_instance_by_id(ids[1])
+                el.press(4)
+                sim.bank.step()
+                for _ in range(3):
+                    (delta,) = ws.receive_json()
+                    self.assertEqual(delta['id'], ids[1])
+                    if delta['state'] == 'GOING':
+                        break
+                self.assertEqual(ElevatorDelta(**delta), ElevatorDelta(
+                    id=ids[1], floor=0, state='GOING', direction='UP',
+                    doors_open=False, stops=[4], lit=[4]))
+                # another subscription
+                ws.send_json({'ids': [ids[2]]})
+                (delta,) = ws.receive_json()
+                self.assertEqual(delta['id'], ids[2])
+                ws.send_text('{"ids": 5}')
+                self.assertIn('Bummer', ws.receive_json()['message'])
+                client.delete(f'{elevators_uri}{ids[2]}')
+                (delta,) = ws.receive_json()
+                self.assertEqual(delta['id'], ids[2])
+                self.assertTrue(delta['deleted'])
+        return
+
+    def test_stream_deleted(self):
+        '''
+        The elevators deleted are pushed flagged as such
+        '''
+        with TestClient(app) as client:
+            params = [NewElevatorParams(name=f'car{num}', floors=10)
+                      for num in range(4)]
+            response = client.post(
+                f'{elevators_uri[:-1]}:batch',
+                json=[p.model_dump() for p in params])
+            ids = [item['id'] for item in response.json()['items']]
+            sim = elevator.theElevatorSimulton
+            with client.websocket_connect(stream_uri) as ws:
+                deltas = ws.receive_json()
+                self.assertEqual({d['id'] for d in deltas}, set(ids))
+                response = client.post(
+                    f'{elevators_uri[:-1]}:batchDelete', json=ids[:2])
+                self.assertEqual(response.status_code, 200)
+                deltas = ws.receive_json()
+                self.assertEqual([d['id'] for d in deltas], ids[:2])
+                self.assertTrue(all(d['deleted'] for d in deltas))
+                # the rows freed are reused, the new one is pushed
+                response = client.post(elevators_uri, json=NewElevatorParams(
+                    name='car4', floors=10).model_dump())
+                id = response.json()['id']
+                self.assertIn(sim.get_instance_by_id(id).row, (0, 1))
+                (delta,) = ws.receive_json()
+                self.assertEqual(delta['id'], id)
+                self.assertFalse(delta['deleted'])
         return
@@ -1,9 +1,16 @@
 '''
 Testing the elevator-related stuff
 '''
+import random
+import time
+from typing import List
 import unittest
 
-from simultons import Elevator
+import numpy as np
+
+from simultons import Elevator, ElevatorDelta
+from simultons.elevator import BankWatcher, Direction, ElevatorBank, \
+    ElevatorState, lowest_floor, highest_floor
 
 
 class TestElevator(unittest.TestCase):
@@ -25,3 +32,281 @@ class TestElevator(unittest.TestCase):
         '''
         print(self.el)
         return
+
+    def run_until_idle(self, el: Elevator) -> List[int]:
+        '''
+        Step the elevator until it is idle, returns the floors it opened
+        the doors on
+        '''
+        opened: List[int] = []
+        for _ in range(1000):
+            estate = el.step()
+            if estate == ElevatorState.DOORS_OPENED:
+                opened.append(el.current_floor)
+            elif estate == ElevatorState.IDLE:
+                return opened
+        self.fail(f'{el} is not idle')
+        return opened
+
+    def test_bits(self):
+        '''
+        Bit tricks
+        '''
+        mask = 1 << 3 | 1 << 7 | 1 << 300
+        self.assertEqual(lowest_floor(mask), 3)
+        self.assertEqual(highest_floor(mask), 300)
+        self.assertEqual(lowest_floor(1), 0)
+        return
+
+    def test_look(self):
+        '''
+        The elevator keeps going in its direction while there are stops
+        ahead, then reverses
+        '''
+        el = Elevator(None, 'look', 10, current_floor=4)
+        self.assertIsNone(el.next_stop())
+        self.assertEqual(el.step(), ElevatorState.IDLE)
+        # going up first
+        el.press(6)
+        el.floor_call(2, Direction.UP)
+        el.floor_call(8, Direction.DOWN)
+        el.floor_call(1)
+        self.assertEqual(el._panel.annotated_labels[6], '*_7_*')
+        self.assertEqual(el.next_stop(), 6)
+        self.assertEqual(el.step(), ElevatorState.GOING)
+        self.assertEqual(el.direction, Direction.UP)
+        # the up call on 2 is served going up, after reversing on 1
+        self.assertEqual(self.run_until_idle(el), [6, 8, 1, 2])
+        self.assertEqual(el.stops, [])
+        self.assertEqual(el.direction, Direction.NONE)
+        # the button LED is off once the floor is reached
+        self.assertEqual(el._panel.annotated_labels[6], '7')
+        return
+
+    def test_hall_calls(self):
+        '''
+        Hall calls going the other way are served on the way back
+        '''
+        el = Elevator(None, 'calls', 10, current_floor=0)
+        el.floor_call(5, Direction.DOWN)
+        el.floor_call(3, Direction.UP)
+        el.floor_call(7, Direction.DOWN)
+        self.assertEqual(self.run_until_idle(el), [3, 7, 5])
+        # a call on the current floor opens the doors
+        el.floor_call(5)
+        self.assertEqual(self.run_until_idle(el), [5])
+        return
+
+    def test_doors(self):
+        '''
+        Open and close doors buttons
+        '''
+        el = Elevator(None, 'doors', 3)
+        floors = el.floors
+        el.press(floors)
+        self.assertEqual(el.estate, ElevatorState.DOORS_OPENING)
+        self.assertEqual(el.step(), ElevatorState.DOORS_OPENED)
+        el.press(floors + 1)
+        self.assertEqual(el.estate, ElevatorState.DOORS_CLOSING)
+        # reopen while closing
+        el.press(floors)
+        self.assertEqual(el.estate, ElevatorState.DOORS_OPENING)
+        self.assertEqual(self.run_until_idle(el), [0])
+        return
+
+    def test_press_many(self):
+        '''
+        Buttons pressed within one tick are handled at once
+        '''
+        el = Elevator(None, 'many', 200)
+        el.press_many(range(199, 0, -2))
+        self.assertEqual(el.stops, list(range(1, 200, 2)))
+        self.assertEqual(el._panel.leds_count, 100)
+        el.press_many([el.floors])
+        self.assertEqual(el.estate, ElevatorState.DOORS_OPENING)
+        self.assertEqual(el._panel.leds_count, 100)
+        return
+
+    def test_benchmark(self):
+        '''
+        Stop scheduling calls per second in a tall tower with many cars
+        '''
+        random.seed(11)
+        floors = 500
+        cars = [Elevator(None, f'car{i}', floors) for i in range(2000)]
+        calls = [
+            (random.randrange(len(cars)), random.randrange(floors),
+             random.choice((Direction.UP, Direction.DOWN)))
+            for _ in range(100000)
+        ]
+        start = time.time()
+        for car, floor, direction in calls:
+            cars[car].floor_call(floor, direction)
+        elapsed = time.time() - start
+        print(f'floor_call: {len(calls)/elapsed:.0f} calls/sec')
+
+        start = time.time()
+        for car in cars:
+            car.next_stop()
+        elapsed = time.time() - start
+        print(f'next_stop: {len(cars)/elapsed:.0f} calls/sec')
+
+        steps = 0
+        start = time.time()
+        for _ in range(20):
+            for car in cars:
+                car.step()
+                steps += 1
+        elapsed = time.time() - start
+        print(f'step: {steps/elapsed:.0f} calls/sec')
+        self.assertGreater(steps / elapsed, 10000)
+        return
+
+
+class TestElevatorBank(unittest.TestCase):
+    '''
+    Verify ElevatorBank functionality
+    '''
+
+    def test_all(self):
+        '''
+        The vectorized step moves the elevators exactly as their own step
+        '''
+        random.seed(13)
+        floors = 150
+        bank = ElevatorBank(4)
+        cars = [Elevator(None, f'car{i}', floors, bank=bank)
+                for i in range(50)]
+        twins = [Elevator(None, f'twin{i}', floors) for i in range(50)]
+        self.assertEqual(len(bank), 50)
+        self.assertEqual(bank.words, 3)
+        for _ in range(200):
+            for _ in range(5):
+                i = random.randrange(len(cars))
+                floor = random.randrange(floors)
+                direction = random.choice(list(Direction))
+                cars[i].floor_call(floor, direction)
+                twins[i].floor_call(floor, direction)
+            bank.step()
+            for car, twin in zip(cars, twins):
+                twin.step()
+                self.assertEqual(
+                    (car.estate, car.current_floor, car.direction,
+                     car.stops_mask),
+                    (twin.estate, twin.current_floor, twin.direction,
+                     twin.stops_mask))
+        # the rows are reused
+        row = cars[7].row
+        bank.remove(row)
+        self.assertEqual(Elevator(None, 'new', 5, bank=bank).row, row)
+        self.assertEqual(len(bank), 50)
+        return
+
+    def test_stop_just_above(self):
+        '''
+        A stop one floor above is not below: going down, the car keeps
+        going down
+        '''
+        bank = ElevatorBank(2)
+        car = Elevator(None, 'car', 20, current_floor=18, bank=bank)
+        twin = Elevator(None, 'twin', 20, current_floor=18)
+        for el in (car, twin):
+            el.floor_call(3, Direction.DOWN)
+            el.floor_call(19, Direction.DOWN)
+            el._direction = Direction.DOWN
+            el._estate = ElevatorState.GOING
+        (above, below) = bank.floor_bits(np.array([0, 5, 63]))
+        self.assertEqual(below[:, 0].tolist(), [1, 0x3f, 2**64 - 1])
+        self.assertEqual(above[:, 0].tolist(), [2**64 - 1, 2**64 - 32, 2**63])
+        for _ in range(40):
+            bank.step()
+            twin.step()
+            self.assertEqual(
+                (car.estate, car.current_floor, car.direction),
+                (twin.estate, twin.current_floor, twin.direction))
+        return
+
+    def test_dense(self):
+        '''
+        Many calls on few floors: the vectorized step still moves the
+        elevators exactly as their own step
+        '''
+        random.seed(19)
+        for floors in (20, 150):
+            bank = ElevatorBank(4)
+            cars = [Elevator(None, f'car{i}', floors, bank=bank)
+                    for i in range(200)]
+            twins = [Elevator(None, f'twin{i}', floors) for i in range(200)]
+            for _ in range(300):
+                for _ in range(50):
+                    i = random.randrange(len(cars))
+                    floor = random.randrange(floors)
+                    direction = random.choice(list(Direction))
+                    cars[i].floor_call(floor, direction)
+                    twins[i].floor_call(floor, direction)
+                bank.step()
+                for car, twin in zip(cars, twins):
+                    twin.step()
+                    self.assertEqual(
+                        (car.estate, car.current_floor, car.direction,
+                         car.stops_mask),
+                        (twin.estate, twin.current_floor, twin.direction,
+                         twin.stops_mask))
+        return
+
+    def test_watcher(self):
+        '''
+        Only the elevators changed since the last look are found
+        '''
+        bank = ElevatorBank(4)
+        cars = [Elevator(None, f'car{i}', 10, bank=bank) for i in range(6)]
+        watcher = BankWatcher(bank)
+        # all of them are new
+        self.assertEqual(watcher.changed_rows().tolist(), list(range(6)))
+        self.assertEqual(watcher.changed_rows().tolist(), [])
+        cars[1].floor_call(3)
+        cars[4].press(5)
+        self.assertEqual(watcher.changed_rows().tolist(), [1, 4])
+        bank.step()
+        self.assertEqual(watcher.changed_rows().tolist(), [1, 4])
+        # the lit button alone is a change
+        cars[2].floor_call(6)
+        watcher.changed_rows()
+        cars[2].press(6)
+        self.assertEqual(watcher.changed_rows().tolist(), [2])
+        delta = cars[2].to_delta()
+        self.assertEqual(ElevatorDelta(**delta).model_dump(), delta)
+        self.assertEqual(delta['lit'], [6])
+        # a reused row is a change, a removed one is not
+        row = cars[0].row
+        bank.remove(cars[3].row)
+        bank.remove(row)
+        watcher.forget(Elevator(None, 'new', 5, bank=bank).row)
+        self.assertEqual(watcher.changed_rows().tolist(), [row])
+        return
+
+    def test_benchmark(self):
+        '''
+        Step a 100k elevators simulation
+        '''
+        rng = np.random.default_rng(17)
+        num = 100000
+        floors = 64
+        bank = ElevatorBank(num, floors)
+        for _ in range(num):
+            bank.add(floors)
+        rows = rng.integers(0, num, size=num)
+        bits = rng.integers(0, floors, size=num).astype(np.uint64)
+        bank._up[rows, 0] |= np.uint64(1) << bits
+        steps = 50
+        start = time.time()
+        for _ in range(steps):
+            bank.step()
+        elapsed = time.time() - start
+        print(f'{num} elevators: {steps*num/elapsed:.0f} car steps/sec')
+        self.assertLess(elapsed / steps, 1.0)
+        return
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+'''
+Testing the discrete-event engine
+'''
+import asyncio
+import random
+import time
+from typing import List
+import unittest
+
+from simultons import Engine, Pacing
+
+# simulated day in secs
+day = 24 * 60 * 60
+
+
+class TestEngine(unittest.TestCase):
+    '''
+    Verify Engine functionality
+    '''
+
+    def test_order(self):
+        '''
+        Events are processed in the time order, FIFO for the same time,
+        the virtual clock jumps to the event being processed
+        '''
+        engine = Engine()
+        seen: List[tuple] = []
+
+        def record(tag: str) -> None:
+            seen.append((engine.now, tag))
+            return
+
+        engine.schedule(5, record, 'c')
+        engine.schedule(1, record, 'a')
+        engine.schedule(5, record, 'd')
+        cancelled = engine.schedule(3, record, 'x')
+        engine.schedule_in(2, record, 'b')
+        engine.cancel(cancelled)
+        self.assertTrue(cancelled.cancelled)
+        self.assertEqual(engine.next_time(), 1)
+
+        self.assertEqual(engine.run_until(4), 2)
+        self.assertEqual(engine.now, 4)
+        self.assertEqual(engine.run_until(10), 2)
+        self.assertEqual(engine.now, 10)
+        self.assertEqual(
+            seen, [(1, 'a'), (2, 'b'), (5, 'c'), (5, 'd')])
+        self.assertIsNone(engine.next_time())
+        self.assertFalse(engine.step())
+        # the past is now
+        engine.schedule(3, record, 'e')
+        self.assertTrue(engine.step())
+        self.assertEqual(seen[-1], (10, 'e'))
+        self.assertEqual(engine.processed, 5)
+        return
+
+    def test_wall_clock(self):
+        '''
+        With WALL_CLOCK pacing the virtual time advances at rate times the
+        wall clock, the events are processed when their time comes
+        '''
+        async def run():
+            engine = Engine()
+            rate = 100
+            duration = 0.3
+            fired: List[float] = []
+            for t in range(1, 11):
+                engine.schedule(t, lambda: fired.append(time.monotonic()))
+            start = time.monotonic()
+            engine.start(rate)
+            await asyncio.sleep(duration)
+            engine.pause()
+            elapsed = time.monotonic() - start
+            now = engine.now
+            print(f'Virtual {now:.3f} secs in {elapsed:.3f} secs')
+            self.assertGreater(now, duration * rate * 0.5)
+            self.assertLessEqual(now, elapsed * rate)
+            # the events were not processed ahead of their time
+            self.assertEqual(len(fired), 10)
+            for t, at in enumerate(fired, start=1):
+                self.assertGreaterEqual(at - start, t / rate * 0.99)
+            # paused, the clock stands still
+            await asyncio.sleep(0.05)
+            self.assertEqual(engine.now, now)
+            return
+
+        asyncio.run(run())
+        return
+
+    def test_simulated_day(self):
+        '''
+        A simulated day of elevator traffic as fast as possible.
+        Riders arrive at random, call the elevator, ride and leave.
+        '''
+        async def run() -> int:
+            random.seed(7)
+            engine = Engine(Pacing.AS_FAST_AS_POSSIBLE)
+            floors = 20
+            done = asyncio.get_running_loop().create_future()
+            trips: List[int] = [0]
+
+            def arrive() -> None:
+                floor = random.randrange(floors)
+                # wait for the elevator
+                engine.schedule_in(random.uniform(5, 60), board, floor)
+                # the next rider
+                engine.schedule_in(random.expovariate(1 / 2), arrive)
+                return
+
+            def board(floor: int) -> None:
+                to = random.randrange(floors)
+                engine.schedule_in(3 + 2 * abs(to - floor), leave)
+                return
+
+            def leave() -> None:
+                trips[0] += 1
+                return
+
+            engine.schedule(0, arrive)
+            engine.schedule(day, lambda: done.set_result(engine.now))
+            engine.start()
+            await done
+            engine.pause()
+            return trips[0]
+
+        start = time.time()
+        trips = asyncio.run(run())
+        elapsed = time.time() - start
+        print(f'Simulated day of {trips} trips in {elapsed:.3f} secs')
+        self.assertGreater(trips, 40000)
+        self.assertLess(elapsed, 10)
+        return
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+'''
+Testing FastAPI process launcher
+'''
+import asyncio
+import os
+import signal
+import time
+import unittest
+
+from simultons import FastLauncher, shutdown_launchers
+
+simulton_uri = '/api/v1/simulton'
+
+
+class TestFastLauncher(unittest.TestCase):
+    '''
+    Verify FastLauncher functionality
+    '''
+
+    def test_announced(self):
+        '''
+        The simulton announces its readiness, no polling is needed
+        '''
+        launcher = FastLauncher('simultons/clock.py', 9000)
+        self.assertTrue(launcher.launch())
+        jresp = launcher.wait_until_reachable(simulton_uri, 5)
+        assert jresp is not None
+        self.assertEqual(jresp['port'], 9000)
+        self.assertEqual(jresp['title'], 'Clock')
+        self.assertEqual(jresp['state'], 'PAUSED')
+        # the announcement is what the health uri produces
+        (status_code, rdata) = launcher._restc.get(simulton_uri)
+        self.assertEqual(status_code, 200)
+        self.assertEqual(rdata, jresp)
+        self.assertTrue(launcher.shutdown(timeout=3))
+        return
+
+    def test_async_announced(self):
+        '''
+        Awaiting the announcement does not upset the event loop
+        '''
+        launcher = FastLauncher('simultons/clock.py', 9000)
+        self.assertTrue(launcher.launch())
+        self.addCleanup(launcher.shutdown, timeout=3)
+        errors = []
+
+        async def wait():
+            loop = asyncio.get_running_loop()
+            loop.set_exception_handler(
+                lambda loop, context: errors.append(context))
+            jresp = await launcher.async_wait_until_reachable(
+                simulton_uri, 5)
+            # let any late callback run
+            await asyncio.sleep(0.1)
+            return jresp
+
+        jresp = asyncio.run(wait())
+        assert jresp is not None
+        self.assertEqual(jresp['port'], 9000)
+        self.assertEqual(errors, [])
+        return
+
+    def test_terminated(self):
+        '''
+        The death of the process is noticed right away
+        '''
+        launcher = FastLauncher('simultons/no-such-simulton.py', 9000)
+        self.assertTrue(launcher.launch())
+        start = time.time()
+        jresp = launcher.wait_until_reachable(simulton_uri, 5)
+        self.assertIsNone(jresp)
+        self.assertLess(time.time() - start, 5)
+        launcher.shutdown(timeout=1)
+        return
+
+    def test_shutdown_launchers(self):
+        '''
+        All the processes are shut concurrently, the one which does not
+        respond to SIGINT is killed at the deadline
+        '''
+        launchers = [
+            FastLauncher('simultons/clock.py', port)
+            for port in range(9000, 9004)
+        ]
+        for launcher in launchers:
+            self.assertTrue(launcher.launch())
+        for launcher in launchers:
+            self.assertIsNotNone(
+                launcher.wait_until_reachable(simulton_uri, 10))
+        # this one will not be able to handle SIGINT
+        stopped = launchers[0]
+        assert stopped.pid is not None
+        os.kill(stopped.pid, signal.SIGSTOP)
+
+        deadline = 2.0
+        start = time.time()
+        exits = asyncio.run(shutdown_launchers(launchers, deadline))
+        elapsed = time.time() - start
+        print(f'Shut {len(launchers)} processes in {elapsed:.3f} secs:',
+              exits)
+        self.assertLess(elapsed, deadline + 1)
+        self.assertEqual([e.port for e in exits],
+                         [launcher.port for launcher in launchers])
+        self.assertTrue(exits[0].killed)
+        self.assertEqual(exits[0].returncode, -signal.SIGKILL)
+        for e in exits[1:]:
+            self.assertFalse(e.killed)
+            self.assertLess(e.elapsed, deadline)
+        return
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+'''
+Testing the fast serialization path
+'''
+import json
+import time
+from typing import Dict
+import unittest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import numpy as np
+
+from simultons import ElevatorResponse, FastJSONResponse, NewElevatorParams
+from simultons import elevator
+from simultons.fastjson import dumps, dumps_lines
+
+elevators_uri = '/api/v1/elevators/'
+
+
+class TestFastJSON(unittest.TestCase):
+    '''
+    Verify the fast serialization path
+    '''
+
+    def test_all(self):
+        '''
+        Same JSON as the standard one
+        '''
+        content = {'id': 'Elevator-0.0', 'floors': 10, 'time': np.float64(1.5),
+                   'state': elevator.ElevatorState.IDLE}
+        self.assertEqual(
+            json.loads(dumps(content)), {
+                'id': 'Elevator-0.0', 'floors': 10, 'time': 1.5,
+                'state': 'IDLE'})
+        self.assertEqual(dumps_lines([{'a': 1}, {'b': 2}]),
+                         b'{"a":1}\n{"b":2}\n')
+        self.assertEqual(dumps_lines([]), b'')
+        response = FastJSONResponse(content={'a': [1, 2]}, status_code=201)
+        self.assertEqual(response.body, b'{"a":[1,2]}')
+        self.assertEqual(response.status_code, 201)
+        return
+
+    def test_benchmark(self):
+        '''
+        Listing responses per sec, the validating path - as it used to be -
+        vs the fast one
+        '''
+        num = 10000
+        legacy = FastAPI()
+
+        @legacy.get(elevators_uri, response_model=Dict[str, ElevatorResponse])
+        async def get_instances():
+            return {
+                id: el.to_response().model_dump()
+                for id, el in elevator.theElevatorSimulton.instances.items()
+            }
+
+        with TestClient(elevator.app) as client, \
+                TestClient(legacy) as legacy_client:
+            params = [
+                NewElevatorParams(name=f'car{i}', floors=50).model_dump()
+                for i in range(num)
+            ]
+            response = client.post(
+                f'{elevators_uri[:-1]}:batch', json=params)
+            self.assertEqual(response.status_code, 200)
+            rps = {}
+            for name, cl in (('validating', legacy_client), ('fast', client)):
+                requests = 10
+                start = time.time()
+                for _ in range(requests):
+                    response = cl.get(elevators_uri)
+                    self.assertEqual(response.status_code, 200)
+                rps[name] = requests / (time.time() - start)
+                print(f'{name}: {rps[name]:.1f} listings of {num} elevators'
+                      ' per sec')
+                self.assertEqual(len(response.json()), num)
+            self.assertEqual(
+                legacy_client.get(elevators_uri).json(),
+                client.get(elevators_uri).json())
+        self.assertGreater(rps['fast'], rps['validating'])
+        return
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+'''
+Testing the log pump
+'''
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+from simultons.log_pump import LogPump, LogRing
+
+# way more than the pipe buffer can hold
+chatty_lines = 100000
+chatty = f'for i in range({chatty_lines}): print("line", i)'
+
+
+class TestLogRing(unittest.TestCase):
+    '''
+    Verify LogRing functionality
+    '''
+
+    def test_all(self):
+        '''
+        The ring keeps the most recent lines, subscribers get the new ones
+        '''
+        async def run():
+            ring = LogRing(3)
+            for i in range(5):
+                ring.append(str(i))
+            self.assertEqual(ring.tail(), ['2', '3', '4'])
+            self.assertEqual(ring.tail(2), ['3', '4'])
+            self.assertEqual(ring.tail(0), [])
+            q = ring.subscribe()
+            ring.append('5')
+            ring.close()
+            self.assertEqual(await q.get(), '5')
+            self.assertIsNone(await q.get())
+            self.assertTrue(ring.closed)
+            return
+
+        asyncio.run(run())
+        return
+
+
+class TestLogPump(unittest.TestCase):
+    '''
+    Verify LogPump functionality
+    '''
+
+    def test_chatty(self):
+        '''
+        A process which prints a lot does not stall
+        '''
+        async def run(spill_dir: str) -> None:
+            pump = LogPump(maxlen=10, spill_dir=spill_dir)
+            popen = subprocess.Popen(
+                [sys.executable, '-c', chatty],
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            ring = pump.attach(1, [popen.stdout, popen.stderr])
+            start = time.time()
+            while popen.poll() is None:
+                self.assertLess(time.time() - start, 10)
+                await asyncio.sleep(0.01)
+            print(f'{chatty_lines} lines pumped in'
+                  f' {time.time() - start:.3f} secs')
+            pump.detach(1)
+            self.assertTrue(ring.closed)
+            self.assertEqual(
+                ring.tail(2),
+                [f'line {chatty_lines-2}', f'line {chatty_lines-1}'])
+            pump.close()
+            return
+
+        with tempfile.TemporaryDirectory() as spill_dir:
+            asyncio.run(run(spill_dir))
+            with open(os.path.join(spill_dir, 'simulton-1.log')) as f:
+                lines = f.readlines()
+            self.assertEqual(len(lines), chatty_lines)
+        return
+
+
+if __name__ == '__main__':
+    unittest.main()
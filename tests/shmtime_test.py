@@ -0,0 +1,103 @@
+'''
+Testing the simulated time shared via the memory-mapped segment
+'''
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from simultons import SimulationState
+from simultons.shmtime import SharedTime, SharedTimeReader, \
+    SharedTimeWriter
+
+
+class TestSharedTime(unittest.TestCase):
+    '''
+    Verify SharedTimeWriter and SharedTimeReader functionality
+    '''
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self._path = os.path.join(self._dir.name, 'sss.time')
+        self.writer = SharedTimeWriter(self._path)
+        self.reader = SharedTimeReader(self._path)
+        return
+
+    def tearDown(self):
+        self.reader.close()
+        self.writer.close()
+        self.assertFalse(os.path.exists(self._path))
+        self._dir.cleanup()
+        return
+
+    def test_all(self):
+        '''
+        The reader follows the anchors published by the writer
+        '''
+        anchor = self.reader.read()
+        self.assertEqual(anchor.state, SimulationState.INIT)
+        self.assertEqual(self.reader.now_ns(), 0)
+
+        rate = 1000
+        self.writer.publish(SimulationState.RUNNING, rate)
+        duration = 0.1
+        time.sleep(duration)
+        now = self.reader.time()
+        print(f'Slept for {duration} secs at {rate}: {now:.3f} secs')
+        self.assertGreaterEqual(now, duration * rate)
+        self.assertLess(now, duration * rate * 2)
+
+        anchor = self.writer.publish(SimulationState.PAUSED, 0)
+        self.assertEqual(self.reader.read(), anchor)
+        self.assertGreaterEqual(anchor.sim_ns, now * 1e9)
+        time.sleep(0.01)
+        self.assertEqual(self.reader.now_ns(), anchor.sim_ns)
+
+        # lockstep ticks
+        self.writer.advance(5 * 10**9)
+        self.assertEqual(self.reader.now_ns(), anchor.sim_ns + 5 * 10**9)
+        return
+
+    def test_precision(self):
+        '''
+        No precision is lost at a high rate over a long run
+        '''
+        # simulated century in ns
+        century = 100 * 365 * 24 * 60 * 60 * 10**9
+        anchor = SharedTime(0, century, 10**6, SimulationState.RUNNING)
+        self.writer.write(anchor)
+        self.assertEqual(self.reader.read().now_ns(1), century + 10**6)
+        return
+
+    def test_torn(self):
+        '''
+        A reader never sees a half written anchor
+        '''
+        done = threading.Event()
+
+        def write() -> None:
+            k = 0
+            while not done.is_set():
+                k += 1
+                self.writer.write(
+                    SharedTime(k, 2 * k, float(k), SimulationState.RUNNING))
+            return
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        reads = 0
+        start = time.time()
+        while time.time() - start < 0.3:
+            anchor = self.reader.read()
+            self.assertEqual(anchor.sim_ns, 2 * anchor.wall_ns)
+            self.assertEqual(anchor.rate, anchor.wall_ns)
+            reads += 1
+        done.set()
+        writer.join()
+        print(f'{reads} consistent reads, {self.reader.retries} retries')
+        return
+
+
+if __name__ == '__main__':
+    unittest.main()
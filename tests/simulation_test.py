@@ -1,16 +1,25 @@
 '''
 Testing the simulation stuff
 '''
+import asyncio
+import json
+import os
+import tempfile
 import time
 from typing import Dict
 import unittest
 import httpx
 
 from simultons import wait_until_reachable, FastLauncher, \
-    SimulationState, SimulationRequest, NewSimultonParams, SimultonResponse
+    SimulationState, SimulationRequest, NewSimultonParams, SimultonResponse, \
+    BatchSimultonParams, NewSimultonsBatchParams, SimulationStepParams
 
 simulation_uri = '/api/v1/simulation'
 simultons_uri = '/api/v1/simultons'
+simultons_batch_uri = '/api/v1/simultons:batch'
+simulation_step_uri = '/api/v1/simulation:step'
+simulation_snapshot_uri = '/api/v1/simulation:snapshot'
+simulation_restore_uri = '/api/v1/simulation:restore'
 
 
 class TestSimulation(unittest.TestCase):
@@ -50,7 +59,7 @@ class TestSimulation(unittest.TestCase):
         if not res:
             self._service.shutdown()
             assert False
-        expected = {'state': 'PAUSED', 'rate': 0.0}
+        expected = {'state': 'PAUSED', 'rate': 0.0, 'pacing': 'WALL_CLOCK'}
         self.assertEqual(res, expected)
         #
         #
@@ -58,7 +67,10 @@ class TestSimulation(unittest.TestCase):
         #
         verbose = True
         dumpHeaders = False
-        self.restc = self._service.get_rest_client(verbose, dumpHeaders)
+        # longer than the batches, snapshots and restores can take
+        timeout = 60.0
+        self.restc = self._service.get_rest_client(
+            verbose, dumpHeaders, timeout)
         return
 
     def tearDown(self):
@@ -89,7 +101,7 @@ class TestSimulation(unittest.TestCase):
         assert self.restc is not None
         (status_code, rdata) = self.restc.get(simulation_uri)
         self.assertTrue(status_code, 200)
-        expected = {'state': 'PAUSED', 'rate': 0}
+        expected = {'state': 'PAUSED', 'rate': 0, 'pacing': 'WALL_CLOCK'}
         self.assertEqual(rdata, expected)
         return
 
@@ -124,7 +136,7 @@ class TestSimulation(unittest.TestCase):
         assert self.restc is not None
         (status_code, rdata) = self.restc.get(simulation_uri)
         self.assertTrue(status_code, 200)
-        expected = {'state': 'PAUSED', 'rate': 0}
+        expected = {'state': 'PAUSED', 'rate': 0, 'pacing': 'WALL_CLOCK'}
         self.assertEqual(rdata, expected)
         (status_code, rdata) = self.restc.get(simultons_uri)
         self.assertTrue(status_code, 200)
@@ -142,6 +154,313 @@ class TestSimulation(unittest.TestCase):
             print('Clocks:', res)
         return
 
+    def test_batch_simultons(self) -> None:
+        '''
+        Launch a batch of simultons with dependencies
+
+        To run this test alone:
+        python3 -m unittest -k test_batch_simultons tests/simulation_test.py
+        '''
+        assert self.restc is not None
+        clock = 'simultons/clock.py'
+        elevator = 'simultons/elevator.py'
+        #
+        # a cycle is rejected
+        #
+        params = NewSimultonsBatchParams(simultons=[
+            BatchSimultonParams(src_path=clock, name='a', depends_on=['b']),
+            BatchSimultonParams(src_path=clock, name='b', depends_on=['a']),
+        ])
+        (status_code, rdata) = self.restc.post(
+            simultons_batch_uri, params.model_dump())
+        self.assertEqual(status_code, 400)
+        #
+        # clock1 and elevator depend on clock0
+        #
+        params = NewSimultonsBatchParams(simultons=[
+            BatchSimultonParams(
+                src_path=clock, name='clock1', depends_on=['clock0']),
+            BatchSimultonParams(
+                src_path=elevator, depends_on=['clock0']),
+            BatchSimultonParams(src_path=clock, name='clock0'),
+        ])
+        start = time.time()
+        (status_code, rdata) = self.restc.post(
+            simultons_batch_uri, params.model_dump())
+        print(f'Launched a batch of simultons in {time.time()-start} secs')
+        self.assertEqual(status_code, 201)
+        levels = {res['name']: res['level'] for res in rdata['simultons']}
+        expected = {'clock0': 0, 'clock1': 1, elevator: 1}
+        self.assertEqual(levels, expected)
+        for res in rdata['simultons']:
+            self.assertIsNone(res['message'])
+            self.assertGreater(res['latency'], 0)
+            self.assertEqual(res['simulton']['state'], 'PAUSED')
+
+        (status_code, rdata) = self.restc.get(simultons_uri)
+        self.assertEqual(status_code, 200)
+        self.assertEqual(len(rdata), 3)
+        #
+        # the simultons output is available
+        #
+        for port in rdata:
+            (status_code, logs) = self.restc.get(
+                f'{simultons_uri}/{port}/logs?tail=5')
+            self.assertEqual(status_code, 200)
+            self.assertTrue(0 < len(logs) <= 5)
+        (status_code, logs) = self.restc.get(f'{simultons_uri}/1/logs')
+        self.assertEqual(status_code, 404)
+        return
+
+    def test_fan_out(self) -> None:
+        '''
+        State and rate changes are sent to all the simultons concurrently
+
+        To run this test alone:
+        python3 -m unittest -k test_fan_out tests/simulation_test.py
+        '''
+        assert self.restc is not None
+        clock = 'simultons/clock.py'
+        params = NewSimultonsBatchParams(simultons=[
+            BatchSimultonParams(src_path=clock, name=f'clock{i}')
+            for i in range(3)
+        ])
+        (status_code, rdata) = self.restc.post(
+            simultons_batch_uri, params.model_dump())
+        self.assertEqual(status_code, 201)
+        ports = sorted(res['simulton']['port'] for res in rdata['simultons'])
+
+        for state, rate in (
+                (SimulationState.RUNNING, 2.0),
+                (SimulationState.RUNNING, 3.0),
+                (SimulationState.PAUSED, None)):
+            req = SimulationRequest(state=state, rate=rate)
+            (status_code, rdata) = self.restc.put(
+                simulation_uri, req.model_dump())
+            self.assertEqual(status_code, 200)
+            self.assertEqual(rdata['state'], state)
+            fanout = rdata['fanout']
+            self.assertEqual(sorted(fanout['acked']), ports)
+            self.assertEqual(fanout['timed_out'], [])
+            self.assertEqual(fanout['failed'], [])
+            print(f'{state} fan out took {fanout["elapsed"]:.3f} secs')
+
+        times = set()
+        for port in ports:
+            url = f'http://127.0.0.1:{port}/api/v1/simulton'
+            res = wait_until_reachable(url, 1)
+            assert res is not None
+            self.assertEqual(res.json()['state'], 'PAUSED')
+            self.assertEqual(res.json()['rate'], 3.0)
+            times.add(res.json()['time'])
+        # the simultons agree on the simulated time shared by the simulation
+        self.assertEqual(len(times), 1)
+        self.assertGreater(times.pop(), 0)
+        return
+
+    def wait_for_simulton(self, port: int, state: str,
+                          timeout: float = 5) -> Dict:
+        '''
+        Poll the simulton until it is in the state, returns its response
+        '''
+        url = f'http://127.0.0.1:{port}/api/v1/simulton'
+        deadline = time.time() + timeout
+        jresp: Dict = {}
+        while time.time() < deadline:
+            try:
+                jresp = httpx.get(url).json()
+            except httpx.ConnectError:
+                # not up yet
+                pass
+            if jresp.get('state') == state:
+                break
+            time.sleep(0.05)
+        return jresp
+
+    def test_bus_only(self) -> None:
+        '''
+        With no HTTP fan out the simultons follow the zmq bus, those
+        launched later catch up via the snapshot
+
+        To run this test alone:
+        python3 -m unittest -k test_bus_only tests/simulation_test.py
+        '''
+        assert self.restc is not None
+        clock = 'simultons/clock.py'
+        params = NewSimultonsBatchParams(simultons=[
+            BatchSimultonParams(src_path=clock, name=f'clock{i}')
+            for i in range(2)
+        ])
+        (status_code, rdata) = self.restc.post(
+            simultons_batch_uri, params.model_dump())
+        self.assertEqual(status_code, 201)
+        ports = [res['simulton']['port'] for res in rdata['simultons']]
+
+        req = SimulationRequest(
+            state=SimulationState.RUNNING, rate=2.0, fan_out=False)
+        (status_code, rdata) = self.restc.put(
+            simulation_uri, req.model_dump())
+        self.assertEqual(status_code, 200)
+        self.assertIsNone(rdata['fanout'])
+        # a late joiner
+        params = NewSimultonParams(src_path=clock)
+        (status_code, rdata) = self.restc.post(
+            simultons_uri, params.model_dump())
+        self.assertEqual(status_code, 201)
+        ports.append(rdata['port'])
+        for port in ports:
+            jresp = self.wait_for_simulton(port, 'RUNNING')
+            self.assertEqual(jresp['state'], 'RUNNING')
+            self.assertEqual(jresp['rate'], 2.0)
+            print(port, jresp['subscriber'])
+            self.assertGreaterEqual(jresp['subscriber']['resyncs'], 1)
+            self.assertEqual(jresp['subscriber']['decode_errors'], 0)
+        return
+
+    def test_lockstep(self) -> None:
+        '''
+        All the simultons advance in lockstep, many ticks per message
+
+        To run this test alone:
+        python3 -m unittest -k test_lockstep tests/simulation_test.py
+        '''
+        assert self.restc is not None
+        clock = 'simultons/clock.py'
+        params = NewSimultonsBatchParams(simultons=[
+            BatchSimultonParams(src_path=clock, name=f'clock{i}')
+            for i in range(3)
+        ])
+        (status_code, rdata) = self.restc.post(
+            simultons_batch_uri, params.model_dump())
+        self.assertEqual(status_code, 201)
+        ports = sorted(res['simulton']['port'] for res in rdata['simultons'])
+
+        ticks = 1000
+        quantum = 0.5
+        for batch in (1, 100):
+            step = SimulationStepParams(
+                ticks=ticks, quantum=quantum, batch=batch)
+            (status_code, rdata) = self.restc.post(
+                simulation_step_uri, step.model_dump())
+            self.assertEqual(status_code, 200)
+            self.assertEqual(rdata['missing'], [])
+            self.assertEqual(rdata['batches'], ticks // batch)
+            print(f'{ticks} ticks, {batch} per message, took'
+                  f' {rdata["elapsed"]:.3f} secs,'
+                  f' republished {rdata["republished"]}')
+        self.assertEqual(rdata['tick'], 2 * ticks)
+        self.assertEqual(rdata['time'], 2 * ticks * quantum)
+
+        (status_code, rdata) = self.restc.get(simulation_uri)
+        self.assertEqual(rdata['pacing'], 'LOCKSTEP')
+        # the simultons agree on the simulated time
+        for port in ports:
+            url = f'http://127.0.0.1:{port}/api/v1/simulton'
+            res = wait_until_reachable(url, 1)
+            assert res is not None
+            self.assertEqual(res.json()['pacing'], 'LOCKSTEP')
+            self.assertEqual(res.json()['time'], 2 * ticks * quantum)
+        #
+        # concurrent steps do not take the acks of each other
+        #
+        step = SimulationStepParams(ticks=100, quantum=quantum)
+
+        async def concurrent_steps():
+            async with httpx.AsyncClient(
+                    base_url='http://127.0.0.1:9000', timeout=30) as client:
+                return await asyncio.gather(*(
+                    client.post(simulation_step_uri, json=step.model_dump())
+                    for _ in range(3)))
+
+        responses = asyncio.run(concurrent_steps())
+        for resp in responses:
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(resp.json()['missing'], [])
+            self.assertEqual(resp.json()['batches'], 100)
+        self.assertEqual(
+            sorted(resp.json()['tick'] for resp in responses),
+            [2 * ticks + 100 * i for i in range(1, 4)])
+        for port in ports:
+            url = f'http://127.0.0.1:{port}/api/v1/simulton'
+            res = wait_until_reachable(url, 1)
+            assert res is not None
+            self.assertEqual(res.json()['time'], (2 * ticks + 300) * quantum)
+        return
+
+    def test_snapshot(self) -> None:
+        '''
+        All the simultons are checkpointed at the same simulated time, the
+        next simulation relaunches them with their instances
+
+        To run this test alone:
+        python3 -m unittest -k test_snapshot tests/simulation_test.py
+        '''
+        assert self.restc is not None
+        clock = 'simultons/clock.py'
+        elevator = 'simultons/elevator.py'
+        params = NewSimultonsBatchParams(simultons=[
+            BatchSimultonParams(src_path=clock, name='clock'),
+            BatchSimultonParams(src_path=elevator, name='elevator'),
+        ])
+        (status_code, rdata) = self.restc.post(
+            simultons_batch_uri, params.model_dump())
+        self.assertEqual(status_code, 201)
+        ports = {res['name']: res['simulton']['port']
+                 for res in rdata['simultons']}
+        clocks_url = f'http://127.0.0.1:{ports["clock"]}/api/v1/clocks/'
+        elevators_url = \
+            f'http://127.0.0.1:{ports["elevator"]}/api/v1/elevators/'
+        for i in range(5):
+            httpx.post(clocks_url, json={'name': f'c{i}', 'rate': i})
+            httpx.post(elevators_url, json={'name': f'e{i}', 'floors': 9})
+        step = SimulationStepParams(ticks=10, quantum=0.5)
+        (status_code, rdata) = self.restc.post(
+            simulation_step_uri, step.model_dump())
+        self.assertEqual(status_code, 200)
+        listings = (httpx.get(clocks_url).json(),
+                    httpx.get(elevators_url).json())
+
+        with tempfile.TemporaryDirectory() as tmp:
+            (status_code, rdata) = self.restc.post(
+                simulation_snapshot_uri, {'path': tmp})
+            self.assertEqual(status_code, 200)
+            print(f'Snapshot took {rdata["elapsed"]:.3f} secs')
+            manifest = rdata['manifest']
+            self.assertEqual(manifest['time'], 5.0)
+            self.assertEqual(manifest['tick'], 10)
+            for s in manifest['simultons']:
+                self.assertIsNone(s['message'])
+                self.assertEqual(s['instances'], 5)
+                self.assertTrue(
+                    os.path.exists(os.path.join(tmp, s['checkpoint'])))
+            with open(rdata['path']) as f:
+                self.assertEqual(json.load(f), manifest)
+            # the simultons are still there
+            (status_code, rdata) = self.restc.post(
+                simulation_restore_uri, {'path': tmp})
+            self.assertEqual(status_code, 400)
+
+            # a fresh simulation process
+            self.tearDown()
+            self.setUp()
+            (status_code, rdata) = self.restc.post(
+                simulation_restore_uri, {'path': tmp})
+            self.assertEqual(status_code, 201)
+            print(f'Restore took {rdata["elapsed"]:.3f} secs')
+            for res in rdata['simultons']:
+                self.assertIsNone(res['message'])
+                # they go on from the simulated time of the snapshot
+                port = res['simulton']['port']
+                jresp = httpx.get(
+                    f'http://127.0.0.1:{port}/api/v1/simulton').json()
+                self.assertEqual(jresp['time'], 5.0)
+        self.assertEqual(
+            (httpx.get(clocks_url).json(), httpx.get(elevators_url).json()),
+            listings)
+        (status_code, rdata) = self.restc.get(simulation_uri)
+        self.assertEqual(rdata['pacing'], 'LOCKSTEP')
+        return
+
     def test_many_simultons(self) -> None:
         '''
         Test N simultons
@@ -156,7 +475,7 @@ class TestSimulation(unittest.TestCase):
         assert self.restc is not None
         (status_code, rdata) = self.restc.get(simulation_uri)
         self.assertTrue(status_code, 200)
-        expected = {'state': 'PAUSED', 'rate': 0}
+        expected = {'state': 'PAUSED', 'rate': 0, 'pacing': 'WALL_CLOCK'}
         self.assertEqual(rdata, expected)
 
         (status_code, rdata) = self.restc.get(simultons_uri)
@@ -1,9 +1,10 @@
 '''
 Test launching/shutting FastAPI server programmatically
 '''
+import time
 import unittest
 
-from simultons import SimultonProxy, NewElevatorParams
+from simultons import InstanceRegistry, SimultonProxy, NewElevatorParams
 
 simulton_uri = '/api/v1/simulton'
 elevators_uri = '/api/v1/elevators/'
@@ -97,3 +98,101 @@ class TestSimulton(unittest.TestCase):
             self.assertIn(el['name'], names)
 
         return
+
+
+class TestInstanceRegistry(unittest.TestCase):
+    '''
+    Verify InstanceRegistry functionality
+    '''
+
+    def test_all(self):
+        '''
+        Ids are compact, the slots are reused, stale ids are not found
+        '''
+        reg = InstanceRegistry('Foo')
+        a = reg.add('a')
+        b = reg.add('b')
+        self.assertEqual((a, b), ('Foo-0.0', 'Foo-1.0'))
+        self.assertEqual(reg[a], 'a')
+        self.assertEqual(dict(reg), {a: 'a', b: 'b'})
+        self.assertEqual(reg.pop(a), 'a')
+        with self.assertRaises(KeyError):
+            reg[a]
+        # the slot is reused with the next generation
+        c = reg.add('c')
+        self.assertEqual(c, 'Foo-0.1')
+        self.assertNotIn(a, reg)
+        self.assertEqual(reg.get_by_handle(reg.handle(c)), 'c')
+        with self.assertRaises(KeyError):
+            reg.get_by_handle(reg.handle(c) - (1 << reg.index_bits))
+        for bad in ('Foo-0', 'Foo-x.0', 'Bar-1.0', 'Foo-5.0', 5):
+            with self.assertRaises(KeyError):
+                reg[bad]
+        # negative and non-canonical spellings of the live b
+        for bad in ('Foo--1.0', 'Foo-+1.0', 'Foo-01.0', 'Foo-1.00',
+                    'Foo- 1.0', 'Foo-1.0 ', 'Foo-1.-0', 'Foo-0x1.0',
+                    'Foo-1.0.0'):
+            with self.assertRaises(KeyError):
+                reg[bad]
+            with self.assertRaises(KeyError):
+                del reg[bad]
+            with self.assertRaises(KeyError):
+                list(reg.items_after(bad))
+        self.assertEqual(reg[b], 'b')
+        self.assertEqual([id for id, _ in reg.items_after(c)], [b])
+        # only the reserved ids can be set
+        with self.assertRaises(KeyError):
+            reg['Foo-2.0'] = 'd'
+        self.assertEqual(len(reg), 2)
+        return
+
+    def test_soak(self):
+        '''
+        Create and delete many instances
+        '''
+        reg = InstanceRegistry('Foo')
+        live = [reg.add(i) for i in range(1000)]
+        num = 200000
+        start = time.time()
+        for i in range(num):
+            del reg[live[i % 1000]]
+            live[i % 1000] = reg.add(i)
+        elapsed = time.time() - start
+        print(f'{num/elapsed:.0f} create/delete per sec')
+        self.assertEqual(len(reg), 1000)
+        self.assertEqual(reg.capacity, 1000)
+        self.assertEqual(len(set(reg)), 1000)
+        return
+
+    def test_load(self):
+        '''
+        The instances of the slots loaded are created when first used
+        '''
+        reg = InstanceRegistry('Foo')
+        ids = [reg.add(i) for i in range(4)]
+        del reg[ids[1]]
+        (generations, used, free) = reg.dump()
+        created = []
+
+        def load(index: int, id: str) -> str:
+            created.append(index)
+            return f'{id} restored'
+
+        other = InstanceRegistry('Foo')
+        other.load(generations, used, free, load)
+        self.assertEqual(len(other), 3)
+        self.assertEqual(created, [])
+        self.assertEqual(other[ids[2]], f'{ids[2]} restored')
+        self.assertEqual(other[ids[2]], f'{ids[2]} restored')
+        self.assertEqual(created, [2])
+        self.assertNotIn(ids[1], other)
+        # deleted before ever created
+        del other[ids[3]]
+        self.assertEqual(list(other), [ids[0], ids[2]])
+        self.assertEqual(created, [2])
+        # the ids go on as if never checkpointed
+        del reg[ids[3]]
+        self.assertEqual(other.add('e'), reg.add('e'))
+        self.assertEqual(dict(other.slots()), {
+            0: f'{ids[0]} restored', 2: f'{ids[2]} restored', 3: 'e'})
+        return
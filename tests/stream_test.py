@@ -0,0 +1,63 @@
+'''
+Testing the push streams plumbing
+'''
+import asyncio
+import unittest
+
+from simultons import CoalescingQueue, StreamClient, StreamHub
+
+
+class TestStream(unittest.TestCase):
+    '''
+    Verify CoalescingQueue and StreamHub functionality
+    '''
+
+    def test_queue(self):
+        '''
+        The latest item per key is kept, the queue never outgrows the keys
+        '''
+        queue = CoalescingQueue()
+        for floor in range(1000):
+            for car in ('a', 'b', 'c'):
+                queue.put(car, (car, floor))
+        self.assertEqual(len(queue), 3)
+        self.assertEqual(queue.coalesced, 2997)
+        self.assertEqual(queue.get_nowait(2), [('a', 999), ('b', 999)])
+        self.assertEqual(queue.get_nowait(), [('c', 999)])
+        self.assertEqual(queue.get_nowait(), [])
+
+        async def consume() -> list:
+            waiter = asyncio.create_task(queue.get())
+            await asyncio.sleep(0.01)
+            self.assertFalse(waiter.done())
+            queue.put('a', 1)
+            return await waiter
+
+        self.assertEqual(asyncio.run(consume()), [1])
+        return
+
+    def test_hub(self):
+        '''
+        The items go to the clients subscribed to their keys
+        '''
+        hub = StreamHub()
+        some = StreamClient(['a'])
+        every = StreamClient()
+        hub.add(some)
+        hub.add(every)
+        self.assertIsNone(hub.keys())
+        hub.publish('a', 1)
+        hub.publish('b', 2)
+        self.assertEqual(some.queue.get_nowait(), [1])
+        self.assertEqual(every.queue.get_nowait(), [1, 2])
+        hub.discard(every)
+        self.assertEqual(hub.keys(), {'a'})
+        some.subscribe(['b', 'c'])
+        hub.publish('a', 3)
+        self.assertEqual(len(some.queue), 0)
+        self.assertEqual(hub.keys(), {'b', 'c'})
+        return
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+'''
+Testing the binary encoding of the ZMQ bus messages
+'''
+import asyncio
+import unittest
+
+from simultons import Pacing, SimulationState, SimulationResponse, \
+    SimulationTick, SimulationTickAck, Simulton, SimultonState, \
+    simulation_ztopic, tick_ztopic
+from simultons.wire import decode_ack, decode_state, decode_tick, \
+    encode_ack, encode_state, encode_tick, frames
+
+
+class TestWire(unittest.TestCase):
+    '''
+    Verify the encoding and the subscriber dispatch
+    '''
+
+    def test_all(self):
+        '''
+        Messages survive the round trip, malformed ones are rejected
+        '''
+        resp = SimulationResponse(
+            state=SimulationState.RUNNING, rate=2.5, pacing=Pacing.LOCKSTEP)
+        self.assertEqual(decode_state(encode_state(resp, 3)), (3, resp))
+        tick = SimulationTick(seq=7, first_tick=100, count=10, quantum=0.1)
+        self.assertEqual(decode_tick(encode_tick(tick)), tick)
+        ack = SimulationTickAck(port=9500, seq=7, time=11.0)
+        self.assertEqual(decode_ack(encode_ack(ack)), ack)
+        self.assertEqual(len(encode_tick(tick)), 28)
+        for decode in (decode_state, decode_tick, decode_ack):
+            with self.assertRaises(ValueError):
+                decode(b'junk')
+        with self.assertRaises(ValueError):
+            decode_state(b'\xff\x00' + bytes(8))
+        return
+
+    def test_conflate(self):
+        '''
+        Only the latest state update of a batch is applied
+        '''
+        async def dispatch() -> Simulton:
+            sim = Simulton()
+            batch = [
+                frames(simulation_ztopic, encode_state(SimulationResponse(
+                    state=state, rate=rate), seq))
+                for seq, state, rate in ((1, SimulationState.RUNNING, 5),
+                                         (2, SimulationState.PAUSED, 0),
+                                         (3, SimulationState.RUNNING, 3),
+                                         (2, SimulationState.PAUSED, 0))
+            ]
+            batch.append(frames(simulation_ztopic, b'junk'))
+            batch.append(frames('foo', b''))
+            batch.append(frames(tick_ztopic, encode_tick(SimulationTick(
+                seq=1, first_tick=0, count=10, quantum=0.5))))
+            batch.append([b'one frame'])
+            await sim.dispatch_zmq(batch)
+            sim.on_shutdown()
+            return sim
+
+        sim = asyncio.run(dispatch())
+        self.assertEqual(sim.state, SimultonState.RUNNING)
+        self.assertEqual(sim.rate, 3)
+        # the tick came after the state update
+        self.assertEqual(sim.pacing, Pacing.LOCKSTEP)
+        self.assertAlmostEqual(sim.engine.now, 5.0, places=2)
+        counters = sim.to_response().subscriber
+        self.assertEqual(
+            (counters.received, counters.batches, counters.conflated,
+             counters.decode_errors, counters.stale), (8, 1, 2, 3, 1))
+        return
+
+    def test_gap(self):
+        '''
+        A gap in the state updates seq is noticed, with no simulation to
+        resync from the latest one received is applied
+        '''
+        async def dispatch() -> Simulton:
+            sim = Simulton()
+            sim.snapshot_timeout = 0.1
+            resp = SimulationResponse(state=SimulationState.RUNNING, rate=2)
+            await sim.dispatch_zmq(
+                [frames(simulation_ztopic, encode_state(resp, 5))])
+            sim.on_shutdown()
+            return sim
+
+        sim = asyncio.run(dispatch())
+        self.assertEqual(sim.state, SimultonState.RUNNING)
+        self.assertEqual(sim.subscriber.gaps, 1)
+        self.assertEqual(sim.subscriber.resyncs, 0)
+        return
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+'''
+Testing the zygote - simulton processes forked from a preloaded process
+'''
+import time
+from typing import List, Optional
+import unittest
+
+from simultons import FastLauncher
+from simultons.zygote import Zygote, module_name
+
+simulton_uri = '/api/v1/simulton'
+
+
+class TestZygote(unittest.TestCase):
+    '''
+    Verify the zygote functionality, compare the startup latency of the
+    simultons launched using the fastapi CLI vs forked by the zygote.
+
+    To run just this test:
+    python3 -m unittest -v tests/zygote_test.py
+    '''
+    # number of simultons to launch in every mode
+    N = 3
+
+    def test_module_name(self):
+        '''
+        Simulton path to the module name conversion
+        '''
+        self.assertEqual(module_name('simultons/clock.py'), 'simultons.clock')
+        self.assertEqual(
+            module_name('./simultons/elevator.py'), 'simultons.elevator')
+        return
+
+    def launch_many(self, base_port: int, path: str,
+                    zygote: Optional[Zygote]) -> List[float]:
+        '''
+        Launch N simultons one at a time, shut them.
+        Returns the list of the startup latencies.
+        '''
+        latencies: List[float] = []
+        for port in range(base_port, base_port + self.N):
+            launcher = FastLauncher(path, port, zygote)
+            start = time.time()
+            self.assertTrue(launcher.launch())
+            jresp = launcher.wait_until_reachable(simulton_uri, 5)
+            latencies.append(time.time() - start)
+            self.assertIsNotNone(jresp)
+            assert jresp is not None
+            self.assertEqual(jresp['state'], 'PAUSED')
+            self.assertTrue(launcher.shutdown(timeout=3))
+        return latencies
+
+    def test_startup_latency(self):
+        '''
+        Startup latency benchmark: fastapi CLI vs zygote vs zygote with
+        the pool of warm workers
+        '''
+        path = 'simultons/clock.py'
+        results = {}
+        results['fastapi CLI'] = self.launch_many(9100, path, None)
+
+        zygote = Zygote()
+        zygote.start()
+        results['zygote'] = self.launch_many(9200, path, zygote)
+        zygote.close()
+
+        zygote = Zygote(pool_size=2)
+        zygote.start()
+        results['zygote, 2 warm workers'] = self.launch_many(
+            9300, path, zygote)
+        zygote.close()
+
+        for mode, latencies in results.items():
+            print(f'{mode}: {self.N} simultons startup latency'
+                  f' avg {sum(latencies)/len(latencies):.3f} secs,'
+                  f' max {max(latencies):.3f} secs')
+        return
+
+
+if __name__ == '__main__':
+    unittest.main()